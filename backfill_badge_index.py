@@ -0,0 +1,18 @@
+import argparse
+import logging
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.badges import queries as badge_queries
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    parser = argparse.ArgumentParser(description="Build the badge index for each of the guilds")
+    parser.add_argument("guild_ids", nargs="+")
+    args = parser.parse_args()
+
+    for guild_id in args.guild_ids:
+        badge_index = badge_queries.rebuild_badge_index(core_dataclasses.Guild(guild_id=guild_id))
+        logger.info(f"Indexed the badges in {badge_index.position} matches for guild {guild_id}")
@@ -0,0 +1,20 @@
+import argparse
+import logging
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import storage
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    parser = argparse.ArgumentParser(
+        description="Rebuild the ratings for each of the guilds from scratch"
+    )
+    parser.add_argument("guild_ids", nargs="+")
+    args = parser.parse_args()
+
+    for guild_id in args.guild_ids:
+        rating_table = storage.rebuild_rating_table(core_dataclasses.Guild(guild_id=guild_id))
+        logger.info(f"Rated {rating_table.position} matches for guild {guild_id}")
@@ -51,10 +51,17 @@ class BaseSettings:
     S3_REGION: str = env.str("S3_REGION", default="")
     AWS_ACCESS_KEY_ID: str = env.str("AWS_ACCESS_KEY_ID", default="")
     AWS_SECRET_ACCESS_KEY: str = env.str("AWS_SECRET_ACCESS_KEY", default="")
+    # The maximum size of the in-memory cache of files read from S3, kept for the lifetime of the container
+    S3_READ_CACHE_MAX_BYTES: int = env.int("S3_READ_CACHE_MAX_BYTES", default=64 * 1024 * 1024)
 
     # Match tracker settings
     MATCH_RESULTS_PATH: str = env.str("MATCH_RESULTS_PATH", default="")
     MATCH_RESULTS_FILE: str = env.str("MATCH_RESULTS_FILE", default="")
+    MATCH_RESULTS_INDEX_FILE: str = env.str("MATCH_RESULTS_INDEX_FILE", default="")
+    AGGREGATES_FILE: str = env.str("AGGREGATES_FILE", default="")
+    BADGE_CHECKPOINTS_FILE: str = env.str("BADGE_CHECKPOINTS_FILE", default="")
+    SESSION_BADGES_FILE: str = env.str("SESSION_BADGES_FILE", default="")
+    RANK_HISTORY_FILE: str = env.str("RANK_HISTORY_FILE", default="")
 
     # Sessions settings
     SESSIONS_PATH: str = env.str("SESSIONS_PATH", default="")
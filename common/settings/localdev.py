@@ -23,6 +23,11 @@ class SquashBotLocalDevSettings(LocalDevSettings):
     # Match tracker settings
     MATCH_RESULTS_PATH = str(base.PROJECT_ROOT / "tests" / "fixtures" / "local_testing")
     MATCH_RESULTS_FILE = "match_results.json"
+    MATCH_RESULTS_INDEX_FILE = "match_results_index.json"
+    AGGREGATES_FILE = "aggregates.txt"
+    BADGE_CHECKPOINTS_FILE = "badge_checkpoints.json"
+    SESSION_BADGES_FILE = "session_badges.jsonl"
+    RANK_HISTORY_FILE = "rank_history.jsonl"
 
     # Sessions settings
     SESSIONS_PATH = str(base.PROJECT_ROOT / "tests" / "fixtures" / "local_testing")
@@ -24,6 +24,11 @@ class SquashBotProductionSettings(ProductionSettings):
     # Match tracker settings
     MATCH_RESULTS_PATH = "squash-bot"
     MATCH_RESULTS_FILE = "match_tracker/results/match_results.json"
+    MATCH_RESULTS_INDEX_FILE = "match_tracker/results/match_results_index.json"
+    AGGREGATES_FILE = "match_tracker/results/aggregates.txt"
+    BADGE_CHECKPOINTS_FILE = "match_tracker/results/badge_checkpoints.json"
+    SESSION_BADGES_FILE = "match_tracker/results/session_badges.jsonl"
+    RANK_HISTORY_FILE = "match_tracker/results/rank_history.jsonl"
 
     # Sessions settings
     SESSIONS_PATH = "squash-bot"
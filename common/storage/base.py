@@ -1,8 +1,14 @@
 import abc
+import collections
+import hashlib
 import io
 import logging
 import pathlib
+import random
+import time
+import typing
 
+import attrs
 import boto3
 from botocore import exceptions as botocore_exceptions
 
@@ -14,6 +20,8 @@ logger.setLevel(logging.INFO)
 
 client = boto3.client("s3")
 
+T_result = typing.TypeVar("T_result")
+
 
 class FileMissing(Exception):
     """
@@ -21,51 +29,358 @@ class FileMissing(Exception):
     """
 
 
+class VersionConflict(Exception):
+    """
+    Raised when a conditional write finds that the file has changed since it was read
+    """
+
+
+@attrs.frozen
+class VersionedFile:
+    """
+    The contents of a file along with a token identifying the version that was read.
+    """
+
+    contents: str
+    version: str
+
+
+@attrs.frozen
+class AppendedFile:
+    """
+    The versions of a file either side of an append.
+
+    `previous_version` is `None` if the append created the file.
+    """
+
+    previous_version: str | None
+    version: str
+
+
 class StorageBackend(abc.ABC):
     @abc.abstractmethod
-    def store_file(self, file_path: str, file_name: str, contents: str) -> None: ...
+    def store_file(
+        self, file_path: str, file_name: str, contents: str, if_version: str | None = None
+    ) -> str:
+        """
+        Store the contents of a file and return the new version token.
+
+        If `if_version` is given, the write only succeeds if the stored file is still at that version, otherwise
+        `VersionConflict` is raised.
+        """
 
     @abc.abstractmethod
-    def read_file(self, file_path: str, file_name: str) -> str: ...
+    def create_file(self, file_path: str, file_name: str, contents: str) -> str:
+        """
+        Store the contents of a file that doesn't exist yet and return its version token.
+
+        If the file already exists it's left as it is, and `VersionConflict` is raised.
+        """
+
+    @abc.abstractmethod
+    def read_file_with_version(self, file_path: str, file_name: str) -> VersionedFile: ...
+
+    def read_file(self, file_path: str, file_name: str) -> str:
+        return self.read_file_with_version(file_path, file_name).contents
+
+    def read_file_range(self, file_path: str, file_name: str, start: int, length: int) -> str:
+        """
+        Read `length` bytes of a file from byte offset `start`.
+
+        Backends without ranged reads fall back to reading the whole file.
+        """
+        contents_encoded = self.read_file(file_path, file_name).encode("utf-8")
+        return contents_encoded[start : start + length].decode("utf-8")
+
+    def file_version(self, file_path: str, file_name: str) -> str:
+        """
+        Get the current version token of a file.
+
+        Backends that can't look up a version on its own fall back to reading the file.
+        """
+        return self.read_file_with_version(file_path, file_name).version
+
+    def append_file(
+        self, file_path: str, file_name: str, contents: str, if_version: str | None = None
+    ) -> AppendedFile:
+        """
+        Append contents to the end of a file, creating it if it doesn't exist.
+
+        If `if_version` is given, the append only succeeds if the stored file is still at that version, otherwise
+        `VersionConflict` is raised.
+
+        Backends without a native append, such as `S3Storage`, fall back to a conditional rewrite of the file with the
+        raw contents. That avoids any decoding on the caller's side, but the whole file is still read and written
+        back, so an append costs as much as the file is large. A concurrent write also raises `VersionConflict`.
+        """
+        existing_file = self._read_file_for_append(file_path, file_name, if_version)
+        if existing_file is None:
+            # Created conditionally too, so a concurrent append that created the file first isn't overwritten
+            version = self.create_file(file_path, file_name, contents)
+            return AppendedFile(previous_version=None, version=version)
+
+        version = self.store_file(
+            file_path,
+            file_name,
+            existing_file.contents + contents,
+            if_version=existing_file.version,
+        )
+        return AppendedFile(previous_version=existing_file.version, version=version)
+
+    def _read_file_for_append(
+        self, file_path: str, file_name: str, if_version: str | None
+    ) -> VersionedFile | None:
+        try:
+            existing_file = self.read_file_with_version(file_path, file_name)
+        except FileMissing:
+            existing_file = None
+
+        if if_version is not None and (
+            existing_file is None or existing_file.version != if_version
+        ):
+            raise VersionConflict(f"{file_path}/{file_name} is not at version {if_version}")
+        return existing_file
 
 
 class LocalStorage(StorageBackend):
-    def store_file(self, file_path: str, file_name: str, contents: str) -> None:
+    def store_file(
+        self, file_path: str, file_name: str, contents: str, if_version: str | None = None
+    ) -> str:
         full_file_path = pathlib.Path(file_path) / file_name
+        if if_version is not None:
+            try:
+                current_version = self.read_file_with_version(file_path, file_name).version
+            except FileMissing:
+                current_version = None
+            if current_version != if_version:
+                raise VersionConflict(f"{full_file_path} is not at version {if_version}")
+
         full_file_path.parent.mkdir(exist_ok=True, parents=True)
         with open(full_file_path, "w") as f:
             f.write(contents)
+        return self._version(full_file_path, contents)
 
-    def read_file(self, file_path: str, file_name: str) -> str:
+    def create_file(self, file_path: str, file_name: str, contents: str) -> str:
+        full_file_path = pathlib.Path(file_path) / file_name
+        full_file_path.parent.mkdir(exist_ok=True, parents=True)
+        try:
+            with open(full_file_path, "x") as f:
+                f.write(contents)
+        except FileExistsError as e:
+            raise VersionConflict(f"{full_file_path} already exists") from e
+        return self._version(full_file_path, contents)
+
+    def read_file_with_version(self, file_path: str, file_name: str) -> VersionedFile:
         full_file_path = pathlib.Path(file_path) / file_name
         try:
             with open(full_file_path) as f:
-                return f.read()
+                contents = f.read()
+        except FileNotFoundError as e:
+            raise FileMissing from e
+        return VersionedFile(contents=contents, version=self._version(full_file_path, contents))
+
+    def append_file(
+        self, file_path: str, file_name: str, contents: str, if_version: str | None = None
+    ) -> AppendedFile:
+        full_file_path = pathlib.Path(file_path) / file_name
+        full_file_path.parent.mkdir(exist_ok=True, parents=True)
+        existing_file = self._read_file_for_append(file_path, file_name, if_version)
+
+        with open(full_file_path, "a") as f:
+            f.write(contents)
+
+        existing_contents = existing_file.contents if existing_file else ""
+        return AppendedFile(
+            previous_version=existing_file.version if existing_file else None,
+            version=self._version(full_file_path, existing_contents + contents),
+        )
+
+    def read_file_range(self, file_path: str, file_name: str, start: int, length: int) -> str:
+        full_file_path = pathlib.Path(file_path) / file_name
+        try:
+            with open(full_file_path, "rb") as f:
+                f.seek(start)
+                return f.read(length).decode("utf-8")
         except FileNotFoundError as e:
             raise FileMissing from e
 
+    def _version(self, full_file_path: pathlib.Path, contents: str) -> str:
+        # The modification time alone can be too coarse to tell quick successive writes apart, so we include a hash
+        # of the contents too
+        mtime_ns = full_file_path.stat().st_mtime_ns
+        contents_hash = hashlib.sha256(contents.encode("utf-8")).hexdigest()[:16]
+        return f"{mtime_ns}-{contents_hash}"
+
+
+class ReadCache:
+    """
+    A process-level LRU cache of file contents and their versions, kept within a byte budget.
+
+    This lives for as long as the (warm) container does, so it lets repeated reads of the same file revalidate the
+    cached version rather than fetch the contents again.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: collections.OrderedDict[tuple[str, str], tuple[VersionedFile, int]] = (
+            collections.OrderedDict()
+        )
+        self._size_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size_bytes
+
+    def get(self, key: tuple[str, str]) -> VersionedFile | None:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: tuple[str, str], versioned_file: VersionedFile, size_bytes: int) -> None:
+        self.invalidate(key)
+        if size_bytes > self.max_bytes:
+            return
+
+        self._entries[key] = (versioned_file, size_bytes)
+        self._size_bytes += size_bytes
+
+        # Evict the least recently used entries until we're back within budget
+        while self._size_bytes > self.max_bytes:
+            _, (_, evicted_size_bytes) = self._entries.popitem(last=False)
+            self._size_bytes -= evicted_size_bytes
+
+    def invalidate(self, key: tuple[str, str]) -> None:
+        if key in self._entries:
+            _, size_bytes = self._entries.pop(key)
+            self._size_bytes -= size_bytes
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+s3_read_cache = ReadCache(max_bytes=settings_base.settings.S3_READ_CACHE_MAX_BYTES)
+
 
 class S3Storage(StorageBackend):
-    def store_file(self, file_path: str, file_name: str, contents: str) -> None:
+    # Error codes S3 returns when a conditional write fails
+    _conflict_error_codes = frozenset({"PreconditionFailed", "ConditionalRequestConflict"})
+
+    def store_file(
+        self, file_path: str, file_name: str, contents: str, if_version: str | None = None
+    ) -> str:
+        conditions = {"IfMatch": if_version} if if_version is not None else {}
+        return self._put_object(
+            file_path,
+            file_name,
+            contents,
+            conditions,
+            conflict_message=f"{file_path}/{file_name} is not at version {if_version}",
+        )
+
+    def create_file(self, file_path: str, file_name: str, contents: str) -> str:
+        return self._put_object(
+            file_path,
+            file_name,
+            contents,
+            {"IfNoneMatch": "*"},
+            conflict_message=f"{file_path}/{file_name} already exists",
+        )
+
+    def _put_object(
+        self,
+        file_path: str,
+        file_name: str,
+        contents: str,
+        conditions: dict[str, str],
+        conflict_message: str,
+    ) -> str:
         client = self._client()
-        contents_bytes = io.BytesIO(contents.encode("utf-8"))
-        return client.put_object(Key=file_name, Bucket=file_path, Body=contents_bytes)
+        contents_encoded = contents.encode("utf-8")
+        cache_key = (file_path, file_name)
+        try:
+            response = client.put_object(
+                Key=file_name, Bucket=file_path, Body=io.BytesIO(contents_encoded), **conditions
+            )
+        except botocore_exceptions.ClientError as exc:
+            # Whatever we have cached is at best stale now
+            s3_read_cache.invalidate(cache_key)
+            if _error_code(exc) in self._conflict_error_codes:
+                raise VersionConflict(conflict_message) from exc
+            raise
 
-    def read_file(self, file_path: str, file_name: str) -> str:
+        # We know exactly what is stored at the new version, so there's no need to fetch it again on the next read
+        version = response["ETag"]
+        s3_read_cache.put(
+            cache_key,
+            VersionedFile(contents=contents, version=version),
+            size_bytes=len(contents_encoded),
+        )
+        return version
+
+    def read_file_with_version(self, file_path: str, file_name: str) -> VersionedFile:
         client = self._client()
+        cache_key = (file_path, file_name)
+        cached_file = s3_read_cache.get(cache_key)
+        conditions = {"IfNoneMatch": cached_file.version} if cached_file else {}
+        try:
+            response = client.get_object(Bucket=file_path, Key=file_name, **conditions)
+        except botocore_exceptions.ClientError as exc:
+            if cached_file and _error_code(exc) == "304":
+                logger.info(f"File not modified, using cached contents: {file_path} / {file_name}")
+                s3_read_cache.hits += 1
+                return cached_file
+            s3_read_cache.invalidate(cache_key)
+            raise FileMissing from exc
+
+        s3_read_cache.misses += 1
+        contents_encoded = response["Body"].read()
+        versioned_file = VersionedFile(
+            contents=contents_encoded.decode("utf-8"), version=response["ETag"]
+        )
+        s3_read_cache.put(cache_key, versioned_file, size_bytes=len(contents_encoded))
+        return versioned_file
+
+    def read_file_range(self, file_path: str, file_name: str, start: int, length: int) -> str:
         try:
-            response = client.get_object(Bucket=file_path, Key=file_name)
+            response = self._client().get_object(
+                Bucket=file_path, Key=file_name, Range=f"bytes={start}-{start + length - 1}"
+            )
         except botocore_exceptions.ClientError as exc:
             raise FileMissing from exc
         return response["Body"].read().decode("utf-8")
 
+    def file_version(self, file_path: str, file_name: str) -> str:
+        try:
+            response = self._client().head_object(Bucket=file_path, Key=file_name)
+        except botocore_exceptions.ClientError as exc:
+            raise FileMissing from exc
+        return response["ETag"]
+
     def _client(self):
         return client
 
 
-def store_file(file_path: str, file_name: str, contents: str) -> None:
+def store_file(
+    file_path: str, file_name: str, contents: str, if_version: str | None = None
+) -> str:
     logger.info(f"Storing file: {file_path} / {file_name}")
-    get_storage_backend().store_file(file_path, file_name, contents)
+    return get_storage_backend().store_file(file_path, file_name, contents, if_version=if_version)
+
+
+def append_file(
+    file_path: str, file_name: str, contents: str, if_version: str | None = None
+) -> AppendedFile:
+    logger.info(f"Appending to file: {file_path} / {file_name}")
+    return get_storage_backend().append_file(file_path, file_name, contents, if_version=if_version)
 
 
 def read_file(
@@ -73,18 +388,65 @@ def read_file(
     file_name: str,
     create_if_missing: bool = False,
 ) -> str:
+    return read_file_with_version(file_path, file_name, create_if_missing).contents
+
+
+def read_file_with_version(
+    file_path: str,
+    file_name: str,
+    create_if_missing: bool = False,
+) -> VersionedFile:
     logger.info(f"Reading file: {file_path} / {file_name}")
     storage_backend = get_storage_backend()
     try:
-        return storage_backend.read_file(file_path, file_name)
+        return storage_backend.read_file_with_version(file_path, file_name)
     except FileMissing:
-        if create_if_missing:
-            logger.info("File not found, creating")
-            storage_backend.store_file(file_path, file_name, "")
-            return ""
-        else:
+        if not create_if_missing:
             raise
 
+    logger.info("File not found, creating")
+    try:
+        version = storage_backend.create_file(file_path, file_name, "")
+    except VersionConflict:
+        # Another writer created the file first, so we read what they stored rather than overwrite it
+        return storage_backend.read_file_with_version(file_path, file_name)
+    return VersionedFile(contents="", version=version)
+
+
+def read_file_range(file_path: str, file_name: str, start: int, length: int) -> str:
+    logger.info(f"Reading {length} bytes from {start} of file: {file_path} / {file_name}")
+    return get_storage_backend().read_file_range(file_path, file_name, start, length)
+
+
+def file_version(file_path: str, file_name: str) -> str:
+    return get_storage_backend().file_version(file_path, file_name)
+
+
+def retry_on_conflict(
+    operation: typing.Callable[[], T_result],
+    max_attempts: int = 5,
+    base_delay: float = 0.05,
+    max_delay: float = 1.0,
+) -> T_result:
+    """
+    Run an operation that reads and conditionally writes a file, retrying it if the write conflicts.
+
+    Retries back off exponentially with jitter so that concurrent writers spread out. The last `VersionConflict` is
+    re-raised once `max_attempts` is reached.
+    """
+    for attempt in range(1, max_attempts):
+        try:
+            return operation()
+        except VersionConflict:
+            delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+            logger.info(f"Write conflict on attempt {attempt}, retrying in up to {delay:.2f}s")
+            time.sleep(random.uniform(0, delay))
+    return operation()
+
+
+def _error_code(exc: botocore_exceptions.ClientError) -> str | None:
+    return exc.response.get("Error", {}).get("Code")
+
 
 def get_storage_backend() -> StorageBackend:
     return settings_base.get_class_from_string(  # type: ignore[abstract]
@@ -38,6 +38,8 @@ def _build_dict_for_option(
         "type": command_option.type.value,
         "required": command_option.required,
     }
+    if command_option.min_value is not None:
+        option_dict["min_value"] = command_option.min_value
     if not command_option.choices:
         return option_dict
 
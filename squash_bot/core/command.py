@@ -42,6 +42,8 @@ class CommandOption:
     required: bool
     default: typing.Any | None = None
     choices: tuple[CommandOptionChoice, ...] | None = None
+    # The smallest value allowed for an integer or number option
+    min_value: int | float | None = None
 
     @property
     def is_user(self) -> bool:
@@ -84,6 +86,14 @@ class Command:
                 )
             else:
                 value = option["value"]
+                # Discord enforces the minimum too, but a request can't be relied on to have come through it
+                if (
+                    command_option.min_value is not None
+                    and option["value"] < command_option.min_value
+                ):
+                    raise CommandVerificationError(
+                        f"Don't be daft now.. {option_name} must be at least {command_option.min_value}"
+                    )
 
             if not value and command_option.default:
                 value = command_option.default
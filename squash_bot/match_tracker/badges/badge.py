@@ -1,7 +1,9 @@
 import typing
+from collections import deque
 
 import attrs
 
+from squash_bot.core.data import dataclasses as core_dataclasses
 from squash_bot.match_tracker.data import dataclasses as dataclasses
 
 
@@ -21,21 +23,330 @@ class Badge:
         return f"{self.__class__.__name__}: {self.display} ({self.badge_earned_in.played_on.isoformat()})"
 
 
+T_feature = typing.TypeVar("T_feature", bound="Feature")
+
+
+class Feature:
+    """
+    Something derived from the matches that more than one collector needs, e.g. each player's running record.
+
+    Each feature that the collectors in a pass need is built once, as the pass observes each match, and shared between
+    them. A feature can itself need other features, which are observed before it.
+    """
+
+    requires: typing.ClassVar[tuple[type["Feature"], ...]] = ()
+
+    def observe(self, match: dataclasses.MatchResult, features: "Features") -> None:
+        """
+        This method should be implemented by the subclass to update the feature for the current match.
+        """
+
+    def to_dict(self) -> typing.Any:
+        """
+        This method should be implemented by the subclass to snapshot the feature, so a pass can be resumed from it
+        later. Matches are referred to by their result ID.
+        """
+        return {}
+
+    @classmethod
+    def from_dict(
+        cls: type[T_feature], data: typing.Any, matches: dataclasses.MatchLookup
+    ) -> T_feature:
+        """
+        Restore a feature from a snapshot, looking up the matches it refers to in `matches`.
+        """
+        return cls()
+
+
+@attrs.define
+class Features:
+    """
+    The features built by a pass over the matches, in the order they're observed.
+    """
+
+    _features: dict[type[Feature], Feature] = attrs.Factory(dict)
+
+    def __getitem__(self, feature_type: type[T_feature]) -> T_feature:
+        return typing.cast(T_feature, self._features[feature_type])
+
+    def observe(self, match: dataclasses.MatchResult) -> None:
+        for feature in self._features.values():
+            feature.observe(match, self)
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "names": [feature_type.__name__ for feature_type in self._features],
+            "features": [feature.to_dict() for feature in self._features.values()],
+        }
+
+    @classmethod
+    def plan(cls, feature_types: list[type[Feature]]) -> "Features":
+        return cls(features={feature_type: feature_type() for feature_type in feature_types})
+
+    @classmethod
+    def from_dict(
+        cls,
+        feature_types: list[type[Feature]],
+        data: dict[str, typing.Any],
+        matches: dataclasses.MatchLookup,
+    ) -> "Features":
+        """
+        Restore the features from a snapshot, raising `ValueError` if it's for a different set of features.
+        """
+        if data["names"] != [feature_type.__name__ for feature_type in feature_types]:
+            raise ValueError("The snapshot is for a different set of features")
+        return cls(
+            features={
+                feature_type: feature_type.from_dict(feature_data, matches)
+                for feature_type, feature_data in zip(feature_types, data["features"])
+            }
+        )
+
+
+@attrs.define
+class PlayerState:
+    """
+    A player's running record, as of the latest match they've played.
+    """
+
+    matches: int = 0
+    wins: int = 0
+    win_streak: int = 0
+    loss_streak: int = 0
+    # The length of the opposite streak that the player's latest match ended, e.g. the win streak ended by a loss
+    ended_streak: int = 0
+    last_win: dataclasses.MatchResult | None = None
+    last_loss: dataclasses.MatchResult | None = None
+    last_match: dataclasses.MatchResult | None = None
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "matches": self.matches,
+            "wins": self.wins,
+            "win_streak": self.win_streak,
+            "loss_streak": self.loss_streak,
+            "ended_streak": self.ended_streak,
+            "last_win": match_reference(self.last_win) if self.last_win else None,
+            "last_loss": match_reference(self.last_loss) if self.last_loss else None,
+            "last_match": match_reference(self.last_match) if self.last_match else None,
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> "PlayerState":
+        match_fields = ("last_win", "last_loss", "last_match")
+        return cls(
+            **{
+                **data,
+                **{
+                    field: matches.match_by_id(data[field]) if data[field] else None
+                    for field in match_fields
+                },
+            }
+        )
+
+    def record_win(self, match: dataclasses.MatchResult) -> None:
+        self.matches += 1
+        self.wins += 1
+        self.ended_streak = self.loss_streak
+        self.loss_streak = 0
+        self.win_streak += 1
+        self.last_win = match
+        self.last_match = match
+
+    def record_loss(self, match: dataclasses.MatchResult) -> None:
+        self.matches += 1
+        self.ended_streak = self.win_streak
+        self.win_streak = 0
+        self.loss_streak += 1
+        self.last_loss = match
+        self.last_match = match
+
+
+@attrs.define
+class PlayerStates(Feature):
+    """
+    The running record of every player, in the order they first played.
+    """
+
+    _players: dict[core_dataclasses.User, PlayerState] = attrs.Factory(dict)
+
+    def __getitem__(self, player: core_dataclasses.User) -> PlayerState:
+        return self._players[player]
+
+    def items(self) -> typing.ItemsView[core_dataclasses.User, PlayerState]:
+        return self._players.items()
+
+    def observe(self, match: dataclasses.MatchResult, features: Features) -> None:
+        self._players.setdefault(match.winner, PlayerState()).record_win(match)
+        self._players.setdefault(match.loser, PlayerState()).record_loss(match)
+
+    def to_dict(self) -> list[dict[str, typing.Any]]:
+        return [
+            {"player": player.to_dict(), "state": player_state.to_dict()}
+            for player, player_state in self._players.items()
+        ]
+
+    @classmethod
+    def from_dict(
+        cls, data: list[dict[str, typing.Any]], matches: dataclasses.MatchLookup
+    ) -> "PlayerStates":
+        return cls(
+            players={
+                core_dataclasses.User.from_dict(entry["player"]): PlayerState.from_dict(
+                    entry["state"], matches
+                )
+                for entry in data
+            }
+        )
+
+
+@attrs.define
+class PointDifferences(Feature):
+    """
+    Each player's total point difference over their matches, in the order they first played.
+    """
+
+    _point_differences: dict[core_dataclasses.User, int] = attrs.Factory(dict)
+
+    def __getitem__(self, player: core_dataclasses.User) -> int:
+        return self._point_differences[player]
+
+    def items(self) -> typing.ItemsView[core_dataclasses.User, int]:
+        return self._point_differences.items()
+
+    def observe(self, match: dataclasses.MatchResult, features: Features) -> None:
+        point_difference = match.winner_score - match.loser_score
+        self._point_differences[match.winner] = (
+            self._point_differences.get(match.winner, 0) + point_difference
+        )
+        self._point_differences[match.loser] = (
+            self._point_differences.get(match.loser, 0) - point_difference
+        )
+
+    def to_dict(self) -> list[list[typing.Any]]:
+        return [
+            [player.to_dict(), point_difference]
+            for player, point_difference in self._point_differences.items()
+        ]
+
+    @classmethod
+    def from_dict(
+        cls, data: list[list[typing.Any]], matches: dataclasses.MatchLookup
+    ) -> "PointDifferences":
+        return cls(
+            point_differences={
+                core_dataclasses.User.from_dict(player): point_difference
+                for player, point_difference in data
+            }
+        )
+
+
+@attrs.define
+class RecordHistory(Feature):
+    """
+    Each player's wins and matches after each of their last `length` matches, oldest first.
+    """
+
+    requires: typing.ClassVar[tuple[type[Feature], ...]] = (PlayerStates,)
+    length: typing.ClassVar[int] = 11
+
+    _records: dict[core_dataclasses.User, deque[tuple[int, int]]] = attrs.Factory(dict)
+
+    def items(self) -> typing.ItemsView[core_dataclasses.User, deque[tuple[int, int]]]:
+        return self._records.items()
+
+    def observe(self, match: dataclasses.MatchResult, features: Features) -> None:
+        players = features[PlayerStates]
+        for player in (match.winner, match.loser):
+            if (records := self._records.get(player)) is None:
+                records = self._records[player] = deque(maxlen=self.length)
+            player_state = players[player]
+            records.append((player_state.wins, player_state.matches))
+
+    def to_dict(self) -> list[list[typing.Any]]:
+        return [
+            [player.to_dict(), [list(record) for record in records]]
+            for player, records in self._records.items()
+        ]
+
+    @classmethod
+    def from_dict(
+        cls, data: list[list[typing.Any]], matches: dataclasses.MatchLookup
+    ) -> "RecordHistory":
+        return cls(
+            records={
+                core_dataclasses.User.from_dict(player): deque(
+                    ((wins, num_matches) for wins, num_matches in records), maxlen=cls.length
+                )
+                for player, records in data
+            }
+        )
+
+
+def plan_features(collector_types: list[type["BadgeCollector"]]) -> list[type[Feature]]:
+    """
+    Work out the features that the collectors need, along with the features that those need in turn, ordered so that
+    each feature comes after the features it needs.
+    """
+    planned: list[type[Feature]] = []
+
+    def _plan(feature_type: type[Feature]) -> None:
+        if feature_type in planned:
+            return
+        for required_feature_type in feature_type.requires:
+            _plan(required_feature_type)
+        planned.append(feature_type)
+
+    for collector_type in collector_types:
+        for feature_type in collector_type.features:
+            _plan(feature_type)
+    return planned
+
+
 T_badge = typing.TypeVar("T_badge", bound=Badge)
+T_collector = typing.TypeVar("T_collector", bound="BadgeCollector")
 
 
 class BadgeCollector(typing.Generic[T_badge]):
     """
     A class which implements the logic to collect a specific badge for a series of matches.
+
+    Collectors declare the `features` they need, which are built once per pass and shared by all of the collectors in
+    it. The features have already observed the current match when the collectors do. Anything that isn't a feature is
+    kept by the collector itself.
     """
 
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
+    features: typing.ClassVar[tuple[type[Feature], ...]] = ()
+
+    def mutate_context_for_match(self, match: dataclasses.MatchResult, features: Features) -> None:
         """
         This method should be implemented by the subclass to update any class context for the current match.
         """
 
-    def collect(self) -> list[T_badge]:
+    def collect(self, features: Features) -> list[T_badge]:
         """
         This method should be implemented by the subclass to build / return any badges that have been earned.
         """
         return []
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        """
+        This method should be implemented by the subclass to snapshot its context, so collecting can be resumed from
+        it later. Matches are referred to by their result ID.
+        """
+        return {}
+
+    @classmethod
+    def from_dict(
+        cls: type[T_collector], data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> T_collector:
+        """
+        Restore a collector from a snapshot of its context, looking up the matches it refers to in `matches`.
+        """
+        return cls()
+
+
+def match_reference(match: dataclasses.MatchResult) -> str:
+    return str(match.result_id)
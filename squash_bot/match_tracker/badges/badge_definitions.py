@@ -1,4 +1,4 @@
-from collections import defaultdict
+import typing
 from decimal import Decimal
 
 import attrs
@@ -27,16 +27,29 @@ class CrushCollector(badge.BadgeCollector[Crush]):
     def __init__(self) -> None:
         self._crushed_matches: set[dataclasses.MatchResult] = set()
 
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
+    def mutate_context_for_match(
+        self, match: dataclasses.MatchResult, features: badge.Features
+    ) -> None:
         if match.loser_score == 0:
             self._crushed_matches.add(match)
 
-    def collect(self) -> list[Crush]:
+    def collect(self, features: badge.Features) -> list[Crush]:
         return [
             Crush(player=match.winner, opponent=match.loser, badge_earned_in=match)
             for match in self._crushed_matches
         ]
 
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {"matches": [badge.match_reference(match) for match in self._crushed_matches]}
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> "CrushCollector":
+        collector = cls()
+        collector._crushed_matches = {matches.match_by_id(match) for match in data["matches"]}
+        return collector
+
 
 @attrs.frozen
 class CleanSweep(badge.Badge):
@@ -52,21 +65,14 @@ class CleanSweep(badge.Badge):
 
 
 class CleanSweepCollector(badge.BadgeCollector[CleanSweep]):
-    def __init__(self) -> None:
-        # Track the last win so we can associate it to the badge
-        self._players_last_win: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-        self._players: set[core_dataclasses.User] = set()
-        self._players_with_loss: set[core_dataclasses.User] = set()
-
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        self._players.add(match.winner)
-        self._players_last_win[match.winner] = match
-        self._players_with_loss.add(match.loser)
+    features = (badge.PlayerStates,)
 
-    def collect(self) -> list[CleanSweep]:
+    def collect(self, features: badge.Features) -> list[CleanSweep]:
+        # The badge is associated with the player's last win
         return [
-            CleanSweep(player=player, badge_earned_in=self._players_last_win[player])
-            for player in self._players - self._players_with_loss
+            CleanSweep(player=player, badge_earned_in=player_state.last_win)
+            for player, player_state in features[badge.PlayerStates].items()
+            if player_state.wins == player_state.matches and player_state.last_win
         ]
 
 
@@ -84,21 +90,14 @@ class WoodenSpoon(badge.Badge):
 
 
 class WoodenSpoonCollector(badge.BadgeCollector[WoodenSpoon]):
-    def __init__(self) -> None:
-        # Track the last loss so we can associate it to the badge
-        self._players_last_loss: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-        self._players: set[core_dataclasses.User] = set()
-        self._players_with_win: set[core_dataclasses.User] = set()
-
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        self._players.add(match.loser)
-        self._players_last_loss[match.loser] = match
-        self._players_with_win.add(match.winner)
+    features = (badge.PlayerStates,)
 
-    def collect(self) -> list[WoodenSpoon]:
+    def collect(self, features: badge.Features) -> list[WoodenSpoon]:
+        # The badge is associated with the player's last loss
         return [
-            WoodenSpoon(player=player, badge_earned_in=self._players_last_loss[player])
-            for player in self._players - self._players_with_win
+            WoodenSpoon(player=player, badge_earned_in=player_state.last_loss)
+            for player, player_state in features[badge.PlayerStates].items()
+            if player_state.wins == 0 and player_state.last_loss
         ]
 
 
@@ -121,43 +120,67 @@ class WinStreak(badge.Badge):
 
 
 class WinStreakCollector(badge.BadgeCollector[WinStreak]):
+    features = (badge.PlayerStates,)
     min_streak_length = 3
 
     def __init__(self) -> None:
         self._streaks: list[WinStreak] = []
-        self._players_last_win: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-        self._current_streaks: dict[core_dataclasses.User, int] = defaultdict(int)
 
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        ended_streak = self._current_streaks[match.loser]
-        if ended_streak >= self.min_streak_length:
+    def mutate_context_for_match(
+        self, match: dataclasses.MatchResult, features: badge.Features
+    ) -> None:
+        loser = features[badge.PlayerStates][match.loser]
+        if loser.ended_streak >= self.min_streak_length and loser.last_win:
             self._streaks.append(
                 WinStreak(
                     player=match.loser,
-                    streak_length=ended_streak,
-                    badge_earned_in=self._players_last_win[match.loser],
+                    streak_length=loser.ended_streak,
+                    badge_earned_in=loser.last_win,
                     is_ongoing=False,
                 )
             )
 
-        self._current_streaks[match.loser] = 0
-        self._current_streaks[match.winner] += 1
-        self._players_last_win[match.winner] = match
-
-    def collect(self) -> list[WinStreak]:
+    def collect(self, features: badge.Features) -> list[WinStreak]:
         # Collect any ongoing streaks
-        for player, streak_length in self._current_streaks.items():
-            if streak_length >= self.min_streak_length:
-                self._streaks.append(
-                    WinStreak(
-                        player=player,
-                        streak_length=streak_length,
-                        badge_earned_in=self._players_last_win[player],
-                        is_ongoing=True,
-                    )
-                )
-
-        return self._streaks
+        ongoing_streaks = [
+            WinStreak(
+                player=player,
+                streak_length=player_state.win_streak,
+                badge_earned_in=player_state.last_win,
+                is_ongoing=True,
+            )
+            for player, player_state in features[badge.PlayerStates].items()
+            if player_state.win_streak >= self.min_streak_length and player_state.last_win
+        ]
+        return self._streaks + ongoing_streaks
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "streaks": [
+                [
+                    streak.player.to_dict(),
+                    streak.streak_length,
+                    badge.match_reference(streak.badge_earned_in),
+                ]
+                for streak in self._streaks
+            ]
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> "WinStreakCollector":
+        collector = cls()
+        collector._streaks = [
+            WinStreak(
+                player=core_dataclasses.User.from_dict(player),
+                streak_length=streak_length,
+                badge_earned_in=matches.match_by_id(match),
+                is_ongoing=False,
+            )
+            for player, streak_length, match in data["streaks"]
+        ]
+        return collector
 
 
 @attrs.frozen
@@ -179,43 +202,67 @@ class LossStreak(badge.Badge):
 
 
 class LossStreakCollector(badge.BadgeCollector[LossStreak]):
+    features = (badge.PlayerStates,)
     min_streak_length = 3
 
     def __init__(self) -> None:
         self._streaks: list[LossStreak] = []
-        self._players_last_loss: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-        self._current_streaks: dict[core_dataclasses.User, int] = defaultdict(int)
 
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        ended_streak = self._current_streaks[match.winner]
-        if ended_streak >= self.min_streak_length:
+    def mutate_context_for_match(
+        self, match: dataclasses.MatchResult, features: badge.Features
+    ) -> None:
+        winner = features[badge.PlayerStates][match.winner]
+        if winner.ended_streak >= self.min_streak_length and winner.last_loss:
             self._streaks.append(
                 LossStreak(
                     player=match.winner,
-                    streak_length=ended_streak,
-                    badge_earned_in=self._players_last_loss[match.winner],
+                    streak_length=winner.ended_streak,
+                    badge_earned_in=winner.last_loss,
                     is_ongoing=False,
                 )
             )
 
-        self._current_streaks[match.winner] = 0
-        self._current_streaks[match.loser] += 1
-        self._players_last_loss[match.loser] = match
-
-    def collect(self) -> list[LossStreak]:
+    def collect(self, features: badge.Features) -> list[LossStreak]:
         # Collect any ongoing streaks
-        for player, streak_length in self._current_streaks.items():
-            if streak_length >= self.min_streak_length:
-                self._streaks.append(
-                    LossStreak(
-                        player=player,
-                        streak_length=streak_length,
-                        badge_earned_in=self._players_last_loss[player],
-                        is_ongoing=True,
-                    )
-                )
-
-        return self._streaks
+        ongoing_streaks = [
+            LossStreak(
+                player=player,
+                streak_length=player_state.loss_streak,
+                badge_earned_in=player_state.last_loss,
+                is_ongoing=True,
+            )
+            for player, player_state in features[badge.PlayerStates].items()
+            if player_state.loss_streak >= self.min_streak_length and player_state.last_loss
+        ]
+        return self._streaks + ongoing_streaks
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "streaks": [
+                [
+                    streak.player.to_dict(),
+                    streak.streak_length,
+                    badge.match_reference(streak.badge_earned_in),
+                ]
+                for streak in self._streaks
+            ]
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> "LossStreakCollector":
+        collector = cls()
+        collector._streaks = [
+            LossStreak(
+                player=core_dataclasses.User.from_dict(player),
+                streak_length=streak_length,
+                badge_earned_in=matches.match_by_id(match),
+                is_ongoing=False,
+            )
+            for player, streak_length, match in data["streaks"]
+        ]
+        return collector
 
 
 @attrs.frozen
@@ -234,15 +281,16 @@ class StreakBreaker(badge.Badge):
 
 
 class StreakBreakerCollector(badge.BadgeCollector[StreakBreaker]):
+    features = (badge.PlayerStates,)
     min_streak_length = 3
 
     def __init__(self) -> None:
         self._streaks: list[StreakBreaker] = []
-        self._players_last_win: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-        self._current_streaks: dict[core_dataclasses.User, int] = defaultdict(int)
 
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        ended_streak = self._current_streaks[match.loser]
+    def mutate_context_for_match(
+        self, match: dataclasses.MatchResult, features: badge.Features
+    ) -> None:
+        ended_streak = features[badge.PlayerStates][match.loser].ended_streak
         if ended_streak >= self.min_streak_length:
             self._streaks.append(
                 StreakBreaker(
@@ -253,13 +301,35 @@ class StreakBreakerCollector(badge.BadgeCollector[StreakBreaker]):
                 )
             )
 
-        self._current_streaks[match.loser] = 0
-        self._current_streaks[match.winner] += 1
-        self._players_last_win[match.winner] = match
-
-    def collect(self) -> list[StreakBreaker]:
+    def collect(self, features: badge.Features) -> list[StreakBreaker]:
         return self._streaks
 
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "streaks": [
+                [streak.streak_length, badge.match_reference(streak.badge_earned_in)]
+                for streak in self._streaks
+            ]
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> "StreakBreakerCollector":
+        collector = cls()
+        for streak_length, match_reference in data["streaks"]:
+            # The players are the winner and loser of the match that broke the streak
+            match = matches.match_by_id(match_reference)
+            collector._streaks.append(
+                StreakBreaker(
+                    player=match.winner,
+                    opponent=match.loser,
+                    streak_length=streak_length,
+                    badge_earned_in=match,
+                )
+            )
+        return collector
+
 
 @attrs.frozen
 class FirstWinAgainst(badge.Badge):
@@ -281,12 +351,14 @@ class FirstWinAgainstCollector(badge.BadgeCollector[FirstWinAgainst]):
             tuple[core_dataclasses.User, core_dataclasses.User], dataclasses.MatchResult
         ] = {}
 
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
+    def mutate_context_for_match(
+        self, match: dataclasses.MatchResult, features: badge.Features
+    ) -> None:
         winner_loser = (match.winner, match.loser)
         if winner_loser not in self._first_wins:
             self._first_wins[winner_loser] = match
 
-    def collect(self) -> list[FirstWinAgainst]:
+    def collect(self, features: badge.Features) -> list[FirstWinAgainst]:
         return [
             FirstWinAgainst(
                 player=winner_loser[0],
@@ -296,6 +368,22 @@ class FirstWinAgainstCollector(badge.BadgeCollector[FirstWinAgainst]):
             for winner_loser, match in self._first_wins.items()
         ]
 
+    def to_dict(self) -> dict[str, typing.Any]:
+        # The players are the winner and loser of the match itself
+        return {
+            "first_wins": [badge.match_reference(match) for match in self._first_wins.values()]
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, typing.Any], matches: dataclasses.MatchLookup
+    ) -> "FirstWinAgainstCollector":
+        collector = cls()
+        for match_reference in data["first_wins"]:
+            match = matches.match_by_id(match_reference)
+            collector._first_wins[(match.winner, match.loser)] = match
+        return collector
+
 
 @attrs.frozen
 class MVP(badge.Badge):
@@ -312,42 +400,29 @@ class MVP(badge.Badge):
 
 
 class MVPCollector(badge.BadgeCollector[MVP]):
-    def __init__(self) -> None:
-        self._point_differences: dict[core_dataclasses.User, int] = defaultdict(int)
-        self._num_matches: dict[core_dataclasses.User, int] = defaultdict(int)
-        # We associate the badge with the last match played by the player
-        self._player_last_match: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        point_difference = match.winner_score - match.loser_score
-        self._num_matches[match.winner] += 1
-        self._num_matches[match.loser] += 1
+    features = (badge.PlayerStates, badge.PointDifferences)
 
-        self._point_differences[match.winner] += point_difference
-        self._player_last_match[match.winner] = match
-
-        self._point_differences[match.loser] -= point_difference
-        self._player_last_match[match.loser] = match
-
-    def collect(self) -> list[MVP]:
+    def collect(self, features: badge.Features) -> list[MVP]:
+        players = features[badge.PlayerStates]
         highest_point_diff = Decimal(0)
         player_with_highest = None
-        for player in self._point_differences:
-            avg_point_diff = Decimal(
-                self._point_differences[player] / self._num_matches[player]
-            ).quantize(Decimal("0.01"))
+        for player, point_difference in features[badge.PointDifferences].items():
+            avg_point_diff = Decimal(point_difference / players[player].matches).quantize(
+                Decimal("0.01")
+            )
             if avg_point_diff > highest_point_diff:
                 highest_point_diff = avg_point_diff
                 player_with_highest = player
 
-        if not player_with_highest:
+        # We associate the badge with the last match played by the player
+        if not player_with_highest or not (last_match := players[player_with_highest].last_match):
             return []
 
         return [
             MVP(
                 player=player_with_highest,
                 average_point_difference=highest_point_diff,
-                badge_earned_in=self._player_last_match[player_with_highest],
+                badge_earned_in=last_match,
             )
         ]
 
@@ -368,47 +443,19 @@ class MostImprovedPlayer(badge.Badge):
 
 
 class MostImprovedPlayerCollector(badge.BadgeCollector[MostImprovedPlayer]):
-    n: int = 10
-
-    def __init__(self) -> None:
-        self._win_rates: dict[core_dataclasses.User, list] = defaultdict(list)
-        self._num_matches: dict[core_dataclasses.User, int] = defaultdict(int)
-        self._num_wins: dict[core_dataclasses.User, int] = defaultdict(int)
-        # We associate the badge with the last match played by the player
-        self._player_last_match: dict[core_dataclasses.User, dataclasses.MatchResult] = {}
-
-    def mutate_context_for_match(self, match: dataclasses.MatchResult) -> None:
-        self._num_matches[match.winner] += 1
-        self._num_matches[match.loser] += 1
-
-        self._num_wins[match.winner] += 1
-
-        self._win_rates[match.winner].append(
-            Decimal(self._num_wins[match.winner] / self._num_matches[match.winner]).quantize(
-                Decimal("0.01")
-            )
-        )
-        self._win_rates[match.loser].append(
-            Decimal(self._num_wins[match.loser] / self._num_matches[match.loser]).quantize(
-                Decimal("0.01")
-            )
-        )
-
-        self._player_last_match[match.winner] = match
-        self._player_last_match[match.loser] = match
-
-    def collect(self) -> list[MostImprovedPlayer]:
-        _win_rate_changes: dict[core_dataclasses.User, Decimal] = defaultdict(Decimal)
+    # Each player's record history goes back as far as we look
+    n: int = badge.RecordHistory.length - 1
+    features = (badge.PlayerStates, badge.RecordHistory)
 
+    def collect(self, features: badge.Features) -> list[MostImprovedPlayer]:
         best_win_rate_increase = Decimal(0)
         most_improved_player: core_dataclasses.User | None = None
-        for player in self._win_rates:
-            win_rates = self._win_rates[player]
-            if len(win_rates) <= self.n:
+        for player, records in features[badge.RecordHistory].items():
+            if len(records) <= self.n:
                 continue
 
-            win_rate_n_games_ago = win_rates[-(self.n + 1)]
-            win_rate_now = win_rates[-1]
+            win_rate_n_games_ago = _win_rate(*records[0])
+            win_rate_now = _win_rate(*records[-1])
 
             if (win_rate_change := win_rate_now - win_rate_n_games_ago) > best_win_rate_increase:
                 best_win_rate_increase = win_rate_change
@@ -417,16 +464,25 @@ class MostImprovedPlayerCollector(badge.BadgeCollector[MostImprovedPlayer]):
         if not most_improved_player:
             return []
 
+        # We associate the badge with the last match played by the player
+        if not (last_match := features[badge.PlayerStates][most_improved_player].last_match):
+            return []
+
         return [
             MostImprovedPlayer(
                 player=most_improved_player,
                 win_rate_increase=best_win_rate_increase,
                 over_n_games=self.n,
-                badge_earned_in=self._player_last_match[most_improved_player],
+                badge_earned_in=last_match,
             )
         ]
 
 
+def _win_rate(wins: int, num_matches: int) -> Decimal:
+    # Divided as decimals, so the fraction is rounded exactly rather than from its nearest float
+    return (Decimal(wins) / Decimal(num_matches)).quantize(Decimal("0.01"))
+
+
 badge_collector_mapping: dict[type[badge.Badge], type[badge.BadgeCollector]] = {
     Crush: CrushCollector,
     CleanSweep: CleanSweepCollector,
@@ -0,0 +1,104 @@
+import datetime
+import typing
+import uuid
+from decimal import Decimal
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses as dataclasses
+
+from . import badge, badge_definitions
+
+_badge_types: dict[str, type[badge.Badge]] = {
+    badge_type.__name__: badge_type for badge_type in badge_definitions.badge_collector_mapping
+}
+
+
+@attrs.frozen
+class BadgeIndex:
+    """
+    The badges earned in a guild's first `position` matches, looked up by session date, match and player.
+
+    The all-time badges are indexed by the session they were earned in, in the same way as `filter_badges_by_session`
+    filters them, alongside the badges collected over each session's matches.
+    """
+
+    position: int
+    _by_session: dict[datetime.date, list[badge.Badge]]
+    _by_result_id: dict[uuid.UUID, list[badge.Badge]]
+    _by_player: dict[core_dataclasses.User, list[badge.Badge]]
+
+    @classmethod
+    def build(
+        cls,
+        position: int,
+        all_time_badges: list[badge.Badge],
+        session_badges: dict[datetime.date, list[badge.Badge]],
+    ) -> "BadgeIndex":
+        by_session: dict[datetime.date, list[badge.Badge]] = {}
+        by_result_id: dict[uuid.UUID, list[badge.Badge]] = {}
+        by_player: dict[core_dataclasses.User, list[badge.Badge]] = {}
+
+        for badge_ in all_time_badges:
+            by_session.setdefault(badge_.badge_earned_in.played_on, []).append(badge_)
+        for session_date, badges in session_badges.items():
+            by_session.setdefault(session_date, []).extend(badges)
+
+        for badges in by_session.values():
+            for badge_ in badges:
+                by_result_id.setdefault(badge_.badge_earned_in.result_id, []).append(badge_)
+                # Every badge we define is earned by a player
+                if (player := getattr(badge_, "player", None)) is not None:
+                    by_player.setdefault(player, []).append(badge_)
+
+        return cls(
+            position=position,
+            by_session=by_session,
+            by_result_id=by_result_id,
+            by_player=by_player,
+        )
+
+    def for_session(self, session_date: datetime.date) -> list[badge.Badge]:
+        return list(self._by_session.get(session_date, []))
+
+    def for_match(self, result_id: uuid.UUID) -> list[badge.Badge]:
+        return list(self._by_result_id.get(result_id, []))
+
+    def for_player(self, player: core_dataclasses.User) -> list[badge.Badge]:
+        return list(self._by_player.get(player, []))
+
+
+def badge_to_dict(badge_: badge.Badge) -> dict[str, typing.Any]:
+    """
+    Snapshot a badge, referring to the match it was earned in by its result ID.
+    """
+    fields = {}
+    for field in attrs.fields(type(badge_)):
+        value = getattr(badge_, field.name)
+        if isinstance(value, dataclasses.MatchResult):
+            value = badge.match_reference(value)
+        elif isinstance(value, core_dataclasses.User):
+            value = value.to_dict()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        fields[field.name] = value
+    return {"badge": type(badge_).__name__, "fields": fields}
+
+
+def badge_from_dict(data: dict[str, typing.Any], matches: dataclasses.MatchLookup) -> badge.Badge:
+    """
+    Restore a badge from a snapshot, looking up the match it was earned in in `matches`.
+    """
+    badge_type = _badge_types[data["badge"]]
+    fields = {}
+    for field in attrs.fields(badge_type):
+        value = data["fields"][field.name]
+        if field.type is dataclasses.MatchResult:
+            value = matches.match_by_id(value)
+        elif field.type is core_dataclasses.User:
+            value = core_dataclasses.User.from_dict(value)
+        elif field.type is Decimal:
+            value = Decimal(value)
+        fields[field.name] = value
+    return badge_type(**fields)
@@ -1,8 +1,13 @@
 import datetime
+import decimal
+import heapq
+import typing
 
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import checkpoints, storage
 from squash_bot.match_tracker.data import dataclasses as dataclasses
 
-from . import badge, badge_definitions
+from . import badge, badge_definitions, index, priority
 
 # Define the default badges that are most interesting when looking over all time
 default_all_time_badges = [
@@ -22,26 +27,381 @@ default_session_badges = [
 ]
 
 
+class _BadgePass:
+    """
+    The collectors for a set of badges, along with the features that they share.
+
+    Each feature that the collectors need is only built once per pass, however many of them need it.
+    """
+
+    def __init__(self, badges: list[type[badge.Badge]]) -> None:
+        self.badges = badges
+        collector_types = [badge_definitions.badge_collector_mapping[badge] for badge in badges]
+        self.feature_types = badge.plan_features(collector_types)
+        self.features = badge.Features.plan(self.feature_types)
+        self.collectors = [collector_type() for collector_type in collector_types]
+        # The number of matches observed, including any before the checkpoint the pass was resumed from
+        self.position = 0
+        # A reference to the last match observed, which a checkpoint of the pass is lined up with the matches by
+        self.last_match: str | None = None
+
+    @classmethod
+    def resume(
+        cls,
+        badges: list[type[badge.Badge]],
+        checkpoint: checkpoints.Checkpoint | None,
+        matches: dataclasses.Matches,
+    ) -> "_BadgePass":
+        """
+        Resume a pass from a checkpoint of the first matches in `matches`.
+
+        We start from scratch if there isn't a checkpoint, or if it's for a different set of badges or doesn't line
+        up with the matches.
+        """
+        if checkpoint is None or not _lines_up(checkpoint, matches):
+            return cls(badges)
+        try:
+            return cls.from_checkpoint(badges, checkpoint, matches)
+        except (dataclasses.MatchNotFound, KeyError, ValueError):
+            # The checkpoint refers to a match that's gone, or was written by an older version of the badges
+            return cls(badges)
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        badges: list[type[badge.Badge]],
+        checkpoint: checkpoints.Checkpoint,
+        matches: dataclasses.MatchLookup,
+    ) -> "_BadgePass":
+        badge_pass = cls.from_dict(badges, checkpoint.state, matches)
+        badge_pass.position = checkpoint.position
+        return badge_pass
+
+    @classmethod
+    def from_dict(
+        cls,
+        badges: list[type[badge.Badge]],
+        data: dict[str, typing.Any],
+        matches: dataclasses.MatchLookup,
+    ) -> "_BadgePass":
+        """
+        Restore a pass from a snapshot, raising `ValueError` if it's for a different set of badges.
+        """
+        badge_pass = cls(badges)
+        if data["badges"] != [badge.__name__ for badge in badges]:
+            raise ValueError("The snapshot is for a different set of badges")
+        badge_pass.features = badge.Features.from_dict(
+            badge_pass.feature_types, data["features"], matches
+        )
+        badge_pass.collectors = [
+            badge_definitions.badge_collector_mapping[badge].from_dict(collector_state, matches)
+            for badge, collector_state in zip(badges, data["collectors"])
+        ]
+        badge_pass.last_match = data["last_match"]
+        return badge_pass
+
+    def observe(self, match: dataclasses.MatchResult) -> None:
+        self.position += 1
+        self.last_match = badge.match_reference(match)
+        self.features.observe(match)
+        for collector in self.collectors:
+            collector.mutate_context_for_match(match, self.features)
+
+    def collect(self) -> list[badge.Badge]:
+        collected_badges = []
+        for collector in self.collectors:
+            collected_badges.extend(collector.collect(self.features))
+        return collected_badges
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "badges": [badge.__name__ for badge in self.badges],
+            "last_match": self.last_match,
+            "features": self.features.to_dict(),
+            "collectors": [collector.to_dict() for collector in self.collectors],
+        }
+
+
+def _lines_up(checkpoint: checkpoints.Checkpoint, matches: dataclasses.Matches) -> bool:
+    if not 0 < checkpoint.position <= len(matches):
+        return False
+    last_match = matches.match_results[checkpoint.position - 1]
+    return checkpoint.state["last_match"] == badge.match_reference(last_match)
+
+
 def collect_badges(
     matches: dataclasses.Matches, badges: list[type[badge.Badge]]
 ) -> list[badge.Badge]:
     """
     This function will collect all the badges that the players have earned.
     """
-    # Fetch all the `Collectors` required for the requested badges
-    collectors = [badge_definitions.badge_collector_mapping[badge]() for badge in badges]
+    badge_pass = _BadgePass(badges)
+    for match in matches.match_results:
+        badge_pass.observe(match)
+    return badge_pass.collect()
+
+
+def collect_badges_for_session(
+    matches: dataclasses.Matches,
+    session_date: datetime.date,
+    all_time_badges: list[type[badge.Badge]],
+    session_badges: list[type[badge.Badge]],
+) -> list[badge.Badge]:
+    """
+    Collect the all-time badges over every match and the session badges over the matches played on the session date,
+    in a single pass over the matches.
 
-    # Loop over all the matches and allow each collector to update their contexts
+    The session badges get their own player state, so a session badge only sees the session's matches.
+    """
+    all_time_pass = _BadgePass(all_time_badges)
+    session_pass = _BadgePass(session_badges)
     for match in matches.match_results:
-        for collector in collectors:
-            collector.mutate_context_for_match(match)
+        all_time_pass.observe(match)
+        if match.played_on == session_date:
+            session_pass.observe(match)
+    return all_time_pass.collect() + session_pass.collect()
+
+
+def get_badge_index(
+    guild: core_dataclasses.Guild,
+    matches: dataclasses.Matches,
+    all_time_badges: list[type[badge.Badge]] = default_all_time_badges,
+    session_badges: list[type[badge.Badge]] = default_session_badges,
+) -> index.BadgeIndex:
+    """
+    Get the index of the badges earned in all of the guild's matches, without storing anything.
+
+    The all-time badges resume from the guild's latest checkpoint and the session badges are read from its session
+    log, so only the matches since the checkpoint are replayed, along with the sessions they were played in. Both are
+    kept up to date by `update_badge_index` as matches are recorded.
+    """
+    checkpoint_log, _ = storage.get_badge_checkpoints(guild)
+    all_time_pass, sessions, _ = _caught_up(
+        guild, matches, checkpoint_log, all_time_badges, session_badges
+    )
+    return index.BadgeIndex.build(
+        position=all_time_pass.position,
+        all_time_badges=all_time_pass.collect(),
+        session_badges=sessions,
+    )
+
+
+def update_badge_index(
+    guild: core_dataclasses.Guild,
+    match_result: dataclasses.MatchResult,
+    previous_log_version: str | None,
+    log_version: str,
+    all_time_badges: list[type[badge.Badge]] = default_all_time_badges,
+    session_badges: list[type[badge.Badge]] = default_session_badges,
+) -> None:
+    """
+    Bring the guild's badges up to date with a match result that's just been appended to its log, taking the log from
+    `previous_log_version` to `log_version`.
+
+    The all-time badges resume from the latest checkpoint and only observe the new match, as do the badges of the
+    session it was played in, so the log isn't read. If the checkpoint isn't of the log just before the new match,
+    e.g. because a match has been edited since, or the match was played in an earlier session than the latest, the
+    badges are rebuilt from the log instead.
+    """
+    checkpoint_log, checkpoints_version = storage.get_badge_checkpoints(guild)
+    checkpoint = checkpoint_log.checkpoints[-1] if checkpoint_log.checkpoints else None
+    if checkpoint is None or checkpoint.state.get("log_version") != previous_log_version:
+        rebuild_badge_index(guild, all_time_badges, session_badges)
+        return
+
+    matches = storage.get_match_lookup(guild)
+    try:
+        all_time_pass = _BadgePass.from_checkpoint(all_time_badges, checkpoint, matches)
+        latest_session = checkpoint.state["session"]
+        latest_session_date = datetime.date.fromisoformat(latest_session["date"])
+        if match_result.played_on == latest_session_date:
+            session_pass = _BadgePass.from_dict(session_badges, latest_session, matches)
+        elif match_result.played_on > latest_session_date:
+            session_pass = _BadgePass(session_badges)
+        else:
+            # The session's earlier matches are only in the log
+            raise ValueError("The match was played before the latest session")
+    except (dataclasses.MatchNotFound, KeyError, ValueError):
+        rebuild_badge_index(guild, all_time_badges, session_badges)
+        return
+
+    all_time_pass.observe(match_result)
+    session_pass.observe(match_result)
+    # The session is stored first, so the checkpoint never covers a session that's missing from the session log. If
+    # it can't be stored, the checkpoint is left behind the log, so reads collect the session from the log and the
+    # next update rebuilds the badges.
+    if not storage.append_badge_sessions(
+        guild,
+        [
+            _session_checkpoint(
+                match_result.played_on,
+                all_time_pass.position,
+                session_badges,
+                session_pass.collect(),
+            )
+        ],
+    ):
+        return
+    # If the checkpoints have changed since we read them, e.g. because a match was edited, we leave them be
+    storage.store_badge_checkpoints(
+        guild,
+        checkpoint_log.added(
+            _checkpoint(all_time_pass, match_result.played_on, session_pass, log_version)
+        ),
+        if_version=checkpoints_version,
+    )
+
+
+def rebuild_badge_index(
+    guild: core_dataclasses.Guild,
+    all_time_badges: list[type[badge.Badge]] = default_all_time_badges,
+    session_badges: list[type[badge.Badge]] = default_session_badges,
+) -> index.BadgeIndex:
+    """
+    Bring the guild's badges up to date with every match in its log, e.g. to backfill them.
+
+    Like `get_badge_index`, this resumes from the latest checkpoint that lines up with the matches, then stores the
+    sessions it collected and a new checkpoint so that later updates only need to observe the new matches.
+    """
+    matches, log_version = storage.get_versioned_match_results(guild)
+    checkpoint_log, checkpoints_version = storage.get_badge_checkpoints(guild)
+    all_time_pass, sessions, collected_dates = _caught_up(
+        guild, matches, checkpoint_log, all_time_badges, session_badges
+    )
+    if not matches:
+        return index.BadgeIndex.build(position=0, all_time_badges=[], session_badges={})
+
+    badge_index = index.BadgeIndex.build(
+        position=all_time_pass.position,
+        all_time_badges=all_time_pass.collect(),
+        session_badges=sessions,
+    )
+    # As in `update_badge_index`, the checkpoint is only stored once the sessions it covers are
+    if not storage.append_badge_sessions(
+        guild,
+        [
+            _session_checkpoint(
+                session_date, all_time_pass.position, session_badges, sessions[session_date]
+            )
+            for session_date in sorted(collected_dates)
+        ],
+    ):
+        return badge_index
+    latest_session_date = max(match.played_on for match in matches.match_results)
+    storage.store_badge_checkpoints(
+        guild,
+        checkpoint_log.added(
+            _checkpoint(
+                all_time_pass,
+                latest_session_date,
+                _collect_session(matches, latest_session_date, session_badges),
+                log_version,
+            )
+        ),
+        if_version=checkpoints_version,
+    )
+    return badge_index
+
+
+def _caught_up(
+    guild: core_dataclasses.Guild,
+    matches: dataclasses.Matches,
+    checkpoint_log: checkpoints.CheckpointLog,
+    all_time_badges: list[type[badge.Badge]],
+    session_badges: list[type[badge.Badge]],
+) -> tuple[_BadgePass, dict[datetime.date, list[badge.Badge]], set[datetime.date]]:
+    """
+    Resume the all-time badges and the badges of each session, and catch them up with the matches since the latest
+    checkpoint.
+
+    Returns the all-time pass, each session's badges, and the dates of the sessions that were collected again. Every
+    session is collected again if the session log can't be used.
+    """
+    all_time_pass = _BadgePass.resume(
+        all_time_badges, checkpoint_log.latest(len(matches)), matches
+    )
+    new_matches = matches.match_results[all_time_pass.position :]
+    for match in new_matches:
+        all_time_pass.observe(match)
+
+    sessions = _read_sessions(guild, session_badges, matches)
+    if sessions is None:
+        sessions = {}
+        collected_dates = {match.played_on for match in matches.match_results}
+    else:
+        collected_dates = {match.played_on for match in new_matches}
+    for session_date in collected_dates:
+        sessions[session_date] = _collect_session(matches, session_date, session_badges).collect()
+    return all_time_pass, sessions, collected_dates
 
-    # Collect the badges
-    collected_badges = []
-    for collector in collectors:
-        collected_badges.extend(collector.collect())
 
-    return collected_badges
+def _collect_session(
+    matches: dataclasses.Matches,
+    session_date: datetime.date,
+    session_badges: list[type[badge.Badge]],
+) -> _BadgePass:
+    session_pass = _BadgePass(session_badges)
+    for match in matches.on_date(session_date).match_results:
+        session_pass.observe(match)
+    return session_pass
+
+
+def _read_sessions(
+    guild: core_dataclasses.Guild,
+    session_badges: list[type[badge.Badge]],
+    matches: dataclasses.Matches,
+) -> dict[datetime.date, list[badge.Badge]] | None:
+    """
+    Get the badges stored in the guild's session log, or `None` if they can't be used.
+    """
+    badge_names = [badge.__name__ for badge in session_badges]
+    sessions = {}
+    try:
+        for session_date, session in storage.get_badge_sessions(guild).sessions.items():
+            if session.state["badges"] != badge_names:
+                return None
+            sessions[session_date] = [
+                index.badge_from_dict(badge_data, matches)
+                for badge_data in session.state["collected"]
+            ]
+    except (dataclasses.MatchNotFound, KeyError):
+        return None
+    return sessions
+
+
+def _session_checkpoint(
+    session_date: datetime.date,
+    position: int,
+    session_badges: list[type[badge.Badge]],
+    badges: list[badge.Badge],
+) -> checkpoints.SessionCheckpoint:
+    return checkpoints.SessionCheckpoint(
+        session_date=session_date,
+        position=position,
+        state={
+            "badges": [badge.__name__ for badge in session_badges],
+            "collected": [index.badge_to_dict(badge_) for badge_ in badges],
+        },
+    )
+
+
+def _checkpoint(
+    all_time_pass: _BadgePass,
+    session_date: datetime.date,
+    session_pass: _BadgePass,
+    log_version: str,
+) -> checkpoints.Checkpoint:
+    """
+    Checkpoint the all-time badges, along with the pass over the latest session so it can carry on from there.
+    """
+    return checkpoints.Checkpoint(
+        position=all_time_pass.position,
+        state={
+            **all_time_pass.to_dict(),
+            "log_version": log_version,
+            "session": {"date": session_date.isoformat(), **session_pass.to_dict()},
+        },
+    )
 
 
 def filter_badges_by_session(
@@ -68,3 +428,26 @@ def deduplicate_badges(badges: list[badge.Badge]) -> list[badge.Badge]:
     one session, we will get two `WinStreak` badges. It's quite boring to show both of them, so we'll just show one.
     """
     return list(set(badges))
+
+
+def rank_badges(badges: list[badge.Badge], limit: int) -> list[badge.Badge]:
+    """
+    Get the `limit` badges with the highest priority, highest first, after removing duplicates.
+
+    Each badge's priority is only worked out once. Of a set of duplicate badges, the one with the highest priority is
+    kept, as `deduplicate_badges` does when given the badges in priority order. Badges with the same priority stay
+    in the order they were given in.
+    """
+    prioritised: dict[badge.Badge, tuple[decimal.Decimal, badge.Badge]] = {}
+    for badge_ in badges:
+        badge_priority = priority.get_priority(badge_)
+        kept = prioritised.get(badge_)
+        if kept is None or badge_priority > kept[0]:
+            # Reassigning an existing key keeps its original position, so ties stay in the given order
+            prioritised[badge_] = (badge_priority, badge_)
+    return [
+        badge_
+        for _, badge_ in heapq.nlargest(
+            limit, prioritised.values(), key=lambda prioritised_badge: prioritised_badge[0]
+        )
+    ]
@@ -7,7 +7,8 @@ from squash_bot.core import command_registry, response_message
 from squash_bot.core.data import constants as core_constants
 from squash_bot.core.data import dataclasses as core_dataclasses
 from squash_bot.match_tracker import filterers, formatters, orderers, queries, utils, validate
-from squash_bot.match_tracker.data import dataclasses, storage
+from squash_bot.match_tracker.badges import queries as badge_queries
+from squash_bot.match_tracker.data import dataclasses, form, leaderboards, storage
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -75,7 +76,11 @@ class RecordMatchCommand(_command.Command):
         validate.validate_match_result(match_result)
 
         logger.info(f"Recording match: {match_result}")
-        storage.store_match_result(match_result, guild)
+        appended = storage.store_match_result(match_result, guild)
+        # Keep the badges up to date so the next summary only has to look them up
+        badge_queries.update_badge_index(
+            guild, match_result, appended.previous_version, appended.version
+        )
 
         return response_message.ChannelMessageResponseBody(
             content=utils.build_match_string(match_result)
@@ -96,11 +101,12 @@ class FilterOrderFormatMatchesMixin:
     ) -> response_message.ResponseBody:
         matches = queries.get_matches(guild)
 
-        filtered_matches = self.filterer.filter(matches, **options)
-        ordered_matches = self.orderer.order(filtered_matches, **options)
+        # Plan the filter and ordering together so they run as a single pass over the matches
+        query = self.filterer.plan(matches.query(), **options)
+        ordered_matches = self.orderer.plan(query, **options).execute()
 
         if ordered_matches:
-            content = self.formatter.format_matches(ordered_matches, **options)
+            content = self.formatter.format_matches(ordered_matches, guild=guild, **options)
         else:
             content = "No matches have been recorded."
 
@@ -133,7 +139,7 @@ class ShowMatchesCommand(FilterOrderFormatMatchesMixin, _command.Command):
 
 
 @command_registry.registry.register
-class LeagueTableCommand(FilterOrderFormatMatchesMixin, _command.Command):
+class LeagueTableCommand(_command.Command):
     name = "league-table"
     description = "Show league table."
     options = (
@@ -143,10 +149,205 @@ class LeagueTableCommand(FilterOrderFormatMatchesMixin, _command.Command):
             type=core_constants.CommandOptionType.STRING,
             required=False,
         ),
+        _command.CommandOption(
+            name="include-matches-to",
+            description="Only include matches played on or before this date. Defaults to today.",
+            type=core_constants.CommandOptionType.STRING,
+            required=False,
+        ),
+        _command.CommandOption(
+            name="order-by",
+            description="What to order the table by. Defaults to win percentage.",
+            type=core_constants.CommandOptionType.STRING,
+            required=False,
+            default="win-rate",
+            choices=(
+                _command.CommandOptionChoice(
+                    "Win %", "win-rate", core_constants.CommandOptionType.STRING
+                ),
+                _command.CommandOptionChoice(
+                    "Rating", "rating", core_constants.CommandOptionType.STRING
+                ),
+            ),
+        ),
     )
 
-    filterer = filterers.OptionalFromDateFilterer
-    formatter = formatters.LeagueTable
+    def _handle(
+        self,
+        options: dict[str, typing.Any],
+        base_context: dict[str, typing.Any],
+        guild: core_dataclasses.Guild,
+        user: core_dataclasses.User,
+    ) -> response_message.ResponseBody:
+        from_date_string = options.get("include-matches-from")
+        to_date_string = options.get("include-matches-to")
+        if from_date_string or to_date_string:
+            # Any other window is tallied from the running totals, without replaying its matches
+            tally_by_player = queries.get_tally_index(guild).window(
+                start=datetime.date.fromisoformat(from_date_string) if from_date_string else None,
+                end=datetime.date.fromisoformat(to_date_string) if to_date_string else None,
+            )
+        else:
+            # The all-time table can be read from the materialized tally without replaying every match
+            tally_by_player = queries.get_all_time_tally(guild)
+
+        if tally_by_player:
+            # Ratings are always all-time, however the matches in the table are windowed
+            rating_table = (
+                queries.get_rating_table(guild) if options.get("order-by") == "rating" else None
+            )
+            content = formatters.LeagueTable.format_tally(tally_by_player, rating_table)
+        else:
+            content = "No matches have been recorded."
+        return response_message.ChannelMessageResponseBody(content=content)
+
+
+@command_registry.registry.register
+class FormCommand(_command.Command):
+    name = "form"
+    description = f"Show everyone's form over their last {form.RECENT_MATCHES} matches."
+    options = ()
+
+    def _handle(
+        self,
+        options: dict[str, typing.Any],
+        base_context: dict[str, typing.Any],
+        guild: core_dataclasses.Guild,
+        user: core_dataclasses.User,
+    ) -> response_message.ResponseBody:
+        # Each player's latest matches are kept in the guild's form table, so no matches need replaying
+        form_table = queries.get_form_table(guild)
+        if form_table.form_by_player:
+            content = formatters.Form.format_form_table(form_table)
+        else:
+            content = "No matches have been recorded."
+        return response_message.ChannelMessageResponseBody(content=content)
+
+
+@command_registry.registry.register
+class LeaderboardCommand(_command.Command):
+    name = "leaderboard"
+    description = "Show who's top for a stat."
+    options = (
+        _command.CommandOption(
+            name="stat",
+            description="The stat to rank players by",
+            type=core_constants.CommandOptionType.STRING,
+            required=True,
+            choices=tuple(
+                _command.CommandOptionChoice(
+                    stat.label, stat.name, core_constants.CommandOptionType.STRING
+                )
+                for stat in leaderboards.STATS
+            ),
+        ),
+        _command.CommandOption(
+            name="top",
+            description=f"How many players to show. Defaults to {formatters.Leaderboard.TOP}.",
+            type=core_constants.CommandOptionType.INTEGER,
+            required=False,
+            default=formatters.Leaderboard.TOP,
+            min_value=1,
+        ),
+    )
+
+    def _handle(
+        self,
+        options: dict[str, typing.Any],
+        base_context: dict[str, typing.Any],
+        guild: core_dataclasses.Guild,
+        user: core_dataclasses.User,
+    ) -> response_message.ResponseBody:
+        # The stat is one of the option's choices, but a request can't be relied on to have come through Discord
+        if options["stat"] not in leaderboards.STATS_BY_NAME:
+            raise _command.CommandVerificationError(
+                f"There's no leaderboard for {options['stat']}"
+            )
+
+        # The leaderboards are sorted as results are stored, so only the top entries are read
+        entries = queries.get_leaderboards(guild).top(options["stat"], options["top"])
+        if entries:
+            content = formatters.Leaderboard.format_entries(options["stat"], entries)
+        else:
+            content = "No matches have been recorded."
+        return response_message.ChannelMessageResponseBody(content=content)
+
+
+@command_registry.registry.register
+class RatingsCommand(_command.Command):
+    name = "ratings"
+    description = "Show everyone's Elo rating."
+    options = ()
+
+    def _handle(
+        self,
+        options: dict[str, typing.Any],
+        base_context: dict[str, typing.Any],
+        guild: core_dataclasses.Guild,
+        user: core_dataclasses.User,
+    ) -> response_message.ResponseBody:
+        # Ratings are updated as results are stored, so no matches need replaying
+        rating_table = queries.get_rating_table(guild)
+        if rating_table.rating_by_player:
+            content = formatters.Ratings.format_rating_table(rating_table)
+        else:
+            content = "No matches have been recorded."
+        return response_message.ChannelMessageResponseBody(content=content)
+
+
+@command_registry.registry.register
+class RankHistoryCommand(_command.Command):
+    name = "rank-history"
+    description = (
+        f"Show a player's league position after each of the last "
+        f"{formatters.RankHistory.SESSIONS} sessions."
+    )
+    options = (
+        _command.CommandOption(
+            name="player",
+            description="The player to show. Defaults to you.",
+            type=core_constants.CommandOptionType.USER,
+            required=False,
+        ),
+    )
+
+    def _handle(
+        self,
+        options: dict[str, typing.Any],
+        base_context: dict[str, typing.Any],
+        guild: core_dataclasses.Guild,
+        user: core_dataclasses.User,
+    ) -> response_message.ResponseBody:
+        player = options.get("player") or user
+        # Positions are recorded as results are stored, so no matches need replaying
+        rank_history = queries.get_rank_history(guild)
+        if rank_history.ranks_of(player):
+            content = formatters.RankHistory.format_rank_history(rank_history, player)
+        else:
+            content = f"{player.name} hasn't played any matches."
+        return response_message.ChannelMessageResponseBody(content=content)
+
+
+@command_registry.registry.register
+class RivalriesCommand(_command.Command):
+    name = "rivalries"
+    description = "Show everyone's nemesis and the biggest rivalries."
+    options = ()
+
+    def _handle(
+        self,
+        options: dict[str, typing.Any],
+        base_context: dict[str, typing.Any],
+        guild: core_dataclasses.Guild,
+        user: core_dataclasses.User,
+    ) -> response_message.ResponseBody:
+        # Every pair's record is kept in the guild's pair matrix, so no matches need replaying
+        pair_matrix = queries.get_pair_matrix(guild)
+        if pair_matrix.tally_by_pair:
+            content = formatters.Rivalries.format_pair_matrix(pair_matrix)
+        else:
+            content = "No matches have been recorded."
+        return response_message.ChannelMessageResponseBody(content=content)
 
 
 @command_registry.registry.register
@@ -182,8 +383,7 @@ class SingleMatchMixin:
         user: core_dataclasses.User,
     ) -> response_message.ResponseBody:
         match_id = options["match-id"]
-        matches = queries.get_matches(guild)
-        match = matches.match_by_id(match_id)
+        match = queries.get_match(guild, match_id)
         return self._handle_match(
             match,
             options,
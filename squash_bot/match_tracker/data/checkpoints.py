@@ -0,0 +1,155 @@
+import datetime
+import json
+import typing
+
+import attrs
+
+# Keep at most one checkpoint in each run of this many matches, so that repeated reads don't fill the log with
+# checkpoints a few matches apart
+CHECKPOINT_SPACING = 64
+MAX_CHECKPOINTS = 8
+
+
+@attrs.frozen
+class Checkpoint:
+    """
+    A snapshot of some state built up from a guild's match results, covering the first `position` matches.
+
+    `state` is whatever the owner of the checkpoint needs to resume from it, and must be JSON serializable.
+    """
+
+    position: int
+    state: dict[str, typing.Any]
+
+
+@attrs.frozen
+class CheckpointLog:
+    """
+    The checkpoints kept for one kind of state, oldest first.
+
+    Earlier checkpoints are kept alongside the latest one so that an edit to an older match only throws away the
+    checkpoints that cover it.
+    """
+
+    checkpoints: tuple[Checkpoint, ...] = ()
+
+    def latest(self, max_position: int) -> Checkpoint | None:
+        """
+        Get the latest checkpoint that covers no more than `max_position` matches.
+        """
+        for checkpoint in reversed(self.checkpoints):
+            if checkpoint.position <= max_position:
+                return checkpoint
+        return None
+
+    def added(self, checkpoint: Checkpoint) -> "CheckpointLog":
+        spacing_bucket = checkpoint.position // CHECKPOINT_SPACING
+        kept = [
+            existing
+            for existing in self.checkpoints
+            if existing.position // CHECKPOINT_SPACING < spacing_bucket
+        ]
+        return CheckpointLog(checkpoints=(*kept[-(MAX_CHECKPOINTS - 1) :], checkpoint))
+
+    def invalidated_from(self, position: int) -> "CheckpointLog":
+        """
+        Drop the checkpoints that cover the match at `position`, after it has been edited.
+        """
+        return CheckpointLog(
+            checkpoints=tuple(
+                checkpoint for checkpoint in self.checkpoints if checkpoint.position <= position
+            )
+        )
+
+    def to_list(self) -> list[dict[str, typing.Any]]:
+        return [
+            {"position": checkpoint.position, "state": checkpoint.state}
+            for checkpoint in self.checkpoints
+        ]
+
+    @classmethod
+    def from_list(cls, data: list[dict[str, typing.Any]]) -> "CheckpointLog":
+        return cls(
+            checkpoints=tuple(
+                Checkpoint(position=checkpoint["position"], state=checkpoint["state"])
+                for checkpoint in data
+            )
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_list(), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, contents: str) -> "CheckpointLog":
+        return cls.from_list(json.loads(contents))
+
+
+@attrs.frozen
+class SessionCheckpoint:
+    """
+    A snapshot of some state built up from the matches on a session date, as of the first `position` matches.
+    """
+
+    session_date: datetime.date
+    position: int
+    state: dict[str, typing.Any]
+
+
+@attrs.frozen
+class SessionLog:
+    """
+    The latest snapshot of each session, read from a log that's only ever appended to.
+
+    Each line of the log is either a snapshot, which supersedes any earlier snapshot of its session, or the position of
+    an edited match, which drops every snapshot that covers it. A guild's log grows by a line for each match rather
+    than being rewritten, however many sessions it has.
+    """
+
+    sessions: dict[datetime.date, SessionCheckpoint] = attrs.Factory(dict)
+
+    def get(self, session_date: datetime.date) -> SessionCheckpoint | None:
+        return self.sessions.get(session_date)
+
+    def invalidated_from(self, position: int) -> "SessionLog":
+        """
+        Drop the snapshots that cover the match at `position`, after it has been edited.
+        """
+        return SessionLog(
+            sessions={
+                session_date: session
+                for session_date, session in self.sessions.items()
+                if session.position <= position
+            }
+        )
+
+    @classmethod
+    def from_lines(cls, contents: str) -> "SessionLog":
+        session_log = cls()
+        for line in contents.splitlines():
+            data = json.loads(line)
+            if "invalidated_from" in data:
+                session_log = session_log.invalidated_from(data["invalidated_from"])
+            else:
+                session_date = datetime.date.fromisoformat(data["date"])
+                session_log.sessions[session_date] = SessionCheckpoint(
+                    session_date=session_date, position=data["position"], state=data["state"]
+                )
+        return session_log
+
+
+def session_line(session: SessionCheckpoint) -> str:
+    return (
+        json.dumps(
+            {
+                "date": session.session_date.isoformat(),
+                "position": session.position,
+                "state": session.state,
+            },
+            separators=(",", ":"),
+        )
+        + "\n"
+    )
+
+
+def invalidation_line(position: int) -> str:
+    return json.dumps({"invalidated_from": position}, separators=(",", ":")) + "\n"
@@ -1,10 +1,14 @@
+import bisect
 import datetime
+import itertools
+import operator
 import typing
 import uuid
 
 import attrs
 
 from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import vector
 
 
 class FieldDoesNotExist(Exception):
@@ -78,9 +82,209 @@ class MatchResult:
         }
 
 
+class MatchLookup(typing.Protocol):
+    """
+    Somewhere match results can be looked up by their result ID, such as `Matches`.
+    """
+
+    def match_by_id(self, result_id_str: str) -> MatchResult: ...
+
+
+@attrs.frozen
+class _DayIndex:
+    """
+    The day each match was played on, as a proleptic Gregorian ordinal, and whether the days are in order.
+    """
+
+    days: vector.Vector[int]
+    in_order: bool
+
+    @classmethod
+    def build(cls, match_results: typing.Iterable[MatchResult]) -> "_DayIndex":
+        days = vector.Vector(match_result.played_at.toordinal() for match_result in match_results)
+        return cls(days=days, in_order=all(a <= b for a, b in itertools.pairwise(days)))
+
+    def extended(self, match_result: MatchResult) -> "_DayIndex":
+        day = match_result.played_at.toordinal()
+        return _DayIndex(
+            days=self.days.append(day),
+            in_order=self.in_order and (not self.days or self.days[-1] <= day),
+        )
+
+    def replaced(self, position: int, match_result: MatchResult) -> "_DayIndex":
+        day = match_result.played_at.toordinal()
+        if day == self.days[position]:
+            return self
+        days = self.days.set(position, day)
+        in_order = (
+            self.in_order
+            and (position == 0 or days[position - 1] <= day)
+            and (position == len(days) - 1 or day <= days[position + 1])
+        )
+        return _DayIndex(days=days, in_order=in_order)
+
+    def sliced(self, start: int, stop: int) -> "_DayIndex":
+        # A slice of days that are in order is still in order
+        return _DayIndex(days=self.days[start:stop], in_order=self.in_order)
+
+
+T_pair = frozenset[core_dataclasses.User]
+
+
+@attrs.frozen
+class _PlayerIndex:
+    """
+    The positions of the matches each player, and each pair of players, took part in.
+
+    Players are keyed on the whole `User`, as `involves` compares them, so a player who has changed their name is
+    indexed under each version of it.
+
+    Derived indexes share the position vectors they don't change.
+    """
+
+    by_player: dict[core_dataclasses.User, vector.Vector[int]]
+    by_pair: dict[T_pair, vector.Vector[int]]
+
+    @classmethod
+    def build(cls, match_results: typing.Iterable[MatchResult]) -> "_PlayerIndex":
+        by_player: dict[core_dataclasses.User, list[int]] = {}
+        by_pair: dict[T_pair, list[int]] = {}
+        for position, match_result in enumerate(match_results):
+            for player in _players(match_result):
+                by_player.setdefault(player, []).append(position)
+            by_pair.setdefault(_pair(match_result), []).append(position)
+        return cls(
+            by_player={
+                player: vector.Vector(positions) for player, positions in by_player.items()
+            },
+            by_pair={pair: vector.Vector(positions) for pair, positions in by_pair.items()},
+        )
+
+    def extended(self, match_result: MatchResult, position: int) -> "_PlayerIndex":
+        by_player = dict(self.by_player)
+        by_pair = dict(self.by_pair)
+        for player in _players(match_result):
+            by_player[player] = by_player.get(player, _NO_POSITIONS).append(position)
+        pair = _pair(match_result)
+        by_pair[pair] = by_pair.get(pair, _NO_POSITIONS).append(position)
+        return _PlayerIndex(by_player=by_player, by_pair=by_pair)
+
+    def replaced(
+        self, old_match_result: MatchResult, new_match_result: MatchResult, position: int
+    ) -> "_PlayerIndex":
+        if _pair(old_match_result) == _pair(new_match_result):
+            return self
+
+        by_player = dict(self.by_player)
+        by_pair = dict(self.by_pair)
+        for player in _players(old_match_result) - _players(new_match_result):
+            by_player[player] = _without_position(by_player[player], position)
+        for player in _players(new_match_result) - _players(old_match_result):
+            by_player[player] = _with_position(by_player.get(player, _NO_POSITIONS), position)
+
+        old_pair = _pair(old_match_result)
+        by_pair[old_pair] = _without_position(by_pair[old_pair], position)
+        new_pair = _pair(new_match_result)
+        by_pair[new_pair] = _with_position(by_pair.get(new_pair, _NO_POSITIONS), position)
+        return _PlayerIndex(by_player=by_player, by_pair=by_pair)
+
+
+_NO_POSITIONS: vector.Vector[int] = vector.Vector()
+
+
+def _players(match_result: MatchResult) -> set[core_dataclasses.User]:
+    return {match_result.winner, match_result.loser}
+
+
+def _pair(match_result: MatchResult) -> T_pair:
+    return frozenset((match_result.winner, match_result.loser))
+
+
+def _with_position(positions: vector.Vector[int], position: int) -> vector.Vector[int]:
+    # Replacements are rare enough that we rebuild the positions rather than insert into the vector
+    new_positions = list(positions)
+    bisect.insort(new_positions, position)
+    return vector.Vector(new_positions)
+
+
+def _without_position(positions: vector.Vector[int], position: int) -> vector.Vector[int]:
+    return vector.Vector(p for p in positions if p != position)
+
+
+@attrs.define
+class _SharedIdPositions:
+    positions: dict[uuid.UUID, int] = attrs.Factory(dict)
+    # The number of matches indexed so far
+    size: int = 0
+
+
+@attrs.frozen
+class _IdIndex:
+    """
+    The position of each result ID among the first `size` matches.
+
+    Indexes derived by `extended` share the same positions dict, which only ever gains entries for later positions,
+    so an index ignores any positions past its own size. Extending an index that isn't the latest one to share the
+    dict copies it first.
+    """
+
+    shared: _SharedIdPositions
+    size: int
+
+    @classmethod
+    def build(cls, match_results: typing.Iterable[MatchResult]) -> "_IdIndex":
+        shared = _SharedIdPositions()
+        for position, match_result in enumerate(match_results):
+            # Match the first result with the ID, as a linear search would
+            shared.positions.setdefault(match_result.result_id, position)
+            shared.size = position + 1
+        return cls(shared=shared, size=shared.size)
+
+    def get(self, result_id: uuid.UUID) -> int | None:
+        position = self.shared.positions.get(result_id)
+        if position is None or position >= self.size:
+            return None
+        return position
+
+    def extended(self, match_result: MatchResult) -> "_IdIndex":
+        shared = self.shared
+        if shared.size != self.size:
+            shared = _SharedIdPositions(
+                positions={
+                    result_id: position
+                    for result_id, position in shared.positions.items()
+                    if position < self.size
+                },
+                size=self.size,
+            )
+        shared.positions.setdefault(match_result.result_id, self.size)
+        shared.size = self.size + 1
+        return _IdIndex(shared=shared, size=self.size + 1)
+
+
+def _as_vector(match_results: typing.Iterable[MatchResult]) -> vector.Vector[MatchResult]:
+    if isinstance(match_results, vector.Vector):
+        return match_results
+    return vector.Vector(match_results)
+
+
 @attrs.frozen
 class Matches:
-    match_results: list[MatchResult]
+    """
+    An immutable sequence of match results.
+
+    The match results are held in a persistent vector, so adding, replacing and slicing share structure with the
+    original matches rather than copying them.
+    """
+
+    match_results: vector.Vector[MatchResult] = attrs.field(converter=_as_vector)
+    # Indexes are built the first time the matches are queried by date or player, and carried over to matches
+    # derived from these ones where they still apply
+    _day_index: _DayIndex | None = attrs.field(default=None, init=False, eq=False, repr=False)
+    _player_index: _PlayerIndex | None = attrs.field(
+        default=None, init=False, eq=False, repr=False
+    )
+    _id_index: _IdIndex | None = attrs.field(default=None, init=False, eq=False, repr=False)
 
     def __bool__(self) -> bool:
         return bool(self.match_results)
@@ -91,7 +295,7 @@ class Matches:
     def __add__(self, other: typing.Any) -> "Matches":
         if not isinstance(other, Matches):
             raise NotImplementedError
-        return Matches(match_results=self.match_results + other.match_results)
+        return Matches(match_results=self.match_results.extend(other.match_results))
 
     @classmethod
     def from_match_results(cls, match_results: list[dict[str, typing.Any]]) -> "Matches":
@@ -99,11 +303,58 @@ class Matches:
             match_results=[MatchResult.from_dict(match_result) for match_result in match_results]
         )
 
+    @classmethod
+    def _with_indexes(
+        cls,
+        match_results: typing.Iterable[MatchResult],
+        day_index: _DayIndex | None = None,
+        player_index: _PlayerIndex | None = None,
+        id_index: _IdIndex | None = None,
+    ) -> "Matches":
+        matches = cls(match_results=match_results)
+        object.__setattr__(matches, "_day_index", day_index)
+        object.__setattr__(matches, "_player_index", player_index)
+        object.__setattr__(matches, "_id_index", id_index)
+        return matches
+
+    def _days(self) -> _DayIndex:
+        day_index = self._day_index
+        if day_index is None:
+            day_index = _DayIndex.build(self.match_results)
+            object.__setattr__(self, "_day_index", day_index)
+        return day_index
+
+    def _players(self) -> _PlayerIndex:
+        player_index = self._player_index
+        if player_index is None:
+            player_index = _PlayerIndex.build(self.match_results)
+            object.__setattr__(self, "_player_index", player_index)
+        return player_index
+
+    def _positions(self) -> _IdIndex:
+        id_index = self._id_index
+        if id_index is None:
+            id_index = _IdIndex.build(self.match_results)
+            object.__setattr__(self, "_id_index", id_index)
+        return id_index
+
+    def _at(self, positions: typing.Iterable[int]) -> "Matches":
+        match_results = self.match_results
+        return Matches(match_results=[match_results[position] for position in positions])
+
     # Mutations
     # ---------
 
     def add(self, match_result: MatchResult) -> "Matches":
-        return Matches(match_results=self.match_results + [match_result])
+        position = len(self.match_results)
+        return Matches._with_indexes(
+            self.match_results.append(match_result),
+            day_index=self._day_index.extended(match_result) if self._day_index else None,
+            player_index=(
+                self._player_index.extended(match_result, position) if self._player_index else None
+            ),
+            id_index=self._id_index.extended(match_result) if self._id_index else None,
+        )
 
     def replace(self, match_result_to_replace: MatchResult) -> "Matches":
         """
@@ -111,13 +362,24 @@ class Matches:
 
         The match result to replace is identified by its result_id.
         """
-        return Matches(
-            match_results=[
-                match_result_to_replace
-                if match_result_to_replace.result_id == match.result_id
-                else match
-                for match in self.match_results
-            ]
+        position = self._positions().get(match_result_to_replace.result_id)
+        if position is None:
+            return self
+
+        match = self.match_results[position]
+        return Matches._with_indexes(
+            self.match_results.set(position, match_result_to_replace),
+            day_index=(
+                self._day_index.replaced(position, match_result_to_replace)
+                if self._day_index
+                else None
+            ),
+            player_index=(
+                self._player_index.replaced(match, match_result_to_replace, position)
+                if self._player_index
+                else None
+            ),
+            id_index=self._id_index,
         )
 
     # Queries
@@ -134,38 +396,232 @@ class Matches:
             raise FieldDoesNotExist(field) from e
 
     def from_date(self, from_date: datetime.date) -> "Matches":
-        return Matches(
-            match_results=[
-                match_result
-                for match_result in self.match_results
-                if match_result.played_on >= from_date
-            ]
-        )
+        return self.between(start=from_date)
 
     def on_date(self, on_date: datetime.date) -> "Matches":
+        return self.between(start=on_date, end=on_date)
+
+    def between(
+        self, start: datetime.date | None = None, end: datetime.date | None = None
+    ) -> "Matches":
+        """
+        Get the matches played from `start` to `end` inclusive, where either end of the range can be left open.
+
+        Matches are almost always stored in the order they were played, in which case the range is found by bisecting
+        the day index and sliced out. Otherwise every match is checked.
+        """
+        day_index = self._days()
+        start_day = start.toordinal() if start else None
+        end_day = end.toordinal() if end else None
+
+        if day_index.in_order:
+            days = day_index.days
+            lo = bisect.bisect_left(days, start_day) if start_day is not None else 0
+            hi = bisect.bisect_right(days, end_day) if end_day is not None else len(days)
+            return Matches._with_indexes(
+                self.match_results[lo:hi], day_index=day_index.sliced(lo, hi)
+            )
+
         return Matches(
             match_results=[
                 match_result
-                for match_result in self.match_results
-                if match_result.played_on == on_date
+                for match_result, day in zip(self.match_results, day_index.days)
+                if (start_day is None or day >= start_day) and (end_day is None or day <= end_day)
             ]
         )
 
     def involves(self, user: core_dataclasses.User) -> "Matches":
-        return Matches(
-            match_results=[
-                match_result
-                for match_result in self.match_results
-                if user in (match_result.winner, match_result.loser)
-            ]
+        return self._at(self._players().by_player.get(user, _NO_POSITIONS))
+
+    def head_to_head(
+        self, player_one: core_dataclasses.User, player_two: core_dataclasses.User
+    ) -> "Matches":
+        """
+        Get the matches played between two players, as `involves(player_one).involves(player_two)` would.
+        """
+        if player_one == player_two:
+            return self.involves(player_one)
+        return self._at(
+            self._players().by_pair.get(frozenset((player_one, player_two)), _NO_POSITIONS)
         )
 
     def last(self, n: int = 1) -> "Matches":
         return Matches(match_results=self.match_results[-n:])
 
     def match_by_id(self, result_id_str: str) -> MatchResult:
-        result_id = uuid.UUID(result_id_str)
-        for match_result in self.match_results:
-            if match_result.result_id == result_id:
-                return match_result
-        raise MatchNotFound
+        return self.match_results[self.position_of(result_id_str)]
+
+    def position_of(self, result_id_str: str) -> int:
+        position = self._positions().get(uuid.UUID(result_id_str))
+        if position is None:
+            raise MatchNotFound
+        return position
+
+    def query(self) -> "MatchesQuery":
+        return MatchesQuery(source=self)
+
+
+T_predicate = typing.Callable[[MatchResult], bool]
+
+
+@attrs.frozen
+class _FilterStep:
+    predicate: T_predicate
+
+
+@attrs.frozen
+class _SortStep:
+    field: str
+    reverse: bool
+
+
+@attrs.frozen
+class _LastStep:
+    n: int
+
+
+@attrs.frozen
+class _DateRangeStep:
+    start: datetime.date | None
+    end: datetime.date | None
+
+    def predicate(self, match_result: MatchResult) -> bool:
+        played_on = match_result.played_on
+        return (self.start is None or played_on >= self.start) and (
+            self.end is None or played_on <= self.end
+        )
+
+
+@attrs.frozen
+class _InvolvesStep:
+    user: core_dataclasses.User
+
+    def predicate(self, match_result: MatchResult) -> bool:
+        return self.user in (match_result.winner, match_result.loser)
+
+
+T_step = _FilterStep | _SortStep | _LastStep | _DateRangeStep | _InvolvesStep
+
+
+@attrs.frozen
+class MatchesQuery:
+    """
+    A lazy query over `Matches`.
+
+    The query methods mirror those on `Matches` but only record the step. Nothing is built until `execute` is
+    called, which runs consecutive filters as a single pass and stops scanning early for `last`, so a chain of steps
+    doesn't allocate intermediate lists the size of the full history. Date and player filters at the start of the
+    query are answered from the source's indexes instead.
+    """
+
+    source: Matches
+    steps: tuple[T_step, ...] = ()
+
+    def _then(self, step: T_step) -> "MatchesQuery":
+        return MatchesQuery(source=self.source, steps=self.steps + (step,))
+
+    def where(self, predicate: T_predicate) -> "MatchesQuery":
+        return self._then(_FilterStep(predicate=predicate))
+
+    def sort_by(self, field: str, reverse: bool = False) -> "MatchesQuery":
+        # Check the field up front, as `Matches.sort_by` would fail immediately
+        if not hasattr(MatchResult, field):
+            raise FieldDoesNotExist(field)
+        return self._then(_SortStep(field=field, reverse=reverse))
+
+    def from_date(self, from_date: datetime.date) -> "MatchesQuery":
+        return self.between(start=from_date)
+
+    def on_date(self, on_date: datetime.date) -> "MatchesQuery":
+        return self.between(start=on_date, end=on_date)
+
+    def between(
+        self, start: datetime.date | None = None, end: datetime.date | None = None
+    ) -> "MatchesQuery":
+        return self._then(_DateRangeStep(start=start, end=end))
+
+    def involves(self, user: core_dataclasses.User) -> "MatchesQuery":
+        return self._then(_InvolvesStep(user=user))
+
+    def last(self, n: int = 1) -> "MatchesQuery":
+        return self._then(_LastStep(n=n))
+
+    def execute(self) -> Matches:
+        matches, steps = _narrow(self.source, list(self.steps))
+        if not steps:
+            # Nothing is left to run, so the matches keep their vector and whatever indexes they've built
+            return matches
+
+        match_results: typing.Sequence[MatchResult] = matches.match_results
+        predicates: list[T_predicate] = []
+        for step in steps:
+            if isinstance(step, _FilterStep | _DateRangeStep | _InvolvesStep):
+                predicates.append(step.predicate)
+            elif isinstance(step, _LastStep):
+                if not predicates and isinstance(match_results, vector.Vector):
+                    # The last matches are a slice of the vector, which shares its structure
+                    match_results = match_results[-step.n :] if step.n > 0 else vector.Vector()
+                else:
+                    match_results = _last_matching(match_results, predicates, step.n)
+                predicates = []
+            else:
+                match_results = sorted(
+                    _matching(match_results, predicates),
+                    key=operator.attrgetter(step.field),
+                    reverse=step.reverse,
+                )
+                predicates = []
+
+        return Matches(match_results=vector.Vector(_matching(match_results, predicates)))
+
+
+def _narrow(matches: Matches, steps: list[T_step]) -> tuple[Matches, list[T_step]]:
+    """
+    Apply the leading date and player filters using the indexes on `Matches`, returning the remaining steps.
+
+    A pair of player filters is answered from the head-to-head index in one go.
+    """
+    while steps:
+        step = steps[0]
+        if isinstance(step, _DateRangeStep):
+            matches = matches.between(step.start, step.end)
+            steps = steps[1:]
+        elif isinstance(step, _InvolvesStep):
+            if len(steps) > 1 and isinstance(next_step := steps[1], _InvolvesStep):
+                matches = matches.head_to_head(step.user, next_step.user)
+                steps = steps[2:]
+            else:
+                matches = matches.involves(step.user)
+                steps = steps[1:]
+        else:
+            break
+    return matches, steps
+
+
+def _matching(
+    match_results: typing.Iterable[MatchResult], predicates: list[T_predicate]
+) -> typing.Iterator[MatchResult]:
+    if not predicates:
+        return iter(match_results)
+    return (
+        match_result
+        for match_result in match_results
+        if all(predicate(match_result) for predicate in predicates)
+    )
+
+
+def _last_matching(
+    match_results: typing.Sequence[MatchResult], predicates: list[T_predicate], n: int
+) -> list[MatchResult]:
+    """
+    Find the last `n` match results that satisfy the predicates, scanning back from the end and stopping once found.
+    """
+    found: list[MatchResult] = []
+    if n <= 0:
+        return found
+    for match_result in _matching(reversed(match_results), predicates):
+        found.append(match_result)
+        if len(found) == n:
+            break
+    found.reverse()
+    return found
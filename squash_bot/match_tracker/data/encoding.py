@@ -0,0 +1,411 @@
+import json
+import re
+import typing
+import uuid
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, match_table
+
+# The match results file is a log with one JSON record per line. Each match record is either an `add` of a new match
+# result or a `replace` that supersedes an earlier record with the same result ID. There are two schemas:
+#
+# - v1 records hold the full match result dict, e.g. `{"op": "add", "match_result": {...}}`. Files written before the
+#   log format existed hold a single JSON array of match results, which is read as a series of v1 `add` records.
+# - v2 files start with a `{"v":2}` header. Users are written once to a per-file user table as `{"u":[id, username,
+#   global_name]}` records, and match records refer to them by their position in the table. Timestamps are integer
+#   microseconds since the epoch, the server is a flag rather than a third copy of a user, and keys are short.
+#
+# A v2 log can have a sidecar record index, which points each result ID at the byte range of its latest record and
+# holds a copy of the user table, so a single match can be read and decoded without the rest of the log. The index is
+# itself a log with one line per write to the match log, holding the byte ranges of the records that write appended
+# and any users it added, so it's only ever appended to.
+SCHEMA_VERSION = 2
+
+ADD_OPERATION = "add"
+REPLACE_OPERATION = "replace"
+
+_V2_HEADER = {"v": 2}
+_V2_OPERATIONS = {ADD_OPERATION: "a", REPLACE_OPERATION: "r"}
+_V2_OPERATIONS_DECODED = {code: operation for operation, code in _V2_OPERATIONS.items()}
+_V2_USER_RECORD_PATTERN = re.compile(r'^\{"u":(.*)\}$', re.MULTILINE)
+
+T_user_key = tuple[str, str, str]
+
+
+@attrs.define
+class UserTable:
+    """
+    The users referenced by a v2 log, in the order they were written.
+
+    Users are keyed on all of their fields rather than just their ID, so a change of name gets a new entry and older
+    matches keep the name they were recorded with.
+    """
+
+    users: list[core_dataclasses.User] = attrs.Factory(list)
+    _indices: dict[T_user_key, int] = attrs.Factory(dict)
+
+    def __contains__(self, user: core_dataclasses.User) -> bool:
+        return _user_key(user) in self._indices
+
+    def add(self, user: core_dataclasses.User) -> int:
+        self._indices[_user_key(user)] = len(self.users)
+        self.users.append(user)
+        return len(self.users) - 1
+
+    def index(self, user: core_dataclasses.User) -> int:
+        return self._indices[_user_key(user)]
+
+    def copy(self) -> "UserTable":
+        return UserTable(users=list(self.users), indices=dict(self._indices))
+
+
+@attrs.frozen
+class IndexBatch:
+    """
+    The records that a single write appended to a v2 log, as a line of its record index.
+
+    The batch covers bytes `start` to `end` of the log, which was at `log_version` after the write. `users` holds the
+    position in the user table of each user that was added, and `records` the hex result ID, byte offset, length and
+    whether it's a replacement of each match record, in the order they were written.
+    """
+
+    start: int
+    end: int
+    log_version: str | None
+    users: list[tuple[int, core_dataclasses.User]]
+    records: list[tuple[str, int, int, bool]]
+
+    def to_line(self) -> str:
+        return _dumps(
+            {
+                "s": self.start,
+                "e": self.end,
+                "v": self.log_version,
+                "u": [
+                    [position, user.id, user.username, user.global_name]
+                    for position, user in self.users
+                ],
+                "r": [
+                    [result_id, offset, length, int(replaces)]
+                    for result_id, offset, length, replaces in self.records
+                ],
+            }
+        )
+
+    @classmethod
+    def from_line(cls, line: str) -> "IndexBatch":
+        data = json.loads(line)
+        return cls(
+            start=data["s"],
+            end=data["e"],
+            log_version=data["v"],
+            users=[(user_record[0], _decode_user(user_record[1:])) for user_record in data["u"]],
+            records=[
+                (result_id, offset, length, bool(replaces))
+                for result_id, offset, length, replaces in data["r"]
+            ],
+        )
+
+
+@attrs.frozen
+class RecordIndex:
+    """
+    A sidecar index of a v2 log at a given version.
+
+    `offsets` maps the hex result ID of each match to the byte offset and length of its latest record in the log.
+    """
+
+    log_version: str | None
+    size_bytes: int
+    users: list[core_dataclasses.User]
+    offsets: dict[str, tuple[int, int]]
+
+    @classmethod
+    def fold(cls, batches: list[IndexBatch]) -> "RecordIndex":
+        """
+        Build the index from batches that cover the log from its start, in order.
+
+        As in `fold_records`, a replacement only counts if the result ID has already been added.
+        """
+        users: list[core_dataclasses.User] = []
+        offsets: dict[str, tuple[int, int]] = {}
+        for batch in batches:
+            users.extend(user for _, user in batch.users)
+            for result_id, offset, length, replaces in batch.records:
+                if not replaces or result_id in offsets:
+                    offsets[result_id] = (offset, length)
+        return cls(
+            log_version=batches[-1].log_version if batches else None,
+            size_bytes=batches[-1].end if batches else 0,
+            users=users,
+            offsets=offsets,
+        )
+
+
+def read_index_batches(contents: str) -> list[IndexBatch]:
+    """
+    Read the batches in a record index, in the order they cover the log.
+
+    Concurrent writers can append their batches out of order. A batch that overlaps one before it, e.g. because the
+    same records were indexed again, is skipped.
+    """
+    batches: list[IndexBatch] = []
+    for batch in sorted(
+        (IndexBatch.from_line(line) for line in contents.splitlines() if line),
+        key=lambda batch: (batch.start, -batch.end),
+    ):
+        if not batches or batch.start >= batches[-1].end:
+            batches.append(batch)
+    return batches
+
+
+@attrs.frozen
+class DecodedLog:
+    schema_version: int
+    users: UserTable
+    records: list[tuple[str, dataclasses.MatchResult]]
+
+    def fold(self) -> dataclasses.Matches:
+        return fold_records(self.records)
+
+
+def schema_version(file_contents: str) -> int:
+    first_line = file_contents.lstrip().partition("\n")[0]
+    if first_line.startswith("{") and json.loads(first_line) == _V2_HEADER:
+        return 2
+    return 1
+
+
+def decode_log(file_contents: str) -> DecodedLog:
+    """
+    Decode the contents of a match results file in either schema.
+    """
+    if schema_version(file_contents) == 2:
+        return _decode_v2_log(file_contents)
+    return DecodedLog(
+        schema_version=1,
+        users=UserTable(),
+        records=[
+            (record["op"], dataclasses.MatchResult.from_dict(record["match_result"]))
+            for record in parse_v1_log(file_contents)
+        ],
+    )
+
+
+def decode_match_table(file_contents: str) -> match_table.MatchTable:
+    """
+    Decode the contents of a match results file straight into a `MatchTable`.
+
+    v2 records are read straight into the table's columns without building any `MatchResult` objects.
+    """
+    if schema_version(file_contents) != 2:
+        return match_table.MatchTable.from_matches(decode_log(file_contents).fold())
+
+    builder = match_table.MatchTableBuilder()
+    # Map the file's user table onto the builder's users dictionary
+    user_indexes: list[int] = []
+    for line in file_contents.splitlines():
+        if not line:
+            continue
+        record = json.loads(line)
+        if "o" in record:
+            winner = user_indexes[record["w"]]
+            loser = user_indexes[record["l"]]
+            builder.append_row(
+                winner=winner,
+                loser=loser,
+                server=winner if record["sw"] else loser,
+                winner_score=record["ws"],
+                loser_score=record["ls"],
+                played_at=record["p"],
+                logged_at=record["t"],
+                logged_by=user_indexes[record["b"]],
+                result_id=uuid.UUID(hex=record["i"]),
+                replace=record["o"] == _V2_OPERATIONS[REPLACE_OPERATION],
+            )
+        elif "u" in record:
+            user_indexes.append(builder.user_index(_decode_user(record["u"])))
+    return builder.build()
+
+
+def decode_user_table(file_contents: str) -> UserTable:
+    """
+    Decode only the user table of a v2 file, which is all that's needed to append to it.
+    """
+    user_table = UserTable()
+    for match in _V2_USER_RECORD_PATTERN.finditer(file_contents):
+        user_table.add(_decode_user(json.loads(match.group(1))))
+    return user_table
+
+
+def index_log(file_contents: str, log_version: str) -> IndexBatch:
+    """
+    Index the whole of a v2 log, as a single batch.
+    """
+    return index_batch(file_contents, start=0, log_version=log_version, first_user=0)
+
+
+def index_batch(contents: str, start: int, log_version: str | None, first_user: int) -> IndexBatch:
+    """
+    Index the records in `contents`, which starts at byte offset `start` of the log. `first_user` is the position in
+    the user table of the first user record in the contents.
+    """
+    offset = start
+    users: list[tuple[int, core_dataclasses.User]] = []
+    records: list[tuple[str, int, int, bool]] = []
+    replace_code = _V2_OPERATIONS[REPLACE_OPERATION]
+    for line in contents.splitlines(keepends=True):
+        length = len(line.encode("utf-8"))
+        if line.startswith('{"o":'):
+            record = json.loads(line)
+            records.append((record["i"], offset, length, record["o"] == replace_code))
+        elif line.startswith('{"u":'):
+            users.append((first_user + len(users), _decode_user(json.loads(line)["u"])))
+        offset += length
+    return IndexBatch(
+        start=start, end=offset, log_version=log_version, users=users, records=records
+    )
+
+
+def decode_record(record_line: str, users: list[core_dataclasses.User]) -> dataclasses.MatchResult:
+    """
+    Decode a single v2 match record, given the users in the log's user table.
+    """
+    return _decode_match_record(json.loads(record_line), users)
+
+
+def parse_v1_log(file_contents: str) -> list[dict[str, typing.Any]]:
+    """
+    Parse the contents of a v1 match results file into a list of log records.
+
+    A legacy file starts with a JSON array of match results. Any lines appended after the array are read as normal
+    log records.
+    """
+    records: list[dict[str, typing.Any]] = []
+
+    log_contents = file_contents.lstrip()
+    if log_contents.startswith("["):
+        legacy_match_results, end = json.JSONDecoder().raw_decode(log_contents)
+        records.extend(
+            {"op": ADD_OPERATION, "match_result": match_result}
+            for match_result in legacy_match_results
+        )
+        log_contents = log_contents[end:]
+
+    for line in log_contents.splitlines():
+        if line.strip():
+            records.append(json.loads(line))
+
+    return records
+
+
+def fold_records(records: list[tuple[str, dataclasses.MatchResult]]) -> dataclasses.Matches:
+    """
+    Replay the log records into the match results they describe.
+
+    A `replace` record keeps the position of the result it supersedes. Replacements for unknown result IDs are
+    ignored, mirroring `Matches.replace`.
+    """
+    match_results: list[dataclasses.MatchResult] = []
+    positions: dict[uuid.UUID, int] = {}
+    for operation, match_result in records:
+        if operation == REPLACE_OPERATION:
+            if (position := positions.get(match_result.result_id)) is not None:
+                match_results[position] = match_result
+        else:
+            positions[match_result.result_id] = len(match_results)
+            match_results.append(match_result)
+    return dataclasses.Matches(match_results=match_results)
+
+
+def encode_log(matches: dataclasses.Matches) -> tuple[str, UserTable]:
+    """
+    Encode the match results as a complete v2 file, returning the contents along with the user table written.
+    """
+    user_table = UserTable()
+    lines = [_dumps(_V2_HEADER)]
+    for match_result in matches.match_results:
+        lines.append(encode_record(ADD_OPERATION, match_result, user_table))
+    return "".join(lines), user_table
+
+
+def encode_record(
+    operation: str, match_result: dataclasses.MatchResult, user_table: UserTable
+) -> str:
+    """
+    Encode a single v2 match record, preceded by records for any users not yet in the user table.
+
+    The user table is updated with any users that were added.
+    """
+    lines = []
+    for user in (match_result.winner, match_result.loser, match_result.logged_by):
+        if user not in user_table:
+            user_table.add(user)
+            lines.append(_dumps({"u": [user.id, user.username, user.global_name]}))
+
+    lines.append(
+        _dumps(
+            {
+                "o": _V2_OPERATIONS[operation],
+                "w": user_table.index(match_result.winner),
+                "l": user_table.index(match_result.loser),
+                "ws": match_result.winner_score,
+                "ls": match_result.loser_score,
+                "sw": int(match_result.served == match_result.winner),
+                "p": match_table.to_epoch_microseconds(match_result.played_at),
+                "t": match_table.to_epoch_microseconds(match_result.logged_at),
+                "b": user_table.index(match_result.logged_by),
+                "i": match_result.result_id.hex,
+            }
+        )
+    )
+    return "".join(lines)
+
+
+def _decode_v2_log(file_contents: str) -> DecodedLog:
+    user_table = UserTable()
+    users = user_table.users
+    records = []
+    for line in file_contents.splitlines():
+        if not line:
+            continue
+        record = json.loads(line)
+        if "o" in record:
+            match_result = _decode_match_record(record, users)
+            records.append((_V2_OPERATIONS_DECODED[record["o"]], match_result))
+        elif "u" in record:
+            user_table.add(_decode_user(record["u"]))
+    return DecodedLog(schema_version=2, users=user_table, records=records)
+
+
+def _decode_match_record(
+    record: dict[str, typing.Any], users: list[core_dataclasses.User]
+) -> dataclasses.MatchResult:
+    winner = users[record["w"]]
+    loser = users[record["l"]]
+    return dataclasses.MatchResult(
+        winner=winner,
+        winner_score=record["ws"],
+        loser_score=record["ls"],
+        loser=loser,
+        served=winner if record["sw"] else loser,
+        played_at=match_table.from_epoch_microseconds(record["p"]),
+        logged_at=match_table.from_epoch_microseconds(record["t"]),
+        logged_by=users[record["b"]],
+        result_id=uuid.UUID(hex=record["i"]),
+    )
+
+
+def _decode_user(user_record: list[str]) -> core_dataclasses.User:
+    user_id, username, global_name = user_record
+    return core_dataclasses.User(id=user_id, username=username, global_name=global_name)
+
+
+def _user_key(user: core_dataclasses.User) -> T_user_key:
+    return (user.id, user.username, user.global_name)
+
+
+def _dumps(record: dict[str, typing.Any]) -> str:
+    return json.dumps(record, separators=(",", ":")) + "\n"
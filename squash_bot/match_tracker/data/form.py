@@ -0,0 +1,237 @@
+import json
+import typing
+from collections import deque
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, pairs, tally
+
+# How many of a player's latest matches count towards their recent form
+RECENT_MATCHES = 5
+
+# A result from the player's side: whether they won, whether they served, their score and their opponent's score
+T_result = tuple[bool, bool, int, int]
+
+
+@attrs.define
+class RecentForm:
+    """
+    A player's last `RECENT_MATCHES` results, oldest first, in a fixed-size ring buffer.
+
+    Running sums are kept as results are pushed in and drop out, so the stats over the recent matches never need
+    re-tallying.
+    """
+
+    _results: deque[T_result] = attrs.Factory(lambda: deque(maxlen=RECENT_MATCHES))
+    wins: int = 0
+    total_score: int = 0
+    point_difference: int = 0
+    matches_served: int = 0
+    wins_served: int = 0
+
+    @classmethod
+    def from_results(cls, results: typing.Iterable[T_result]) -> "RecentForm":
+        recent_form = cls()
+        for result in results:
+            recent_form.record(result)
+        return recent_form
+
+    @property
+    def results(self) -> list[T_result]:
+        return list(self._results)
+
+    @property
+    def number_matches(self) -> int:
+        return len(self._results)
+
+    def record_match(
+        self, match_result: dataclasses.MatchResult, player: core_dataclasses.User
+    ) -> None:
+        won = match_result.winner == player
+        score, opponent_score = (
+            (match_result.winner_score, match_result.loser_score)
+            if won
+            else (match_result.loser_score, match_result.winner_score)
+        )
+        self.record((won, match_result.served == player, score, opponent_score))
+
+    def record(self, result: T_result) -> None:
+        if len(self._results) == RECENT_MATCHES:
+            self._add_to_sums(self._results[0], sign=-1)
+        self._results.append(result)
+        self._add_to_sums(result, sign=1)
+
+    def _add_to_sums(self, result: T_result, sign: int) -> None:
+        won, served, score, opponent_score = result
+        self.wins += sign * won
+        self.total_score += sign * score
+        self.point_difference += sign * (score - opponent_score)
+        self.matches_served += sign * served
+        self.wins_served += sign * (won and served)
+
+    def copy(self) -> "RecentForm":
+        return attrs.evolve(self, results=deque(self._results, maxlen=RECENT_MATCHES))
+
+    def as_tally(self) -> tally.MatchesTallyData:
+        """
+        Get the recent matches as a tally, for the stats that don't depend on the order of the matches.
+        """
+        return tally.MatchesTallyData(
+            number_matches=self.number_matches,
+            wins=self.wins,
+            total_score=self.total_score,
+            point_difference=self.point_difference,
+            matches_served=self.matches_served,
+            wins_served=self.wins_served,
+            matches_received=self.number_matches - self.matches_served,
+            wins_received=self.wins - self.wins_served,
+        )
+
+
+@attrs.frozen
+class FormTable:
+    """
+    The recent form of every player, and of every player against each of their opponents, as of a version of a
+    guild's results log.
+
+    Like `MaterializedTally`, it's kept up to date as results are stored. Players are kept in the order they first
+    appear in the log.
+    """
+
+    log_version: str
+    form_by_player: dict[core_dataclasses.User, RecentForm]
+    form_by_pair: dict[pairs.T_pair, RecentForm]
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches, log_version: str) -> "FormTable":
+        form_table = cls(log_version=log_version, form_by_player={}, form_by_pair={})
+        for match_result in matches.match_results:
+            form_table._record(match_result)
+        return form_table
+
+    def with_log_version(self, log_version: str) -> "FormTable":
+        return attrs.evolve(self, log_version=log_version)
+
+    def added(self, match_result: dataclasses.MatchResult, log_version: str) -> "FormTable":
+        """
+        Build the table after a match result was appended to the log.
+
+        Only the forms of the two players and of their pair are copied, the rest are shared with this table.
+        """
+        form_table = FormTable(
+            log_version=log_version,
+            form_by_player=dict(self.form_by_player),
+            form_by_pair=dict(self.form_by_pair),
+        )
+        for player, opponent in pairs.pairs_in(match_result):
+            if player in form_table.form_by_player:
+                form_table.form_by_player[player] = form_table.form_by_player[player].copy()
+            if (player, opponent) in form_table.form_by_pair:
+                form_table.form_by_pair[(player, opponent)] = form_table.form_by_pair[
+                    (player, opponent)
+                ].copy()
+        form_table._record(match_result)
+        return form_table
+
+    def replaced(
+        self,
+        old_match_result: dataclasses.MatchResult,
+        new_matches: dataclasses.Matches,
+        log_version: str,
+    ) -> "FormTable":
+        """
+        Build the table after a match result was replaced, given the matches with the replacement in place.
+
+        The replaced result may not be one of the latest matches, so the forms of the players and pairs in the old
+        and new results are rebuilt from their latest matches.
+        """
+        new_match_result = new_matches.match_by_id(str(old_match_result.result_id))
+        form_table = FormTable(
+            log_version=log_version,
+            form_by_player=dict(self.form_by_player),
+            form_by_pair=dict(self.form_by_pair),
+        )
+        for player, opponent in {
+            *pairs.pairs_in(old_match_result),
+            *pairs.pairs_in(new_match_result),
+        }:
+            player_matches = new_matches.query().involves(player).last(RECENT_MATCHES).execute()
+            _set_form(form_table.form_by_player, player, player_matches, player)
+
+            pair_matches = (
+                new_matches.query()
+                .involves(player)
+                .involves(opponent)
+                .last(RECENT_MATCHES)
+                .execute()
+            )
+            _set_form(form_table.form_by_pair, (player, opponent), pair_matches, player)
+        return form_table
+
+    def _record(self, match_result: dataclasses.MatchResult) -> None:
+        for player, opponent in pairs.pairs_in(match_result):
+            self.form_by_player.setdefault(player, RecentForm()).record_match(match_result, player)
+            self.form_by_pair.setdefault((player, opponent), RecentForm()).record_match(
+                match_result, player
+            )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "v": self.log_version,
+                "players": [
+                    {"player": player.to_dict(), "results": recent_form.results}
+                    for player, recent_form in self.form_by_player.items()
+                ],
+                "pairs": [
+                    {
+                        "player": player.to_dict(),
+                        "opponent": opponent.to_dict(),
+                        "results": recent_form.results,
+                    }
+                    for (player, opponent), recent_form in self.form_by_pair.items()
+                ],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, contents: str) -> "FormTable":
+        data = json.loads(contents)
+        return cls(
+            log_version=data["v"],
+            form_by_player={
+                core_dataclasses.User.from_dict(entry["player"]): _form_from_json(entry["results"])
+                for entry in data["players"]
+            },
+            form_by_pair={
+                (
+                    core_dataclasses.User.from_dict(entry["player"]),
+                    core_dataclasses.User.from_dict(entry["opponent"]),
+                ): _form_from_json(entry["results"])
+                for entry in data["pairs"]
+            },
+        )
+
+
+def _set_form(
+    forms: dict[typing.Any, RecentForm],
+    key: typing.Any,
+    matches: dataclasses.Matches,
+    player: core_dataclasses.User,
+) -> None:
+    if not matches:
+        forms.pop(key, None)
+        return
+    recent_form = RecentForm()
+    for match_result in matches.match_results:
+        recent_form.record_match(match_result, player)
+    forms[key] = recent_form
+
+
+def _form_from_json(results: list[list[typing.Any]]) -> RecentForm:
+    # JSON has no tuples, so the results come back as lists
+    return RecentForm.from_results(
+        (won, served, score, opponent_score) for won, served, score, opponent_score in results
+    )
@@ -0,0 +1,135 @@
+import json
+import typing
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import tally
+
+
+@attrs.frozen
+class Stat:
+    """
+    A stat that players can be ranked by, worked out from their all-time tally.
+
+    `value` returns `None` for a player that the stat doesn't apply to yet, e.g. the serving win rate of a player who
+    has never served, and they're left off its leaderboard.
+    """
+
+    name: str
+    label: str
+    value: typing.Callable[[tally.MatchesTallyData], typing.Any]
+    display: typing.Callable[[typing.Any], str] = str
+    # Whether a lower value ranks higher
+    ascending: bool = False
+
+
+# Every stat with a leaderboard. To add a leaderboard, add its stat here.
+STATS: tuple[Stat, ...] = (
+    Stat(
+        name="win-rate",
+        label="Win %",
+        value=lambda player_tally: player_tally.win_rate,
+        display=lambda win_rate: f"{win_rate}%",
+    ),
+    Stat(
+        name="win-rate-serving",
+        label="Win % (serving)",
+        value=lambda player_tally: player_tally.win_rate_serving,
+        display=lambda win_rate: f"{win_rate}%",
+    ),
+    Stat(
+        name="point-difference",
+        label="Avg. point diff.",
+        value=lambda player_tally: player_tally.average_point_difference,
+        display=lambda point_difference: f"{point_difference:+}",
+    ),
+    Stat(
+        name="win-streak",
+        label="Highest win streak",
+        value=lambda player_tally: player_tally.highest_win_streak,
+    ),
+    Stat(
+        name="loss-streak",
+        label="Highest loss streak",
+        value=lambda player_tally: player_tally.highest_loss_streak,
+    ),
+    Stat(
+        name="matches",
+        label="Matches",
+        value=lambda player_tally: player_tally.number_matches,
+    ),
+    Stat(
+        name="last-win",
+        label="Last win",
+        value=lambda player_tally: player_tally.last_win_datetime,
+        display=lambda last_win_datetime: last_win_datetime.strftime("%-d %b %Y"),
+    ),
+)
+
+STATS_BY_NAME = {stat.name: stat for stat in STATS}
+
+# A player on a leaderboard, along with their stat as it's displayed
+T_entry = tuple[core_dataclasses.User, str]
+
+
+@attrs.frozen
+class Leaderboards:
+    """
+    Every player ranked by each stat in `STATS`, as of a version of a guild's results log.
+
+    They're sorted from the all-time tally whenever it's updated, so reading the top of a leaderboard doesn't need
+    every player's tally or any sorting. Players with the same value stay in the order they first played.
+    """
+
+    log_version: str
+    entries_by_stat: dict[str, list[T_entry]]
+
+    @classmethod
+    def build(cls, tally_by_player: tally.T_tally_by_player, log_version: str) -> "Leaderboards":
+        entries_by_stat = {}
+        for stat in STATS:
+            values = [
+                (player, value)
+                for player, player_tally in tally_by_player.items()
+                if (value := stat.value(player_tally)) is not None
+            ]
+            values.sort(key=lambda player_value: player_value[1], reverse=not stat.ascending)
+            entries_by_stat[stat.name] = [
+                (player, stat.display(value)) for player, value in values
+            ]
+        return cls(log_version=log_version, entries_by_stat=entries_by_stat)
+
+    def has_every_stat(self) -> bool:
+        return self.entries_by_stat.keys() == STATS_BY_NAME.keys()
+
+    def top(self, stat_name: str, k: int) -> list[T_entry]:
+        """
+        Get the top `k` players by the stat, best first.
+        """
+        return self.entries_by_stat[stat_name][:k]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "v": self.log_version,
+                "stats": {
+                    stat_name: [[player.to_dict(), value] for player, value in entries]
+                    for stat_name, entries in self.entries_by_stat.items()
+                },
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, contents: str) -> "Leaderboards":
+        data = json.loads(contents)
+        return cls(
+            log_version=data["v"],
+            entries_by_stat={
+                stat_name: [
+                    (core_dataclasses.User.from_dict(player), value) for player, value in entries
+                ]
+                for stat_name, entries in data["stats"].items()
+            },
+        )
@@ -0,0 +1,276 @@
+import array
+import datetime
+import typing
+import uuid
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+_MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1_000_000
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+# The columns that hold one value per match, along with their `array` type codes
+_COLUMNS = {
+    "winners": "i",
+    "losers": "i",
+    "servers": "i",
+    "winner_scores": "i",
+    "loser_scores": "i",
+    "played_at": "q",
+    "logged_at": "q",
+    "logged_by": "i",
+}
+
+# Fields of `MatchResult` that can be sorted on without building the match results
+_SORTABLE_COLUMNS = {
+    "played_at": "played_at",
+    "logged_at": "logged_at",
+    "winner_score": "winner_scores",
+    "loser_score": "loser_scores",
+}
+
+
+def to_epoch_microseconds(value: datetime.datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_epoch_microseconds(value: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(microseconds=value)
+
+
+def _new_column(name: str) -> array.array:
+    return array.array(_COLUMNS[name])
+
+
+@attrs.frozen
+class MatchTable:
+    """
+    A columnar alternative to `Matches` for analysing large match histories.
+
+    Each match is a row across parallel `array` columns, with users stored as indexes into a shared `users`
+    dictionary. Queries select rows by position rather than building a new list of `MatchResult` objects, which are
+    only built if `match_results` is accessed.
+
+    Users are keyed on all of their fields, so a user who has changed their name has more than one index. Queries on
+    a user match all of their indexes.
+    """
+
+    users: tuple[core_dataclasses.User, ...]
+    winners: array.array
+    losers: array.array
+    servers: array.array
+    winner_scores: array.array
+    loser_scores: array.array
+    played_at: array.array
+    logged_at: array.array
+    logged_by: array.array
+    result_ids: tuple[uuid.UUID, ...]
+
+    def __bool__(self) -> bool:
+        return bool(self.result_ids)
+
+    def __len__(self) -> int:
+        return len(self.result_ids)
+
+    @classmethod
+    def from_matches(cls, matches: dataclasses.Matches) -> "MatchTable":
+        builder = MatchTableBuilder()
+        for match_result in matches.match_results:
+            builder.append(match_result)
+        return builder.build()
+
+    def to_matches(self) -> dataclasses.Matches:
+        return dataclasses.Matches(match_results=self.match_results)
+
+    @property
+    def match_results(self) -> list[dataclasses.MatchResult]:
+        return [self.row(position) for position in range(len(self))]
+
+    def row(self, position: int) -> dataclasses.MatchResult:
+        users = self.users
+        return dataclasses.MatchResult(
+            winner=users[self.winners[position]],
+            winner_score=self.winner_scores[position],
+            loser_score=self.loser_scores[position],
+            loser=users[self.losers[position]],
+            served=users[self.servers[position]],
+            played_at=from_epoch_microseconds(self.played_at[position]),
+            logged_at=from_epoch_microseconds(self.logged_at[position]),
+            logged_by=users[self.logged_by[position]],
+            result_id=self.result_ids[position],
+        )
+
+    def played_on_ordinals(self) -> list[int]:
+        """
+        The proleptic Gregorian ordinal of the day each match was played on, as `datetime.date.toordinal` returns.
+        """
+        return [
+            played_at // _MICROSECONDS_PER_DAY + _EPOCH_ORDINAL for played_at in self.played_at
+        ]
+
+    def user_indexes(self, user: core_dataclasses.User) -> set[int]:
+        return {index for index, table_user in enumerate(self.users) if table_user == user}
+
+    def take(self, positions: typing.Iterable[int]) -> "MatchTable":
+        """
+        Build a new table from the rows at the given positions, sharing the users dictionary.
+        """
+        positions = list(positions)
+        columns = {
+            name: array.array(_COLUMNS[name], [getattr(self, name)[p] for p in positions])
+            for name in _COLUMNS
+        }
+        return MatchTable(
+            users=self.users,
+            result_ids=tuple(self.result_ids[p] for p in positions),
+            **columns,
+        )
+
+    # Queries
+    # -------
+
+    def sort_by(self, field: str, reverse: bool = False) -> "MatchTable":
+        if column_name := _SORTABLE_COLUMNS.get(field):
+            column = getattr(self, column_name)
+            return self.take(sorted(range(len(self)), key=column.__getitem__, reverse=reverse))
+
+        # Fall back to sorting on the match results for fields that aren't stored as columns
+        match_results = self.match_results
+        try:
+            return self.take(
+                sorted(
+                    range(len(self)),
+                    key=lambda p: getattr(match_results[p], field),
+                    reverse=reverse,
+                )
+            )
+        except AttributeError as e:
+            raise dataclasses.FieldDoesNotExist(field) from e
+
+    def from_date(self, from_date: datetime.date) -> "MatchTable":
+        from_ordinal = from_date.toordinal()
+        return self.take(
+            position
+            for position, ordinal in enumerate(self.played_on_ordinals())
+            if ordinal >= from_ordinal
+        )
+
+    def on_date(self, on_date: datetime.date) -> "MatchTable":
+        on_ordinal = on_date.toordinal()
+        return self.take(
+            position
+            for position, ordinal in enumerate(self.played_on_ordinals())
+            if ordinal == on_ordinal
+        )
+
+    def involves(self, user: core_dataclasses.User) -> "MatchTable":
+        indexes = self.user_indexes(user)
+        return self.take(
+            position
+            for position, (winner, loser) in enumerate(zip(self.winners, self.losers))
+            if winner in indexes or loser in indexes
+        )
+
+    def last(self, n: int = 1) -> "MatchTable":
+        return self.take(range(max(len(self) - n, 0), len(self)))
+
+    def match_by_id(self, result_id_str: str) -> dataclasses.MatchResult:
+        result_id = uuid.UUID(result_id_str)
+        try:
+            return self.row(self.result_ids.index(result_id))
+        except ValueError as e:
+            raise dataclasses.MatchNotFound from e
+
+
+class MatchTableBuilder:
+    """
+    Build a `MatchTable` a row at a time.
+    """
+
+    def __init__(self) -> None:
+        self._users: list[core_dataclasses.User] = []
+        self._user_indexes: dict[tuple[str, str, str], int] = {}
+        self._columns = {name: _new_column(name) for name in _COLUMNS}
+        self._result_ids: list[uuid.UUID] = []
+        self._positions: dict[uuid.UUID, int] = {}
+
+    def user_index(self, user: core_dataclasses.User) -> int:
+        user_key = (user.id, user.username, user.global_name)
+        if (index := self._user_indexes.get(user_key)) is None:
+            index = self._user_indexes[user_key] = len(self._users)
+            self._users.append(user)
+        return index
+
+    def append(self, match_result: dataclasses.MatchResult) -> None:
+        winner = self.user_index(match_result.winner)
+        loser = self.user_index(match_result.loser)
+        if match_result.served == match_result.winner:
+            server = winner
+        elif match_result.served == match_result.loser:
+            server = loser
+        else:
+            server = self.user_index(match_result.served)
+
+        self.append_row(
+            winner=winner,
+            loser=loser,
+            server=server,
+            winner_score=match_result.winner_score,
+            loser_score=match_result.loser_score,
+            played_at=to_epoch_microseconds(match_result.played_at),
+            logged_at=to_epoch_microseconds(match_result.logged_at),
+            logged_by=self.user_index(match_result.logged_by),
+            result_id=match_result.result_id,
+        )
+
+    def append_row(
+        self,
+        *,
+        winner: int,
+        loser: int,
+        server: int,
+        winner_score: int,
+        loser_score: int,
+        played_at: int,
+        logged_at: int,
+        logged_by: int,
+        result_id: uuid.UUID,
+        replace: bool = False,
+    ) -> None:
+        """
+        Append a row of user indexes, scores and epoch timestamps.
+
+        If `replace` is set, the row with the same result ID is overwritten instead, and the row is dropped if there
+        isn't one, mirroring `Matches.replace`.
+        """
+        values = (
+            winner,
+            loser,
+            server,
+            winner_score,
+            loser_score,
+            played_at,
+            logged_at,
+            logged_by,
+        )
+        if replace:
+            if (position := self._positions.get(result_id)) is not None:
+                for column, value in zip(self._columns.values(), values):
+                    column[position] = value
+            return
+
+        self._positions[result_id] = len(self._result_ids)
+        self._result_ids.append(result_id)
+        for column, value in zip(self._columns.values(), values):
+            column.append(value)
+
+    def build(self) -> MatchTable:
+        return MatchTable(
+            users=tuple(self._users),
+            result_ids=tuple(self._result_ids),
+            **self._columns,
+        )
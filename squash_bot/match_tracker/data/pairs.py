@@ -0,0 +1,174 @@
+import datetime
+import json
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, tally
+
+T_pair = tuple[core_dataclasses.User, core_dataclasses.User]
+
+
+@attrs.frozen
+class PairMatrix:
+    """
+    Every player's record against each of their opponents, as of a version of a guild's results log.
+
+    `tally_by_pair` maps an ordered pair of players to the first player's tally over their matches against the second,
+    so each match is tallied once from either side. Like `MaterializedTally`, it's kept up to date as results are
+    stored, so head-to-head stats can be read without replaying every match.
+    """
+
+    log_version: str
+    tally_by_pair: dict[T_pair, tally.MatchesTallyData]
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches, log_version: str) -> "PairMatrix":
+        tally_by_pair: dict[T_pair, tally.MatchesTallyData] = {}
+        for match_result in matches.match_results:
+            _record(tally_by_pair, match_result)
+        return cls(log_version=log_version, tally_by_pair=tally_by_pair)
+
+    def with_log_version(self, log_version: str) -> "PairMatrix":
+        return attrs.evolve(self, log_version=log_version)
+
+    def added(self, match_result: dataclasses.MatchResult, log_version: str) -> "PairMatrix":
+        """
+        Build the matrix after a match result was appended to the log.
+
+        Only the pair's two tallies are copied, the rest are shared with this matrix.
+        """
+        tally_by_pair = dict(self.tally_by_pair)
+        for pair in pairs_in(match_result):
+            if pair in tally_by_pair:
+                tally_by_pair[pair] = attrs.evolve(tally_by_pair[pair])
+        _record(tally_by_pair, match_result)
+        return PairMatrix(log_version=log_version, tally_by_pair=tally_by_pair)
+
+    def replaced(
+        self,
+        old_match_result: dataclasses.MatchResult,
+        new_matches: dataclasses.Matches,
+        log_version: str,
+    ) -> "PairMatrix":
+        """
+        Build the matrix after a match result was replaced, given the matches with the replacement in place.
+
+        The pair in the old result and the pair in the new one are re-tallied from the matches between them.
+        """
+        new_match_result = new_matches.match_by_id(str(old_match_result.result_id))
+        tally_by_pair = dict(self.tally_by_pair)
+        for player, opponent in {*pairs_in(old_match_result), *pairs_in(new_match_result)}:
+            pair_matches = new_matches.query().involves(player).involves(opponent).execute()
+            if pair_matches:
+                tally_by_pair[(player, opponent)] = tally.tally_player(player, pair_matches)
+            else:
+                tally_by_pair.pop((player, opponent), None)
+        return PairMatrix(log_version=log_version, tally_by_pair=tally_by_pair)
+
+    def head_to_head(
+        self, player: core_dataclasses.User, opponent: core_dataclasses.User
+    ) -> tally.MatchesTallyData | None:
+        """
+        Get the player's tally over their matches against the opponent, if they've played.
+        """
+        return self.tally_by_pair.get((player, opponent))
+
+    def last_played_at(
+        self, player: core_dataclasses.User, opponent: core_dataclasses.User
+    ) -> datetime.datetime | None:
+        """
+        Get when the two players last played each other, which is the later of their last wins against each other.
+        """
+        last_wins = [
+            pair_tally.last_win_datetime
+            for pair_tally in (
+                self.tally_by_pair.get((player, opponent)),
+                self.tally_by_pair.get((opponent, player)),
+            )
+            if pair_tally and pair_tally.last_win_datetime
+        ]
+        return max(last_wins, default=None)
+
+    def opponents(
+        self, player: core_dataclasses.User
+    ) -> dict[core_dataclasses.User, tally.MatchesTallyData]:
+        """
+        Get the player's tally against each of the opponents they've played.
+        """
+        return {
+            opponent: pair_tally
+            for (pair_player, opponent), pair_tally in self.tally_by_pair.items()
+            if pair_player == player
+        }
+
+    def nemeses(self) -> dict[core_dataclasses.User, core_dataclasses.User]:
+        """
+        Get each player's nemesis, the opponent who has beaten them the most. Ties go to the opponent with the best
+        win rate against them.
+        """
+        nemeses: dict[core_dataclasses.User, tuple[tuple[int, int], core_dataclasses.User]] = {}
+        for (player, opponent), pair_tally in self.tally_by_pair.items():
+            if not pair_tally.losses:
+                continue
+            rank = (pair_tally.losses, -pair_tally.win_rate)
+            if player not in nemeses or rank > nemeses[player][0]:
+                nemeses[player] = (rank, opponent)
+        return {player: opponent for player, (_, opponent) in nemeses.items()}
+
+    def rivalries(self) -> list[T_pair]:
+        """
+        Get every pair of players who have played each other, most matches first. Each pair appears once, from the
+        side of whoever won their first meeting.
+        """
+        pairs: list[T_pair] = []
+        seen: set[T_pair] = set()
+        for player, opponent in self.tally_by_pair:
+            if (opponent, player) not in seen:
+                seen.add((player, opponent))
+                pairs.append((player, opponent))
+        return sorted(
+            pairs, key=lambda pair: self.tally_by_pair[pair].number_matches, reverse=True
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "v": self.log_version,
+                "pairs": [
+                    {
+                        "player": player.to_dict(),
+                        "opponent": opponent.to_dict(),
+                        "tally": pair_tally.to_dict(),
+                    }
+                    for (player, opponent), pair_tally in self.tally_by_pair.items()
+                ],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, contents: str) -> "PairMatrix":
+        data = json.loads(contents)
+        return cls(
+            log_version=data["v"],
+            tally_by_pair={
+                (
+                    core_dataclasses.User.from_dict(entry["player"]),
+                    core_dataclasses.User.from_dict(entry["opponent"]),
+                ): tally.MatchesTallyData.from_dict(entry["tally"])
+                for entry in data["pairs"]
+            },
+        )
+
+
+def pairs_in(match_result: dataclasses.MatchResult) -> tuple[T_pair, T_pair]:
+    return (match_result.winner, match_result.loser), (match_result.loser, match_result.winner)
+
+
+def _record(
+    tally_by_pair: dict[T_pair, tally.MatchesTallyData], match_result: dataclasses.MatchResult
+) -> None:
+    winner_pair, loser_pair = pairs_in(match_result)
+    tally_by_pair.setdefault(winner_pair, tally.MatchesTallyData()).record_win(match_result)
+    tally_by_pair.setdefault(loser_pair, tally.MatchesTallyData()).record_loss(match_result)
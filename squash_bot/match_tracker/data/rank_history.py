@@ -0,0 +1,360 @@
+import bisect
+import datetime
+import json
+import typing
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, vector
+
+# A player's league position at the end of a session day
+T_rank = tuple[datetime.date, int]
+
+_NO_RANKS: vector.Vector[T_rank] = vector.Vector()
+
+
+def _win_rate(wins: int, number_matches: int) -> int:
+    # As `MatchesTallyData.win_rate` works it out, which is what the league table is ordered by
+    return int((wins / number_matches) * 100)
+
+
+@attrs.define
+class Standings:
+    """
+    Every player's wins and matches played, along with their win percentages in sorted order.
+
+    Recording a match moves its two players' win percentages within the sorted order, so a player's league position
+    can be looked up without re-sorting the table.
+    """
+
+    # Each player's wins and number of matches, in the order they first played
+    records: dict[core_dataclasses.User, tuple[int, int]] = attrs.Factory(dict)
+    # Every player's win percentage, negated so the best comes first
+    _order: list[int] = attrs.Factory(list)
+
+    @classmethod
+    def from_records(cls, records: dict[core_dataclasses.User, tuple[int, int]]) -> "Standings":
+        return cls(
+            records=records,
+            order=sorted(-_win_rate(*record) for record in records.values()),
+        )
+
+    def record_match(self, match_result: dataclasses.MatchResult) -> None:
+        for player, won in ((match_result.winner, True), (match_result.loser, False)):
+            wins, number_matches = self.records.get(player, (0, 0))
+            if number_matches:
+                del self._order[bisect.bisect_left(self._order, -_win_rate(wins, number_matches))]
+            self.records[player] = (wins + won, number_matches + 1)
+            bisect.insort(self._order, -_win_rate(*self.records[player]))
+
+    def position_of(self, player: core_dataclasses.User) -> int:
+        """
+        Get the player's position in the league table. Players with the same win percentage share a position.
+        """
+        return bisect.bisect_left(self._order, -_win_rate(*self.records[player])) + 1
+
+    def copy(self) -> "Standings":
+        return Standings(records=dict(self.records), order=list(self._order))
+
+
+@attrs.frozen
+class SessionRanks:
+    """
+    Every player's league position at the end of a session day, in the order they first played.
+    """
+
+    session_date: datetime.date
+    positions: list[tuple[core_dataclasses.User, int]]
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "date": self.session_date.isoformat(),
+            "positions": [[player.to_dict(), position] for player, position in self.positions],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, typing.Any]) -> "SessionRanks":
+        return cls(
+            session_date=datetime.date.fromisoformat(data["date"]),
+            positions=[
+                (core_dataclasses.User.from_dict(player), position)
+                for player, position in data["positions"]
+            ],
+        )
+
+
+@attrs.frozen
+class HistoryUpdate:
+    """
+    The sessions a write to a guild's results log changed, which are appended to its stored rank history.
+
+    The first `kept_sessions` sessions of the history are kept, or all of them if it's `None`, and the sessions that
+    follow are appended. A session on the same day as the one before it takes its place.
+    """
+
+    previous_log_version: str | None
+    log_version: str
+    kept_sessions: int | None
+    sessions: list[SessionRanks]
+
+    def applied(self, sessions: list[SessionRanks]) -> list[SessionRanks]:
+        if self.kept_sessions is not None:
+            sessions = sessions[: self.kept_sessions]
+        else:
+            sessions = list(sessions)
+        for session in self.sessions:
+            if sessions and sessions[-1].session_date == session.session_date:
+                sessions[-1] = session
+            else:
+                sessions.append(session)
+        return sessions
+
+    def to_line(self) -> str:
+        return (
+            json.dumps(
+                {
+                    "p": self.previous_log_version,
+                    "v": self.log_version,
+                    "keep": self.kept_sessions,
+                    "sessions": [session.to_dict() for session in self.sessions],
+                },
+                separators=(",", ":"),
+            )
+            + "\n"
+        )
+
+    @classmethod
+    def from_line(cls, line: str) -> "HistoryUpdate":
+        data = json.loads(line)
+        return cls(
+            previous_log_version=data["p"],
+            log_version=data["v"],
+            kept_sessions=data["keep"],
+            sessions=[SessionRanks.from_dict(session) for session in data["sessions"]],
+        )
+
+
+def _record_sessions(
+    standings: Standings, match_results: typing.Iterable[dataclasses.MatchResult]
+) -> list[SessionRanks]:
+    """
+    Record the matches in the standings, and get everyone's positions at the end of each session day.
+    """
+    # Matches are recorded in the order they're played, so a session day ends when the next one's matches start
+    sessions = []
+    session_date: datetime.date | None = None
+    for match_result in match_results:
+        if session_date is not None and match_result.played_on != session_date:
+            sessions.append(_session_ranks(standings, session_date))
+        standings.record_match(match_result)
+        session_date = match_result.played_on
+    if session_date is not None:
+        sessions.append(_session_ranks(standings, session_date))
+    return sessions
+
+
+def _session_ranks(standings: Standings, session_date: datetime.date) -> SessionRanks:
+    return SessionRanks(
+        session_date=session_date,
+        positions=[(player, standings.position_of(player)) for player in standings.records],
+    )
+
+
+def _session_start(
+    match_results: typing.Sequence[dataclasses.MatchResult],
+    position: int,
+    session_date: datetime.date,
+) -> int:
+    # The position of the first match of the session that a match on the date at `position` would be part of
+    while position > 0 and match_results[position - 1].played_on == session_date:
+        position -= 1
+    return position
+
+
+@attrs.frozen
+class RankStandings:
+    """
+    The league standings as of a version of a guild's results log, kept up to date as results are stored.
+
+    Each write only records the positions of the sessions it changed, as an `update` that's appended to the stored
+    rank history, so neither the history nor the matches before the changed sessions are written again. A new result
+    only moves its players within the standings and records everyone's position for its day.
+    """
+
+    log_version: str
+    standings: Standings
+    # The day of the latest session, which the next result is either part of or follows
+    session_date: datetime.date | None
+    # What the write that got the standings to this version changed in the rank history, if they were written
+    update: HistoryUpdate | None = attrs.field(default=None, eq=False)
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches, log_version: str) -> "RankStandings":
+        standings = Standings()
+        sessions = _record_sessions(standings, matches.match_results)
+        return cls(
+            log_version=log_version,
+            standings=standings,
+            session_date=sessions[-1].session_date if sessions else None,
+            update=HistoryUpdate(
+                previous_log_version=None,
+                log_version=log_version,
+                kept_sessions=0,
+                sessions=sessions,
+            ),
+        )
+
+    def with_log_version(self, log_version: str) -> "RankStandings":
+        return attrs.evolve(
+            self,
+            log_version=log_version,
+            update=HistoryUpdate(
+                previous_log_version=self.log_version,
+                log_version=log_version,
+                kept_sessions=None,
+                sessions=[],
+            ),
+        )
+
+    def added(self, match_result: dataclasses.MatchResult, log_version: str) -> "RankStandings":
+        """
+        Get the standings after a match result was appended to the log, along with the positions for its day.
+        """
+        standings = self.standings.copy()
+        return RankStandings(
+            log_version=log_version,
+            standings=standings,
+            session_date=match_result.played_on,
+            update=HistoryUpdate(
+                previous_log_version=self.log_version,
+                log_version=log_version,
+                kept_sessions=None,
+                sessions=_record_sessions(standings, [match_result]),
+            ),
+        )
+
+    def replaced(
+        self,
+        old_match_result: dataclasses.MatchResult,
+        new_matches: dataclasses.Matches,
+        log_version: str,
+    ) -> "RankStandings":
+        """
+        Get the standings after a match result was replaced, given the matches with the replacement in place.
+
+        The sessions before the replaced result's are kept. The standings are worked out again from the records of
+        the matches before it, and the positions are recorded again from its session onwards. If its day changed,
+        that's from whichever of its old or new sessions came first.
+        """
+        match_results = new_matches.match_results
+        position = new_matches.position_of(str(old_match_result.result_id))
+        start = min(
+            _session_start(match_results, position, old_match_result.played_on),
+            _session_start(match_results, position, match_results[position].played_on),
+        )
+
+        kept_sessions = 0
+        records: dict[core_dataclasses.User, tuple[int, int]] = {}
+        for index, match_result in enumerate(match_results[:start]):
+            if index == 0 or match_result.played_on != match_results[index - 1].played_on:
+                kept_sessions += 1
+            for player, won in ((match_result.winner, True), (match_result.loser, False)):
+                wins, number_matches = records.get(player, (0, 0))
+                records[player] = (wins + won, number_matches + 1)
+
+        standings = Standings.from_records(records)
+        sessions = _record_sessions(standings, match_results[start:])
+        return RankStandings(
+            log_version=log_version,
+            standings=standings,
+            session_date=match_results[-1].played_on,
+            update=HistoryUpdate(
+                previous_log_version=self.log_version,
+                log_version=log_version,
+                kept_sessions=kept_sessions,
+                sessions=sessions,
+            ),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "v": self.log_version,
+                "records": [
+                    [player.to_dict(), wins, number_matches]
+                    for player, (wins, number_matches) in self.standings.records.items()
+                ],
+                "date": self.session_date.isoformat() if self.session_date else None,
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, contents: str) -> "RankStandings":
+        data = json.loads(contents)
+        return cls(
+            log_version=data["v"],
+            standings=Standings.from_records(
+                {
+                    core_dataclasses.User.from_dict(player): (wins, number_matches)
+                    for player, wins, number_matches in data["records"]
+                }
+            ),
+            session_date=datetime.date.fromisoformat(data["date"]) if data["date"] else None,
+        )
+
+
+@attrs.frozen
+class RankHistory:
+    """
+    Every player's league position at the end of each session day, as of a version of a guild's results log.
+    """
+
+    log_version: str
+    ranks_by_player: dict[core_dataclasses.User, vector.Vector[T_rank]]
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches, log_version: str) -> "RankHistory":
+        return cls.from_sessions(_record_sessions(Standings(), matches.match_results), log_version)
+
+    @classmethod
+    def from_sessions(cls, sessions: list[SessionRanks], log_version: str) -> "RankHistory":
+        ranks_by_player: dict[core_dataclasses.User, vector.Vector[T_rank]] = {}
+        for session in sessions:
+            for player, position in session.positions:
+                rank = (session.session_date, position)
+                ranks = ranks_by_player.get(player, _NO_RANKS)
+                if ranks and ranks[-1][0] == session.session_date:
+                    ranks_by_player[player] = ranks.set(len(ranks) - 1, rank)
+                else:
+                    ranks_by_player[player] = ranks.append(rank)
+        return cls(log_version=log_version, ranks_by_player=ranks_by_player)
+
+    @classmethod
+    def from_lines(cls, contents: str) -> "RankHistory | None":
+        """
+        Read a stored rank history, from the updates that were appended to it.
+
+        Writers can append their updates out of order, so each update is applied after the one for the log version
+        it follows, starting from the latest update that recorded every session. Returns `None` if there isn't one.
+        """
+        updates = [HistoryUpdate.from_line(line) for line in contents.splitlines() if line]
+        update = next((update for update in reversed(updates) if update.kept_sessions == 0), None)
+        if update is None:
+            return None
+        following = {update.previous_log_version: update for update in updates}
+
+        sessions: list[SessionRanks] = []
+        while True:
+            sessions = update.applied(sessions)
+            next_update = following.get(update.log_version)
+            if next_update is None:
+                return cls.from_sessions(sessions, update.log_version)
+            update = next_update
+
+    def ranks_of(self, player: core_dataclasses.User) -> vector.Vector[T_rank]:
+        """
+        Get the player's position at the end of each session day since they first played, oldest first.
+        """
+        return self.ranks_by_player.get(player, _NO_RANKS)
@@ -0,0 +1,194 @@
+import json
+import typing
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import checkpoints, dataclasses
+
+INITIAL_RATING = 1500.0
+
+# The most a player's rating can change by in a single match
+K_FACTOR = 32
+
+# How many matches apart the ratings are checkpointed, so an edited match only needs replaying from the checkpoint
+# before it
+CHECKPOINT_SPACING = checkpoints.CHECKPOINT_SPACING
+
+T_rating_by_player = dict[core_dataclasses.User, "PlayerRating"]
+
+
+@attrs.frozen
+class PlayerRating:
+    rating: float = INITIAL_RATING
+    number_matches: int = 0
+
+    @property
+    def display_rating(self) -> int:
+        return round(self.rating)
+
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    """
+    Get the chance of a player beating an opponent, according to their Elo ratings.
+    """
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def rate_match(
+    winner_rating: PlayerRating, loser_rating: PlayerRating
+) -> tuple[PlayerRating, PlayerRating]:
+    """
+    Get the winner's and loser's ratings after a match between them.
+
+    The winner gains what the loser loses, and gains more the less they were expected to win.
+    """
+    change = K_FACTOR * (1 - expected_score(winner_rating.rating, loser_rating.rating))
+    return (
+        PlayerRating(
+            rating=winner_rating.rating + change,
+            number_matches=winner_rating.number_matches + 1,
+        ),
+        PlayerRating(
+            rating=loser_rating.rating - change,
+            number_matches=loser_rating.number_matches + 1,
+        ),
+    )
+
+
+@attrs.frozen
+class RatingTable:
+    """
+    The Elo rating of every player after the first `position` matches, as of a version of a guild's results log.
+
+    Ratings depend on the order matches were played in, so unlike the tally an edited match can't be fixed up in
+    place. The ratings are checkpointed every `CHECKPOINT_SPACING` matches instead, and an edit replays the matches
+    from the latest checkpoint before it. Players are kept in the order they first appear in the log.
+    """
+
+    log_version: str
+    position: int
+    rating_by_player: T_rating_by_player
+    checkpoint_log: checkpoints.CheckpointLog = checkpoints.CheckpointLog()
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches, log_version: str) -> "RatingTable":
+        return cls(log_version=log_version, position=0, rating_by_player={})._replayed(
+            matches.match_results, log_version
+        )
+
+    def with_log_version(self, log_version: str) -> "RatingTable":
+        return attrs.evolve(self, log_version=log_version)
+
+    def added(self, match_result: dataclasses.MatchResult, log_version: str) -> "RatingTable":
+        """
+        Build the table after a match result was appended to the log.
+        """
+        return self._replayed([match_result], log_version)
+
+    def replaced(
+        self,
+        old_match_result: dataclasses.MatchResult,
+        new_matches: dataclasses.Matches,
+        log_version: str,
+    ) -> "RatingTable":
+        """
+        Build the table after a match result was replaced, given the matches with the replacement in place.
+
+        The checkpoints that cover the replaced result are dropped, and the matches are replayed from the latest one
+        that's left.
+        """
+        position = new_matches.position_of(str(old_match_result.result_id))
+        checkpoint_log = self.checkpoint_log.invalidated_from(position)
+        checkpoint = checkpoint_log.latest(position)
+
+        resumed_table = RatingTable(
+            log_version=log_version,
+            position=checkpoint.position if checkpoint else 0,
+            rating_by_player=_ratings_from_list(checkpoint.state["ratings"]) if checkpoint else {},
+            checkpoint_log=checkpoint_log,
+        )
+        return resumed_table._replayed(
+            new_matches.match_results[resumed_table.position :], log_version
+        )
+
+    def rating_of(self, player: core_dataclasses.User) -> PlayerRating:
+        """
+        Get the player's rating, which is the initial rating if they haven't played yet.
+        """
+        return self.rating_by_player.get(player, PlayerRating())
+
+    def ranked(self) -> list[tuple[core_dataclasses.User, PlayerRating]]:
+        """
+        Get every player's rating, highest first.
+        """
+        return sorted(self.rating_by_player.items(), key=lambda item: item[1].rating, reverse=True)
+
+    def _replayed(
+        self, match_results: typing.Iterable[dataclasses.MatchResult], log_version: str
+    ) -> "RatingTable":
+        rating_by_player = dict(self.rating_by_player)
+        position = self.position
+        checkpoint_log = self.checkpoint_log
+        for match_result in match_results:
+            (
+                rating_by_player[match_result.winner],
+                rating_by_player[match_result.loser],
+            ) = rate_match(
+                rating_by_player.get(match_result.winner, PlayerRating()),
+                rating_by_player.get(match_result.loser, PlayerRating()),
+            )
+            position += 1
+            if position % CHECKPOINT_SPACING == 0:
+                checkpoint_log = checkpoint_log.added(
+                    checkpoints.Checkpoint(
+                        position=position, state={"ratings": _ratings_to_list(rating_by_player)}
+                    )
+                )
+        return RatingTable(
+            log_version=log_version,
+            position=position,
+            rating_by_player=rating_by_player,
+            checkpoint_log=checkpoint_log,
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "v": self.log_version,
+                "position": self.position,
+                "ratings": _ratings_to_list(self.rating_by_player),
+                "checkpoints": self.checkpoint_log.to_list(),
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, contents: str) -> "RatingTable":
+        data = json.loads(contents)
+        return cls(
+            log_version=data["v"],
+            position=data["position"],
+            rating_by_player=_ratings_from_list(data["ratings"]),
+            checkpoint_log=checkpoints.CheckpointLog.from_list(data["checkpoints"]),
+        )
+
+
+def _ratings_to_list(rating_by_player: T_rating_by_player) -> list[dict[str, typing.Any]]:
+    return [
+        {
+            "player": player.to_dict(),
+            "rating": player_rating.rating,
+            "matches": player_rating.number_matches,
+        }
+        for player, player_rating in rating_by_player.items()
+    ]
+
+
+def _ratings_from_list(data: list[dict[str, typing.Any]]) -> T_rating_by_player:
+    return {
+        core_dataclasses.User.from_dict(entry["player"]): PlayerRating(
+            rating=entry["rating"], number_matches=entry["matches"]
+        )
+        for entry in data
+    }
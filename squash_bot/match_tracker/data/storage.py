@@ -1,22 +1,237 @@
-import json
+import logging
+import typing
+import uuid
+
+import attrs
 
 from common.settings import base as settings_base
 from common.storage import base
 from squash_bot.core.data import dataclasses as core_dataclasses
-from squash_bot.match_tracker.data import dataclasses
+from squash_bot.match_tracker.data import (
+    checkpoints,
+    dataclasses,
+    encoding,
+    form,
+    leaderboards,
+    match_table,
+    pairs,
+    rank_history,
+    ratings,
+    tally,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+@attrs.frozen
+class _CachedResults:
+    """
+    What we know about a version of a guild's results file.
+
+    `matches` is `None` if only the user table has been decoded, which is all that's needed to append to the file.
+    """
+
+    version: str
+    schema_version: int
+    user_table: encoding.UserTable
+    matches: dataclasses.Matches | None
+
+
+@attrs.frozen
+class _LogWrite:
+    """
+    A record written to a guild's match log, along with what's needed to bring the files alongside the log up to
+    date with it.
+
+    The record was either appended to the log, or the log was rewritten with it in an upgrade to the latest schema.
+    """
+
+    results_file: base.VersionedFile
+    version: str
+    user_table: encoding.UserTable
+    # The number of users in the log's user table before the write
+    first_user: int
+    record: str | None
+    rewritten_contents: str | None
+    matches_before: dataclasses.Matches | None
+    matches_after: dataclasses.Matches | None
+
+
+@attrs.define
+class _WriteMatches:
+    """
+    The matches before and after a write to a guild's results log, decoded from the log only if they're needed.
+    """
+
+    results_file: base.VersionedFile
+    mutation: typing.Callable[[dataclasses.Matches], dataclasses.Matches]
+    before: dataclasses.Matches | None = None
+    after: dataclasses.Matches | None = None
+
+    def get_before(self) -> dataclasses.Matches:
+        if self.before is None:
+            self.before = encoding.decode_log(self.results_file.contents).fold()
+        return self.before
+
+    def get_after(self) -> dataclasses.Matches:
+        if self.after is None:
+            self.after = self.mutation(self.get_before())
+        return self.after
+
+
+T_aggregate = typing.TypeVar("T_aggregate", bound="_Aggregate")
+
+
+class _Aggregate(typing.Protocol):
+    """
+    Something derived from every match in a guild's results log that's kept up to date as results are stored, such
+    as the materialized tally.
+    """
+
+    @property
+    def log_version(self) -> str: ...
+
+    def added(
+        self: T_aggregate, match_result: dataclasses.MatchResult, log_version: str
+    ) -> T_aggregate: ...
+
+    def replaced(
+        self: T_aggregate,
+        old_match_result: dataclasses.MatchResult,
+        new_matches: dataclasses.Matches,
+        log_version: str,
+    ) -> T_aggregate: ...
+
+    def with_log_version(self: T_aggregate, log_version: str) -> T_aggregate: ...
+
+    def to_json(self) -> str: ...
+
+
+_AggregateBuilder = typing.Callable[[dataclasses.Matches, str], T_aggregate]
+
+T_stored = typing.TypeVar("T_stored")
+
+# The names the aggregates are stored under in a guild's aggregates file
+_TALLY = "tally"
+_LEADERBOARDS = "leaderboards"
+_PAIR_MATRIX = "pairs"
+_FORM = "form"
+_RATINGS = "ratings"
+_RANK_STANDINGS = "rank_standings"
+
+
+# Decoded match results kept for the lifetime of the (warm) container, keyed by the results file they were read from
+_results_cache: dict[tuple[str, str], _CachedResults] = {}
+
+# Tally indexes built over the cached match results, rebuilt whenever the cached results change
+_tally_index_cache: dict[tuple[str, str], tally.TallyIndex] = {}
 
 
 def get_all_match_results_as_list(guild: core_dataclasses.Guild) -> list:
-    file_contents = base.read_file(
-        file_path=settings_base.settings.MATCH_RESULTS_PATH,
-        file_name=_results_file_name(guild),
-        create_if_missing=True,
-    )
-    return json.loads(file_contents or "[]")
+    return convert_match_results_to_dicts(get_all_match_results(guild))
 
 
 def get_all_match_results(guild: core_dataclasses.Guild) -> dataclasses.Matches:
-    return dataclasses.Matches.from_match_results(get_all_match_results_as_list(guild=guild))
+    """
+    Get the decoded match results for the guild, reusing the cached results if the file hasn't changed
+    """
+    matches, _ = get_versioned_match_results(guild)
+    return matches
+
+
+def get_versioned_match_results(
+    guild: core_dataclasses.Guild,
+) -> tuple[dataclasses.Matches, str]:
+    """
+    Get the decoded match results for the guild, along with the version of the log they were decoded from
+    """
+    results_file = _read_results_file(guild)
+    cache_key = _results_cache_key(guild)
+    cached = _results_cache.get(cache_key)
+    if cached and cached.version == results_file.version and cached.matches is not None:
+        return cached.matches, cached.version
+
+    decoded_log = encoding.decode_log(results_file.contents)
+    matches = decoded_log.fold()
+    _results_cache[cache_key] = _CachedResults(
+        version=results_file.version,
+        schema_version=decoded_log.schema_version,
+        user_table=decoded_log.users,
+        matches=matches,
+    )
+    return matches, results_file.version
+
+
+@attrs.define
+class _IndexedMatches:
+    """
+    A guild's match results looked up through its log's record index, reading only each match's own record.
+    """
+
+    guild: core_dataclasses.Guild
+    record_index: encoding.RecordIndex
+    _read: dict[str, dataclasses.MatchResult] = attrs.Factory(dict)
+
+    def match_by_id(self, result_id_str: str) -> dataclasses.MatchResult:
+        if result_id_str in self._read:
+            return self._read[result_id_str]
+        span = self.record_index.offsets.get(uuid.UUID(result_id_str).hex)
+        if span is None:
+            raise dataclasses.MatchNotFound
+        start, length = span
+        record = base.read_file_range(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(self.guild),
+            start=start,
+            length=length,
+        )
+        match_result = self._read[result_id_str] = encoding.decode_record(
+            record, self.record_index.users
+        )
+        return match_result
+
+
+def get_match_result(guild: core_dataclasses.Guild, result_id_str: str) -> dataclasses.MatchResult:
+    """
+    Get a single match result by its ID.
+    """
+    return get_match_lookup(guild).match_by_id(result_id_str)
+
+
+def get_match_lookup(guild: core_dataclasses.Guild) -> dataclasses.MatchLookup:
+    """
+    Get somewhere to look the guild's match results up by their IDs, without decoding the whole log if we can help it.
+
+    If the results aren't already cached, matches are found through the log's record index and only their own records
+    are read. We fall back to reading the whole log if the index is missing or out of date.
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return dataclasses.Matches([])
+
+    cached = _results_cache.get(_results_cache_key(guild))
+    if cached and cached.version == version and cached.matches is not None:
+        return cached.matches
+
+    record_index = _read_record_index(guild)
+    if record_index is None or record_index.log_version != version:
+        return get_all_match_results(guild)
+    return _IndexedMatches(guild=guild, record_index=record_index)
+
+
+def get_match_table(guild: core_dataclasses.Guild) -> match_table.MatchTable:
+    """
+    Get the guild's match results in columnar form, for analysis over large histories.
+
+    The log is decoded straight into the table's columns, which is quicker than decoding it into `Matches` when only
+    the columns are needed.
+    """
+    return encoding.decode_match_table(_read_results_file(guild).contents)
 
 
 def convert_match_results_to_dicts(matches: dataclasses.Matches) -> list[dict]:
@@ -25,38 +240,697 @@ def convert_match_results_to_dicts(matches: dataclasses.Matches) -> list[dict]:
 
 def store_match_result(
     match_result: dataclasses.MatchResult, guild: core_dataclasses.Guild
+) -> base.AppendedFile:
+    """
+    Append the new result to the end of the match log, returning the versions of the log either side of it
+    """
+    return _write_record(
+        encoding.ADD_OPERATION,
+        match_result,
+        guild,
+        mutation=lambda matches: matches.add(match_result),
+    )
+
+
+def replace_match_result(
+    match_result: dataclasses.MatchResult, guild: core_dataclasses.Guild
 ) -> None:
     """
-    Get the current match results, add the new result, and store the updated list
+    Append a record to the match log that supersedes the existing result with the same result ID
     """
-    all_results = get_all_match_results(guild)
-    all_results = all_results.add(match_result)
+    _write_record(
+        encoding.REPLACE_OPERATION,
+        match_result,
+        guild,
+        mutation=lambda matches: matches.replace(match_result),
+    )
 
-    match_results_as_dicts = convert_match_results_to_dicts(all_results)
-    base.store_file(
+    # Any checkpoints that cover the replaced result are now out of date
+    try:
+        position = get_all_match_results(guild).position_of(str(match_result.result_id))
+    except dataclasses.MatchNotFound:
+        return
+    _invalidate_checkpoints(guild, position)
+
+
+def _read_results_file(guild: core_dataclasses.Guild) -> base.VersionedFile:
+    return base.read_file_with_version(
         file_path=settings_base.settings.MATCH_RESULTS_PATH,
         file_name=_results_file_name(guild),
-        contents=json.dumps(match_results_as_dicts),
+        create_if_missing=True,
     )
 
 
-def replace_match_result(
-    match_result: dataclasses.MatchResult, guild: core_dataclasses.Guild
+def _write_record(
+    operation: str,
+    match_result: dataclasses.MatchResult,
+    guild: core_dataclasses.Guild,
+    mutation: typing.Callable[[dataclasses.Matches], dataclasses.Matches],
+) -> base.AppendedFile:
+    """
+    Write a record to the match log, then bring the files kept alongside it up to date, such as its index and
+    aggregates.
+
+    Only the write to the log is retried if it conflicts. The files alongside it are written once the record is safely
+    in the log, so that a conflict on one of them can never write the record twice.
+
+    Appending a record avoids decoding and re-encoding the matches already in the log, but it doesn't avoid moving
+    the log's bytes. The whole file is read to check its version and user table on every write. S3 has no append, so
+    there the record is written by putting the whole file back with the record on the end. Writing a record is
+    therefore still O(history) in bytes moved, although it is only O(1) in the matches decoded.
+    """
+    log_write = base.retry_on_conflict(
+        lambda: _write_log(operation, match_result, guild, mutation)
+    )
+    if log_write.rewritten_contents is not None:
+        # The log was rewritten, so its index is too
+        _store_record_index(
+            guild, encoding.index_log(log_write.rewritten_contents, log_write.version)
+        )
+    elif log_write.record is not None:
+        _append_record_index(guild, log_write, log_write.record)
+
+    write_matches = _WriteMatches(
+        results_file=log_write.results_file,
+        mutation=mutation,
+        before=log_write.matches_before,
+        after=log_write.matches_after,
+    )
+    _write_aggregates(operation, match_result, guild, log_write.version, write_matches)
+
+    _results_cache[_results_cache_key(guild)] = _CachedResults(
+        version=log_write.version,
+        schema_version=encoding.SCHEMA_VERSION,
+        user_table=log_write.user_table,
+        matches=write_matches.after,
+    )
+    return base.AppendedFile(
+        previous_version=log_write.results_file.version, version=log_write.version
+    )
+
+
+def _write_log(
+    operation: str,
+    match_result: dataclasses.MatchResult,
+    guild: core_dataclasses.Guild,
+    mutation: typing.Callable[[dataclasses.Matches], dataclasses.Matches],
+) -> _LogWrite:
+    """
+    Write a record to the match log, as a single attempt that raises `VersionConflict` if the log changed under us.
+
+    Files in an older schema are upgraded by rewriting them in full. Otherwise the record is appended, conditional on
+    the file not having changed since we read its user table.
+    """
+    results_file = _read_results_file(guild)
+    cached = _results_cache.get(_results_cache_key(guild))
+    if not cached or cached.version != results_file.version:
+        cached = _CachedResults(
+            version=results_file.version,
+            schema_version=encoding.schema_version(results_file.contents),
+            user_table=encoding.decode_user_table(results_file.contents),
+            matches=None,
+        )
+
+    matches_before = cached.matches
+    if cached.schema_version < encoding.SCHEMA_VERSION:
+        if matches_before is None:
+            matches_before = encoding.decode_log(results_file.contents).fold()
+        matches = mutation(matches_before)
+        contents, user_table = encoding.encode_log(matches)
+        version = base.store_file(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+            contents=contents,
+            if_version=results_file.version,
+        )
+        return _LogWrite(
+            results_file=results_file,
+            version=version,
+            user_table=user_table,
+            first_user=0,
+            record=None,
+            rewritten_contents=contents,
+            matches_before=matches_before,
+            matches_after=matches,
+        )
+
+    # Copy the user table so a failed write doesn't leave users in the cache that were never stored
+    user_table = cached.user_table.copy()
+    record = encoding.encode_record(operation, match_result, user_table)
+    version = base.append_file(
+        file_path=settings_base.settings.MATCH_RESULTS_PATH,
+        file_name=_results_file_name(guild),
+        contents=record,
+        if_version=results_file.version,
+    ).version
+    return _LogWrite(
+        results_file=results_file,
+        version=version,
+        user_table=user_table,
+        first_user=len(cached.user_table.users),
+        record=record,
+        rewritten_contents=None,
+        matches_before=matches_before,
+        matches_after=mutation(matches_before) if matches_before is not None else None,
+    )
+
+
+def _append_record_index(guild: core_dataclasses.Guild, log_write: _LogWrite, record: str) -> None:
+    """
+    Index the record that was appended to the log.
+
+    The index is appended to after the log, so it may briefly lag behind it. Readers check its version first, and
+    index any records that a writer didn't get as far as indexing from the log itself.
+    """
+    index_batch = encoding.index_batch(
+        record,
+        start=len(log_write.results_file.contents.encode("utf-8")),
+        log_version=log_write.version,
+        first_user=log_write.first_user,
+    )
+    appended_index = _append_alongside_log(_record_index_file_name(guild), index_batch.to_line())
+    if appended_index and appended_index.previous_version is None and index_batch.start:
+        # The log predates its index, so the whole log is indexed
+        _store_record_index(
+            guild,
+            encoding.index_log(log_write.results_file.contents + record, log_write.version),
+        )
+
+
+def _append_alongside_log(file_name: str, contents: str) -> base.AppendedFile | None:
+    """
+    Append to one of the files kept alongside a guild's match log, once a record has been written to the log.
+
+    The append is retried on its own if it conflicts with another writer's. If it still conflicts, it's given up on
+    and `None` is returned, leaving the file to be brought up to date from the log.
+    """
+    try:
+        return base.retry_on_conflict(
+            lambda: base.append_file(
+                file_path=settings_base.settings.MATCH_RESULTS_PATH,
+                file_name=file_name,
+                contents=contents,
+            )
+        )
+    except base.VersionConflict:
+        logger.warning(f"Gave up appending to {file_name} after repeated conflicts")
+        return None
+
+
+def _write_aggregates(
+    operation: str,
+    match_result: dataclasses.MatchResult,
+    guild: core_dataclasses.Guild,
+    version: str,
+    write_matches: _WriteMatches,
 ) -> None:
     """
-    Get the current match results, replace the existing result with the new one, and store the updated list
+    Bring every aggregate of the log up to date with a write to it.
+
+    The aggregates are read and written together, in a single round trip each.
+    """
+    stored_aggregates = _read_aggregates(guild)
+    materialized_tally = _updated_aggregate(
+        _decode_aggregate(stored_aggregates, _TALLY, tally.MaterializedTally.from_json),
+        tally.MaterializedTally.build,
+        operation,
+        match_result,
+        version,
+        write_matches,
+    )
+    updated_aggregates: dict[str, _Aggregate | leaderboards.Leaderboards] = {
+        _TALLY: materialized_tally,
+        # The leaderboards are sorted from the all-time tally as it's written, so reads only take their top
+        # entries
+        _LEADERBOARDS: leaderboards.Leaderboards.build(
+            materialized_tally.tally_by_player, version
+        ),
+    }
+    aggregates: list[tuple[str, _Aggregate | None, _AggregateBuilder[_Aggregate]]] = [
+        (
+            _PAIR_MATRIX,
+            _decode_aggregate(stored_aggregates, _PAIR_MATRIX, pairs.PairMatrix.from_json),
+            pairs.PairMatrix.build,
+        ),
+        (
+            _FORM,
+            _decode_aggregate(stored_aggregates, _FORM, form.FormTable.from_json),
+            form.FormTable.build,
+        ),
+        (
+            _RATINGS,
+            _decode_aggregate(stored_aggregates, _RATINGS, ratings.RatingTable.from_json),
+            ratings.RatingTable.build,
+        ),
+    ]
+    for name, previous_aggregate, build in aggregates:
+        updated_aggregates[name] = _updated_aggregate(
+            previous_aggregate, build, operation, match_result, version, write_matches
+        )
+    rank_standings = _updated_aggregate(
+        _decode_aggregate(
+            stored_aggregates, _RANK_STANDINGS, rank_history.RankStandings.from_json
+        ),
+        rank_history.RankStandings.build,
+        operation,
+        match_result,
+        version,
+        write_matches,
+    )
+    # The sessions the write changed are appended to the rank history before the standings they follow on from
+    # are stored. If either doesn't make it, the next write finds the standings missing or out of date and
+    # records every session again.
+    if not rank_standings.update or _append_alongside_log(
+        _rank_history_file_name(guild), rank_standings.update.to_line()
+    ):
+        updated_aggregates[_RANK_STANDINGS] = rank_standings
+    _store_aggregates(
+        guild,
+        {name: aggregate.to_json() for name, aggregate in updated_aggregates.items()},
+    )
+
+
+def _updated_aggregate(
+    previous_aggregate: T_aggregate | None,
+    build: _AggregateBuilder[T_aggregate],
+    operation: str,
+    match_result: dataclasses.MatchResult,
+    version: str,
+    write_matches: _WriteMatches,
+) -> T_aggregate:
+    """
+    Bring an aggregate of the log, such as the materialized tally, up to date with a write to the log.
+
+    A new result only touches the aggregate for the players in it, without needing the other matches. A replacement
+    re-aggregates the players involved, and a missing or out of date aggregate is rebuilt from every match.
+    """
+    if previous_aggregate and previous_aggregate.log_version != write_matches.results_file.version:
+        previous_aggregate = None
+
+    if previous_aggregate and operation == encoding.ADD_OPERATION:
+        return previous_aggregate.added(match_result, version)
+
+    if previous_aggregate is None:
+        return build(write_matches.get_after(), version)
+
+    try:
+        old_match_result = write_matches.get_before().match_by_id(str(match_result.result_id))
+    except dataclasses.MatchNotFound:
+        # The replacement doesn't match anything, so nothing has changed
+        return previous_aggregate.with_log_version(version)
+    return previous_aggregate.replaced(old_match_result, write_matches.get_after(), version)
+
+
+def _read_aggregates(guild: core_dataclasses.Guild) -> dict[str, str]:
+    """
+    Read every stored aggregate of the guild's log, as the JSON it was stored as.
+
+    Each aggregate is on a line of its own after its name, so only the aggregates that are needed get decoded.
     """
-    all_results = get_all_match_results(guild)
+    try:
+        contents = base.read_file(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_aggregates_file_name(guild),
+        )
+    except base.FileMissing:
+        return {}
+    return dict(line.split("\t", 1) for line in contents.splitlines() if line)
+
 
-    modified_results = all_results.replace(match_result)
+def _decode_aggregate(
+    stored_aggregates: dict[str, str], name: str, from_json: typing.Callable[[str], T_stored]
+) -> T_stored | None:
+    contents = stored_aggregates.get(name)
+    return from_json(contents) if contents is not None else None
 
-    match_results_as_dicts = convert_match_results_to_dicts(modified_results)
+
+def _read_aggregate(
+    guild: core_dataclasses.Guild, name: str, from_json: typing.Callable[[str], T_stored]
+) -> T_stored | None:
+    return _decode_aggregate(_read_aggregates(guild), name, from_json)
+
+
+def _store_aggregates(guild: core_dataclasses.Guild, stored_aggregates: dict[str, str]) -> None:
     base.store_file(
         file_path=settings_base.settings.MATCH_RESULTS_PATH,
-        file_name=_results_file_name(guild),
-        contents=json.dumps(match_results_as_dicts),
+        file_name=_aggregates_file_name(guild),
+        contents="".join(f"{name}\t{contents}\n" for name, contents in stored_aggregates.items()),
+    )
+
+
+def get_all_time_tally(
+    guild: core_dataclasses.Guild,
+) -> dict[core_dataclasses.User, tally.MatchesTallyData]:
+    """
+    Get every player's all-time tally, from the materialized tally if it's up to date with the log.
+
+    If it isn't, the tally is rebuilt from the cached match results, or from the log read as a `MatchTable`.
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return {}
+
+    materialized_tally = _read_materialized_tally(guild)
+    if materialized_tally and materialized_tally.log_version == version:
+        return materialized_tally.tally_by_player
+
+    cached = _results_cache.get(_results_cache_key(guild))
+    if cached and cached.version == version and cached.matches is not None:
+        return tally.build_tally_data_by_player(cached.matches)
+    # Otherwise the log is read straight into columns and tallied from them, without building every match result
+    return tally.build_tally_data_by_player(get_match_table(guild))
+
+
+def get_pair_matrix(guild: core_dataclasses.Guild) -> pairs.PairMatrix:
+    """
+    Get every player's record against each of their opponents, from the stored matrix if it's up to date with the log
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return pairs.PairMatrix(log_version="", tally_by_pair={})
+
+    pair_matrix = _read_pair_matrix(guild)
+    if pair_matrix and pair_matrix.log_version == version:
+        return pair_matrix
+    return pairs.PairMatrix.build(get_all_match_results(guild), version)
+
+
+def get_form_table(guild: core_dataclasses.Guild) -> form.FormTable:
+    """
+    Get the recent form of every player and pair, from the stored table if it's up to date with the log
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return form.FormTable(log_version="", form_by_player={}, form_by_pair={})
+
+    form_table = _read_form_table(guild)
+    if form_table and form_table.log_version == version:
+        return form_table
+    return form.FormTable.build(get_all_match_results(guild), version)
+
+
+def get_rating_table(guild: core_dataclasses.Guild) -> ratings.RatingTable:
+    """
+    Get every player's rating, from the stored ratings if they're up to date with the log
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return ratings.RatingTable(log_version="", position=0, rating_by_player={})
+
+    rating_table = _read_rating_table(guild)
+    if rating_table and rating_table.log_version == version:
+        return rating_table
+    return ratings.RatingTable.build(get_all_match_results(guild), version)
+
+
+def rebuild_rating_table(guild: core_dataclasses.Guild) -> ratings.RatingTable:
+    """
+    Rate every one of the guild's matches from scratch and store the ratings, e.g. after changing how they're worked
+    out.
+
+    A replacement record can change any earlier match, so the whole log is decoded and folded before the matches are
+    rated. They aren't cached though, so rebuilding many guilds' ratings in turn only holds one guild's matches at a
+    time.
+    """
+    results_file = _read_results_file(guild)
+    rating_table = ratings.RatingTable.build(
+        encoding.decode_log(results_file.contents).fold(), results_file.version
+    )
+    stored_aggregates = _read_aggregates(guild)
+    stored_aggregates[_RATINGS] = rating_table.to_json()
+    _store_aggregates(guild, stored_aggregates)
+    return rating_table
+
+
+def get_rank_history(guild: core_dataclasses.Guild) -> rank_history.RankHistory:
+    """
+    Get every player's league position over time, from the stored history if it's up to date with the log
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return rank_history.RankHistory(log_version="", ranks_by_player={})
+
+    history = _read_rank_history(guild)
+    if history and history.log_version == version:
+        return history
+    return rank_history.RankHistory.build(get_all_match_results(guild), version)
+
+
+def get_leaderboards(guild: core_dataclasses.Guild) -> leaderboards.Leaderboards:
+    """
+    Get every player ranked by each stat, from the stored leaderboards if they're up to date with the log
+    """
+    try:
+        version = base.file_version(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_results_file_name(guild),
+        )
+    except base.FileMissing:
+        return leaderboards.Leaderboards.build({}, log_version="")
+
+    stored_leaderboards = _read_leaderboards(guild)
+    # A stat that's been added since the leaderboards were stored is missing from them until the next write
+    if (
+        stored_leaderboards
+        and stored_leaderboards.log_version == version
+        and stored_leaderboards.has_every_stat()
+    ):
+        return stored_leaderboards
+    return leaderboards.Leaderboards.build(get_all_time_tally(guild), version)
+
+
+def get_tally_index(guild: core_dataclasses.Guild) -> tally.TallyIndex:
+    """
+    Get the tally index over the guild's match results, reusing it while the results haven't changed
+    """
+    matches = get_all_match_results(guild)
+    cache_key = _results_cache_key(guild)
+    tally_index = _tally_index_cache.get(cache_key)
+    if tally_index is None or tally_index.matches is not matches:
+        tally_index = _tally_index_cache[cache_key] = tally.TallyIndex.build(matches)
+    return tally_index
+
+
+def get_badge_checkpoints(
+    guild: core_dataclasses.Guild,
+) -> tuple[checkpoints.CheckpointLog, str]:
+    """
+    Get the guild's badge checkpoints, along with the version of the file they were read from
+    """
+    return _read_checkpoint_log(_badge_checkpoints_file_name(guild))
+
+
+def store_badge_checkpoints(
+    guild: core_dataclasses.Guild, checkpoint_log: checkpoints.CheckpointLog, if_version: str
+) -> bool:
+    """
+    Store the guild's badge checkpoints, as long as they haven't changed since they were read.
+
+    Returns `False` if they had changed, in which case the stored checkpoints are left as they are.
+    """
+    try:
+        base.store_file(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_badge_checkpoints_file_name(guild),
+            contents=checkpoint_log.to_json(),
+            if_version=if_version,
+        )
+    except base.VersionConflict:
+        return False
+    return True
+
+
+def get_badge_sessions(guild: core_dataclasses.Guild) -> checkpoints.SessionLog:
+    """
+    Get the latest snapshot of the badges collected in each of the guild's sessions
+    """
+    try:
+        contents = base.read_file(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_session_badges_file_name(guild),
+        )
+    except base.FileMissing:
+        return checkpoints.SessionLog()
+    return checkpoints.SessionLog.from_lines(contents)
+
+
+def append_badge_sessions(
+    guild: core_dataclasses.Guild, sessions: list[checkpoints.SessionCheckpoint]
+) -> bool:
+    """
+    Append snapshots of the badges collected in some of the guild's sessions, superseding any earlier ones.
+
+    Returns `False` if the append kept conflicting with other writers', in which case nothing is appended.
+    """
+    if not sessions:
+        return True
+    appended = _append_alongside_log(
+        _session_badges_file_name(guild),
+        "".join(checkpoints.session_line(session) for session in sessions),
+    )
+    return appended is not None
+
+
+def _read_checkpoint_log(file_name: str) -> tuple[checkpoints.CheckpointLog, str]:
+    checkpoints_file = base.read_file_with_version(
+        file_path=settings_base.settings.MATCH_RESULTS_PATH,
+        file_name=file_name,
+        create_if_missing=True,
     )
+    if not checkpoints_file.contents:
+        return checkpoints.CheckpointLog(), checkpoints_file.version
+    return checkpoints.CheckpointLog.from_json(checkpoints_file.contents), checkpoints_file.version
+
+
+def _invalidate_checkpoints(guild: core_dataclasses.Guild, position: int) -> None:
+    """
+    Drop every checkpoint that covers the match at `position`.
+
+    The write is conditional, so an update that built a checkpoint from the matches before the edit can't store it
+    over the top of this. Session snapshots are dropped by appending the edited position to their log.
+    """
+    for file_name in _checkpoint_file_names(guild):
+
+        def _invalidate(file_name: str = file_name) -> None:
+            checkpoint_log, version = _read_checkpoint_log(file_name)
+            invalidated_log = checkpoint_log.invalidated_from(position)
+            if invalidated_log == checkpoint_log:
+                return
+            base.store_file(
+                file_path=settings_base.settings.MATCH_RESULTS_PATH,
+                file_name=file_name,
+                contents=invalidated_log.to_json(),
+                if_version=version,
+            )
+
+        base.retry_on_conflict(_invalidate)
+
+    for file_name in _session_log_file_names(guild):
+        if not _append_alongside_log(file_name, checkpoints.invalidation_line(position)):
+            logger.error(f"Sessions from position {position} in {file_name} may be out of date")
+
+
+def _read_materialized_tally(guild: core_dataclasses.Guild) -> tally.MaterializedTally | None:
+    return _read_aggregate(guild, _TALLY, tally.MaterializedTally.from_json)
+
+
+def _read_pair_matrix(guild: core_dataclasses.Guild) -> pairs.PairMatrix | None:
+    return _read_aggregate(guild, _PAIR_MATRIX, pairs.PairMatrix.from_json)
+
+
+def _read_form_table(guild: core_dataclasses.Guild) -> form.FormTable | None:
+    return _read_aggregate(guild, _FORM, form.FormTable.from_json)
+
+
+def _read_rating_table(guild: core_dataclasses.Guild) -> ratings.RatingTable | None:
+    return _read_aggregate(guild, _RATINGS, ratings.RatingTable.from_json)
+
+
+def _read_rank_history(guild: core_dataclasses.Guild) -> rank_history.RankHistory | None:
+    try:
+        contents = base.read_file(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_rank_history_file_name(guild),
+        )
+    except base.FileMissing:
+        return None
+    return rank_history.RankHistory.from_lines(contents)
+
+
+def _read_leaderboards(guild: core_dataclasses.Guild) -> leaderboards.Leaderboards | None:
+    return _read_aggregate(guild, _LEADERBOARDS, leaderboards.Leaderboards.from_json)
+
+
+def _read_record_index(guild: core_dataclasses.Guild) -> encoding.RecordIndex | None:
+    try:
+        contents = base.read_file(
+            file_path=settings_base.settings.MATCH_RESULTS_PATH,
+            file_name=_record_index_file_name(guild),
+        )
+    except base.FileMissing:
+        return None
+
+    batches: list[encoding.IndexBatch] = []
+    size_bytes = number_users = 0
+    for batch in encoding.read_index_batches(contents):
+        if batch.start > size_bytes:
+            # A writer didn't get as far as indexing its records, so we index them from the log
+            records = base.read_file_range(
+                file_path=settings_base.settings.MATCH_RESULTS_PATH,
+                file_name=_results_file_name(guild),
+                start=size_bytes,
+                length=batch.start - size_bytes,
+            )
+            gap_batch = encoding.index_batch(
+                records, start=size_bytes, log_version=None, first_user=number_users
+            )
+            batches.append(gap_batch)
+            number_users += len(gap_batch.users)
+        batches.append(batch)
+        size_bytes = batch.end
+        number_users += len(batch.users)
+    return encoding.RecordIndex.fold(batches)
+
+
+def _store_record_index(guild: core_dataclasses.Guild, index_batch: encoding.IndexBatch) -> None:
+    base.store_file(
+        file_path=settings_base.settings.MATCH_RESULTS_PATH,
+        file_name=_record_index_file_name(guild),
+        contents=index_batch.to_line(),
+    )
+
+
+def _results_cache_key(guild: core_dataclasses.Guild) -> tuple[str, str]:
+    return (str(settings_base.settings.MATCH_RESULTS_PATH), _results_file_name(guild))
 
 
 def _results_file_name(guild: core_dataclasses.Guild) -> str:
     return f"{guild.guild_id}/{settings_base.settings.MATCH_RESULTS_FILE}"
+
+
+def _record_index_file_name(guild: core_dataclasses.Guild) -> str:
+    return f"{guild.guild_id}/{settings_base.settings.MATCH_RESULTS_INDEX_FILE}"
+
+
+def _aggregates_file_name(guild: core_dataclasses.Guild) -> str:
+    return f"{guild.guild_id}/{settings_base.settings.AGGREGATES_FILE}"
+
+
+def _rank_history_file_name(guild: core_dataclasses.Guild) -> str:
+    return f"{guild.guild_id}/{settings_base.settings.RANK_HISTORY_FILE}"
+
+
+def _badge_checkpoints_file_name(guild: core_dataclasses.Guild) -> str:
+    return f"{guild.guild_id}/{settings_base.settings.BADGE_CHECKPOINTS_FILE}"
+
+
+def _session_badges_file_name(guild: core_dataclasses.Guild) -> str:
+    return f"{guild.guild_id}/{settings_base.settings.SESSION_BADGES_FILE}"
+
+
+def _checkpoint_file_names(guild: core_dataclasses.Guild) -> list[str]:
+    return [_badge_checkpoints_file_name(guild)]
+
+
+def _session_log_file_names(guild: core_dataclasses.Guild) -> list[str]:
+    return [_session_badges_file_name(guild)]
@@ -0,0 +1,515 @@
+import bisect
+import collections
+import datetime
+import itertools
+import json
+import operator
+import typing
+from decimal import Decimal
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, match_table
+
+T_tally_by_player = dict[core_dataclasses.User, "MatchesTallyData"]
+
+# Below this many matches, tallying a `MatchTable` a row at a time is quicker than tallying it by column. Tables are
+# tallied when the all-time tally is rebuilt from the log, in `storage.get_all_time_tally`. See
+# `tests/benchmarks/tally.py` for the benchmark this comes from.
+COLUMNAR_TALLY_MIN_MATCHES = 50
+
+
+@attrs.define
+class MatchesTallyData:
+    number_matches: int = 0
+    wins: int = 0
+    total_score: int = 0
+    point_difference: int = 0
+    matches_served: int = 0
+    wins_served: int = 0
+    matches_received: int = 0
+    wins_received: int = 0
+    highest_win_streak: int = 0
+    highest_loss_streak: int = 0
+    last_win_datetime: datetime.datetime | None = None
+
+    current_win_streak: int = 0
+    current_loss_streak: int = 0
+
+    @property
+    def losses(self) -> int:
+        return self.number_matches - self.wins
+
+    @property
+    def losses_served(self) -> int:
+        return self.matches_served - self.wins_served
+
+    @property
+    def losses_received(self) -> int:
+        return self.matches_received - self.wins_received
+
+    @property
+    def win_rate(self) -> int:
+        return int((self.wins / self.number_matches) * 100)
+
+    @property
+    def win_rate_serving(self) -> int | None:
+        if not self.matches_served:
+            return None
+        return int((self.wins_served / self.matches_served) * 100)
+
+    @property
+    def average_score(self) -> int:
+        return self.total_score // self.number_matches
+
+    @property
+    def average_point_difference(self) -> Decimal:
+        return Decimal(self.point_difference / self.number_matches).quantize(Decimal("0.01"))
+
+    @property
+    def average_point_difference_str(self) -> str:
+        return f"{self.average_point_difference:+}"
+
+    @property
+    def last_win_days_ago(self) -> int | None:
+        if self.last_win_datetime:
+            return (datetime.date.today() - self.last_win_datetime.date()).days
+        return None
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        data = attrs.asdict(self)
+        if self.last_win_datetime:
+            data["last_win_datetime"] = self.last_win_datetime.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, typing.Any]) -> "MatchesTallyData":
+        last_win_datetime = data.get("last_win_datetime")
+        return cls(
+            **{
+                **data,
+                "last_win_datetime": (
+                    datetime.datetime.fromisoformat(last_win_datetime)
+                    if last_win_datetime
+                    else None
+                ),
+            }
+        )
+
+    def record_win(self, match: dataclasses.MatchResult) -> None:
+        self.record_win_scores(
+            score=match.winner_score,
+            opponent_score=match.loser_score,
+            served=match.served == match.winner,
+        )
+        self.last_win_datetime = match.played_at
+
+    def record_loss(self, match: dataclasses.MatchResult) -> None:
+        self.record_loss_scores(
+            score=match.loser_score,
+            opponent_score=match.winner_score,
+            served=match.served == match.loser,
+        )
+
+    def record_win_scores(self, score: int, opponent_score: int, served: bool) -> None:
+        """
+        Record a win from its scores alone, leaving `last_win_datetime` to the caller.
+        """
+        self.number_matches += 1
+        self.total_score += score
+        self.point_difference += score - opponent_score
+        self.wins += 1
+
+        self.matches_served += int(served)
+        self.wins_served += int(served)
+        self.matches_received += int(not served)
+        self.wins_received += int(not served)
+
+        self.current_win_streak += 1
+        self.current_loss_streak = 0
+        self.highest_win_streak = max(self.highest_win_streak, self.current_win_streak)
+
+    def record_loss_scores(self, score: int, opponent_score: int, served: bool) -> None:
+        self.number_matches += 1
+        self.total_score += score
+        self.point_difference += score - opponent_score
+
+        self.matches_served += int(served)
+        self.matches_received += int(not served)
+
+        self.current_loss_streak += 1
+        self.current_win_streak = 0
+        self.highest_loss_streak = max(self.highest_loss_streak, self.current_loss_streak)
+
+
+def build_tally_data_by_player(
+    matches: dataclasses.Matches | match_table.MatchTable,
+) -> dict[core_dataclasses.User, MatchesTallyData]:
+    if isinstance(matches, match_table.MatchTable):
+        if len(matches) >= COLUMNAR_TALLY_MIN_MATCHES:
+            return _build_tally_data_by_player_by_column(matches)
+        return _build_tally_data_by_player_from_table(matches)
+
+    player_tally: dict[core_dataclasses.User, MatchesTallyData] = collections.defaultdict(
+        MatchesTallyData
+    )
+    for match in matches.match_results:
+        player_tally[match.winner].record_win(match)
+        player_tally[match.loser].record_loss(match)
+
+    return player_tally
+
+
+def _build_tally_data_by_player_from_table(
+    table: match_table.MatchTable,
+) -> dict[core_dataclasses.User, MatchesTallyData]:
+    """
+    Tally a `MatchTable` straight from its columns, without building any `MatchResult` objects.
+    """
+    # Resolve each user index to its player's tally up front, so that users who have changed their name share one
+    tally_by_user: dict[core_dataclasses.User, MatchesTallyData] = {}
+    tally_by_index = [tally_by_user.setdefault(user, MatchesTallyData()) for user in table.users]
+
+    # Players are keyed in the order they first appear, as they would be when tallying `Matches`
+    player_tally: dict[core_dataclasses.User, MatchesTallyData] = collections.defaultdict(
+        MatchesTallyData
+    )
+    last_win_positions: dict[core_dataclasses.User, int] = {}
+    for position, (winner, loser, server, winner_score, loser_score) in enumerate(
+        zip(table.winners, table.losers, table.servers, table.winner_scores, table.loser_scores)
+    ):
+        winner_tally = tally_by_index[winner]
+        loser_tally = tally_by_index[loser]
+        player_tally.setdefault(table.users[winner], winner_tally)
+        player_tally.setdefault(table.users[loser], loser_tally)
+
+        winner_tally.record_win_scores(winner_score, loser_score, served=server == winner)
+        loser_tally.record_loss_scores(loser_score, winner_score, served=server == loser)
+        last_win_positions[table.users[winner]] = position
+
+    for player, last_win_position in last_win_positions.items():
+        player_tally[player].last_win_datetime = match_table.from_epoch_microseconds(
+            table.played_at[last_win_position]
+        )
+
+    return player_tally
+
+
+def _build_tally_data_by_player_by_column(table: match_table.MatchTable) -> T_tally_by_player:
+    """
+    Tally a `MatchTable` a column at a time, into plain lists indexed by player code rather than through the
+    methods of `MatchesTallyData`.
+
+    Counts are taken with `Counter` over the code columns. Scores and streaks need a pass over the rows, which keeps
+    each player's streak as a signed run length: positive for a run of wins and negative for a run of losses.
+    """
+    # Give each player a code, so that users who have changed their name share one
+    codes: dict[core_dataclasses.User, int] = {}
+    user_codes = [codes.setdefault(user, len(codes)) for user in table.users]
+    if user_codes == list(range(len(user_codes))):
+        winners: typing.Sequence[int] = table.winners
+        losers: typing.Sequence[int] = table.losers
+    else:
+        winners = list(map(user_codes.__getitem__, table.winners))
+        losers = list(map(user_codes.__getitem__, table.losers))
+
+    winner_served = list(map(operator.eq, table.servers, table.winners))
+    wins = collections.Counter(winners)
+    losses = collections.Counter(losers)
+    wins_served = collections.Counter(itertools.compress(winners, winner_served))
+    losses_served = collections.Counter(
+        itertools.compress(losers, map(operator.not_, winner_served))
+    )
+    last_win_positions = dict(zip(winners, range(len(table))))
+
+    total_scores = [0] * len(codes)
+    point_differences = [0] * len(codes)
+    streaks = [0] * len(codes)
+    highest_win_streaks = [0] * len(codes)
+    highest_loss_streaks = [0] * len(codes)
+    for winner, loser, winner_score, loser_score in zip(
+        winners, losers, table.winner_scores, table.loser_scores
+    ):
+        total_scores[winner] += winner_score
+        total_scores[loser] += loser_score
+        point_difference = winner_score - loser_score
+        point_differences[winner] += point_difference
+        point_differences[loser] -= point_difference
+
+        streak = streaks[winner] + 1 if streaks[winner] > 0 else 1
+        streaks[winner] = streak
+        if streak > highest_win_streaks[winner]:
+            highest_win_streaks[winner] = streak
+        streak = streaks[loser] - 1 if streaks[loser] < 0 else -1
+        streaks[loser] = streak
+        if -streak > highest_loss_streaks[loser]:
+            highest_loss_streaks[loser] = -streak
+
+    # Players are keyed in the order they first appear, as they would be when tallying `Matches`
+    player_tally: T_tally_by_player = {}
+    for user_index in dict.fromkeys(
+        itertools.chain.from_iterable(zip(table.winners, table.losers))
+    ):
+        player = table.users[user_index]
+        if player in player_tally:
+            continue
+
+        code = user_codes[user_index]
+        number_matches = wins[code] + losses[code]
+        matches_served = wins_served[code] + losses_served[code]
+        last_win_position = last_win_positions.get(code)
+        player_tally[player] = MatchesTallyData(
+            number_matches=number_matches,
+            wins=wins[code],
+            total_score=total_scores[code],
+            point_difference=point_differences[code],
+            matches_served=matches_served,
+            wins_served=wins_served[code],
+            matches_received=number_matches - matches_served,
+            wins_received=wins[code] - wins_served[code],
+            highest_win_streak=highest_win_streaks[code],
+            highest_loss_streak=highest_loss_streaks[code],
+            last_win_datetime=(
+                match_table.from_epoch_microseconds(table.played_at[last_win_position])
+                if last_win_position is not None
+                else None
+            ),
+            current_win_streak=max(streaks[code], 0),
+            current_loss_streak=max(-streaks[code], 0),
+        )
+    return player_tally
+
+
+def tally_player(
+    player: core_dataclasses.User, matches: dataclasses.Matches
+) -> "MatchesTallyData":
+    """
+    Tally a single player's matches, in the order they were played.
+    """
+    player_tally = MatchesTallyData()
+    for match in matches.involves(player).match_results:
+        if match.winner == player:
+            player_tally.record_win(match)
+        if match.loser == player:
+            player_tally.record_loss(match)
+    return player_tally
+
+
+@attrs.frozen
+class MaterializedTally:
+    """
+    The all-time tally of every player as of a version of a guild's results log.
+
+    It's kept up to date as results are stored, so the all-time tally can be read without replaying every match.
+    Players are kept in the order they first appear in the log, as `build_tally_data_by_player` orders them.
+    """
+
+    log_version: str
+    tally_by_player: T_tally_by_player
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches, log_version: str) -> "MaterializedTally":
+        return cls(log_version=log_version, tally_by_player=build_tally_data_by_player(matches))
+
+    def with_log_version(self, log_version: str) -> "MaterializedTally":
+        return attrs.evolve(self, log_version=log_version)
+
+    def added(
+        self, match_result: dataclasses.MatchResult, log_version: str
+    ) -> "MaterializedTally":
+        """
+        Build the tally after a match result was appended to the log.
+
+        Only the two players' tallies are copied, the rest are shared with this tally.
+        """
+        tally_by_player = dict(self.tally_by_player)
+        winner_tally = attrs.evolve(tally_by_player.get(match_result.winner, MatchesTallyData()))
+        tally_by_player[match_result.winner] = winner_tally
+        winner_tally.record_win(match_result)
+
+        loser_tally = attrs.evolve(tally_by_player.get(match_result.loser, MatchesTallyData()))
+        tally_by_player[match_result.loser] = loser_tally
+        loser_tally.record_loss(match_result)
+        return MaterializedTally(log_version=log_version, tally_by_player=tally_by_player)
+
+    def replaced(
+        self,
+        old_match_result: dataclasses.MatchResult,
+        new_matches: dataclasses.Matches,
+        log_version: str,
+    ) -> "MaterializedTally":
+        """
+        Build the tally after a match result was replaced, given the matches with the replacement in place.
+
+        Streaks depend on the order of a player's matches, so the players in the match are re-tallied from their own
+        matches, in place. If the replacement changes who played, every player is re-tallied to keep them in order.
+        """
+        new_match_result = new_matches.match_by_id(str(old_match_result.result_id))
+        players = {old_match_result.winner, old_match_result.loser}
+        if players != {new_match_result.winner, new_match_result.loser}:
+            return MaterializedTally(
+                log_version=log_version, tally_by_player=build_tally_data_by_player(new_matches)
+            )
+
+        tally_by_player = dict(self.tally_by_player)
+        for player in players:
+            tally_by_player[player] = tally_player(player, new_matches)
+
+        # Players who first played each other are keyed winner first, so swapping the result swaps their order
+        if new_match_result.winner != old_match_result.winner and all(
+            new_matches.involves(player).match_results[0].result_id == old_match_result.result_id
+            for player in players
+        ):
+            swapped = {
+                old_match_result.winner: old_match_result.loser,
+                old_match_result.loser: old_match_result.winner,
+            }
+            tally_by_player = {
+                swapped.get(player, player): tally_by_player[swapped.get(player, player)]
+                for player in tally_by_player
+            }
+        return MaterializedTally(log_version=log_version, tally_by_player=tally_by_player)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "v": self.log_version,
+                "players": [
+                    {"player": player.to_dict(), "tally": player_tally.to_dict()}
+                    for player, player_tally in self.tally_by_player.items()
+                ],
+            },
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, contents: str) -> "MaterializedTally":
+        data = json.loads(contents)
+        return cls(
+            log_version=data["v"],
+            tally_by_player={
+                core_dataclasses.User.from_dict(entry["player"]): MatchesTallyData.from_dict(
+                    entry["tally"]
+                )
+                for entry in data["players"]
+            },
+        )
+
+
+# The fields of `MatchesTallyData` that are sums over matches, and so can be tallied over a window by subtraction
+_ADDITIVE_FIELDS = (
+    "number_matches",
+    "wins",
+    "total_score",
+    "point_difference",
+    "matches_served",
+    "wins_served",
+    "matches_received",
+    "wins_received",
+)
+
+
+@attrs.frozen
+class _PlayerPrefixSums:
+    """
+    A player's running tally after each of their matches.
+
+    `sums[field][k]` is the total of the field over the player's first `k` matches, so it has one more entry than
+    there are matches. `last_wins[k]` is the index of the player's latest win among their first `k + 1` matches.
+    """
+
+    positions: list[int]
+    days: list[int]
+    played_at: list[datetime.datetime]
+    sums: dict[str, list[int]]
+    last_wins: list[int | None]
+
+    def window(self, lo: int, hi: int) -> MatchesTallyData:
+        last_win = self.last_wins[hi - 1]
+        return MatchesTallyData(
+            **{field: sums[hi] - sums[lo] for field, sums in self.sums.items()},
+            last_win_datetime=(
+                self.played_at[last_win] if last_win is not None and last_win >= lo else None
+            ),
+        )
+
+
+@attrs.frozen
+class TallyIndex:
+    """
+    Cumulative tallies for each player, for tallying the matches in any date window without replaying them.
+
+    A window is found by bisecting each player's match days and subtracting their running totals at either end, so
+    it takes O(players · log n) rather than a pass over every match. Streaks depend on the order of the matches
+    within the window rather than summing over it, so window tallies leave them at zero.
+
+    This relies on the matches being in the order they were played. If they're not, windows are tallied by
+    replaying the matches in them instead.
+    """
+
+    matches: dataclasses.Matches
+    in_order: bool
+    players: dict[core_dataclasses.User, _PlayerPrefixSums]
+
+    @classmethod
+    def build(cls, matches: dataclasses.Matches) -> "TallyIndex":
+        running: dict[core_dataclasses.User, MatchesTallyData] = {}
+        players: dict[core_dataclasses.User, _PlayerPrefixSums] = {}
+        in_order = True
+
+        for position, match in enumerate(matches.match_results):
+            day = match.played_at.toordinal()
+            for player, won in ((match.winner, True), (match.loser, False)):
+                if player not in players:
+                    running[player] = MatchesTallyData()
+                    players[player] = _PlayerPrefixSums(
+                        positions=[],
+                        days=[],
+                        played_at=[],
+                        sums={field: [0] for field in _ADDITIVE_FIELDS},
+                        last_wins=[],
+                    )
+                player_tally = running[player]
+                prefix_sums = players[player]
+
+                if prefix_sums.days and prefix_sums.days[-1] > day:
+                    in_order = False
+                if won:
+                    player_tally.record_win(match)
+                else:
+                    player_tally.record_loss(match)
+
+                previous_last_win = prefix_sums.last_wins[-1] if prefix_sums.last_wins else None
+                prefix_sums.last_wins.append(len(prefix_sums.days) if won else previous_last_win)
+                prefix_sums.positions.append(position)
+                prefix_sums.days.append(day)
+                prefix_sums.played_at.append(match.played_at)
+                for field in _ADDITIVE_FIELDS:
+                    prefix_sums.sums[field].append(getattr(player_tally, field))
+
+        return cls(matches=matches, in_order=in_order, players=players)
+
+    def window(
+        self, start: datetime.date | None = None, end: datetime.date | None = None
+    ) -> T_tally_by_player:
+        """
+        Tally the matches played from `start` to `end` inclusive, where either end of the window can be left open.
+
+        Players are ordered by their first match in the window, as `build_tally_data_by_player` orders them.
+        """
+        if not self.in_order:
+            return build_tally_data_by_player(self.matches.between(start, end))
+
+        start_day = start.toordinal() if start else None
+        end_day = end.toordinal() if end else None
+        windows: list[tuple[int, core_dataclasses.User, MatchesTallyData]] = []
+        for player, prefix_sums in self.players.items():
+            days = prefix_sums.days
+            lo = bisect.bisect_left(days, start_day) if start_day is not None else 0
+            hi = bisect.bisect_right(days, end_day) if end_day is not None else len(days)
+            if lo < hi:
+                windows.append((prefix_sums.positions[lo], player, prefix_sums.window(lo, hi)))
+
+        windows.sort(key=lambda window: window[0])
+        return {player: player_tally for _, player, player_tally in windows}
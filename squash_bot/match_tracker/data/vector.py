@@ -0,0 +1,203 @@
+import collections.abc
+import itertools
+import typing
+
+T = typing.TypeVar("T")
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+
+# Trie nodes are tuples of child nodes, or of items at the leaves
+T_node = tuple[typing.Any, ...]
+
+
+class Vector(typing.Sequence[T]):
+    """
+    An immutable sequence that shares structure between versions of itself.
+
+    Items are stored in a trie of tuples with up to 32 children per node, along with a tail of up to 32 items that
+    haven't been pushed into the trie yet. `append` and `set` return a new vector that copies at most one path
+    through the trie, so they take effectively constant time however long the vector is, and leave the original
+    vector as it was.
+
+    Slices are views onto the same trie. Appending to a view that stops short of the end of the trie copies it.
+    """
+
+    __slots__ = ("_count", "_shift", "_root", "_tail", "_start", "_stop")
+
+    def __init__(self, items: typing.Iterable[T] = ()) -> None:
+        count, shift = 0, _BITS
+        root: T_node = ()
+        tail: T_node = ()
+        items = list(items)
+        for chunk_start in range(0, len(items), _WIDTH):
+            if tail:
+                # The previous chunk was full, so it moves into the trie
+                shift, root = _push_tail(count, shift, root, tail)
+            tail = tuple(items[chunk_start : chunk_start + _WIDTH])
+            count += len(tail)
+        self._set_state(count, shift, root, tail, 0, count)
+
+    def _set_state(
+        self, count: int, shift: int, root: T_node, tail: T_node, start: int, stop: int
+    ) -> None:
+        # `count`, `shift`, `root` and `tail` describe the whole trie, and `start` and `stop` the part of it in view
+        self._count = count
+        self._shift = shift
+        self._root = root
+        self._tail = tail
+        self._start = start
+        self._stop = stop
+
+    def _derive(
+        self, count: int, shift: int, root: T_node, tail: T_node, start: int, stop: int
+    ) -> "Vector[T]":
+        vector: Vector[T] = Vector.__new__(Vector)
+        vector._set_state(count, shift, root, tail, start, stop)
+        return vector
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    @typing.overload
+    def __getitem__(self, index: int) -> T: ...
+
+    @typing.overload
+    def __getitem__(self, index: slice) -> "Vector[T]": ...
+
+    def __getitem__(self, index: int | slice) -> "T | Vector[T]":
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return Vector(list(self)[index])
+            return self._derive(
+                self._count,
+                self._shift,
+                self._root,
+                self._tail,
+                self._start + start,
+                self._start + max(start, stop),
+            )
+
+        position = self._position(index)
+        return self._leaf(position)[position & _MASK]
+
+    def __iter__(self) -> typing.Iterator[T]:
+        position = self._start
+        while position < self._stop:
+            offset = position & _MASK
+            items = self._leaf(position)[offset : offset + self._stop - position]
+            yield from items
+            position += len(items)
+
+    def __reversed__(self) -> typing.Iterator[T]:
+        for index in range(len(self) - 1, -1, -1):
+            yield self[index]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, collections.abc.Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"Vector({list(self)!r})"
+
+    def append(self, item: T) -> "Vector[T]":
+        if self._stop != self._count:
+            return Vector(itertools.chain(self, (item,)))
+
+        count = self._count
+        if count - _tail_offset(count) < _WIDTH:
+            return self._derive(
+                count + 1,
+                self._shift,
+                self._root,
+                self._tail + (item,),
+                self._start,
+                self._stop + 1,
+            )
+
+        shift, root = _push_tail(count, self._shift, self._root, self._tail)
+        return self._derive(count + 1, shift, root, (item,), self._start, self._stop + 1)
+
+    def extend(self, items: typing.Iterable[T]) -> "Vector[T]":
+        vector = self
+        for item in items:
+            vector = vector.append(item)
+        return vector
+
+    def set(self, index: int, item: T) -> "Vector[T]":
+        position = self._position(index)
+        if position >= _tail_offset(self._count):
+            tail = _replace_at(self._tail, position & _MASK, item)
+            return self._derive(
+                self._count, self._shift, self._root, tail, self._start, self._stop
+            )
+
+        root = _assoc(self._shift, self._root, position, item)
+        return self._derive(self._count, self._shift, root, self._tail, self._start, self._stop)
+
+    def _position(self, index: int) -> int:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Vector index out of range")
+        return self._start + index
+
+    def _leaf(self, position: int) -> T_node:
+        if position >= _tail_offset(self._count):
+            return self._tail
+        node = self._root
+        for level in range(self._shift, 0, -_BITS):
+            node = node[(position >> level) & _MASK]
+        return node
+
+
+def _tail_offset(count: int) -> int:
+    # The position of the first item in the tail, which is always a multiple of the node width
+    if count < _WIDTH:
+        return 0
+    return ((count - 1) >> _BITS) << _BITS
+
+
+def _push_tail(count: int, shift: int, root: T_node, tail: T_node) -> tuple[int, T_node]:
+    """
+    Move a full tail into the trie, growing the trie by a level if the root is full.
+    """
+    if (count >> _BITS) > (1 << shift):
+        return shift + _BITS, (root, _new_path(shift, tail))
+    return shift, _push_tail_at(count, shift, root, tail)
+
+
+def _push_tail_at(count: int, level: int, parent: T_node, tail: T_node) -> T_node:
+    child_index = ((count - 1) >> level) & _MASK
+    if level == _BITS:
+        child = tail
+    elif child_index < len(parent):
+        child = _push_tail_at(count, level - _BITS, parent[child_index], tail)
+    else:
+        child = _new_path(level - _BITS, tail)
+
+    if child_index < len(parent):
+        return _replace_at(parent, child_index, child)
+    return parent + (child,)
+
+
+def _new_path(level: int, node: T_node) -> T_node:
+    if level == 0:
+        return node
+    return (_new_path(level - _BITS, node),)
+
+
+def _assoc(level: int, node: T_node, position: int, item: typing.Any) -> T_node:
+    if level == 0:
+        return _replace_at(node, position & _MASK, item)
+    child_index = (position >> level) & _MASK
+    return _replace_at(node, child_index, _assoc(level - _BITS, node[child_index], position, item))
+
+
+def _replace_at(node: T_node, index: int, value: typing.Any) -> T_node:
+    return node[:index] + (value,) + node[index + 1 :]
@@ -5,9 +5,16 @@ from squash_bot.match_tracker.data import dataclasses
 
 
 class Filterer(abc.ABC):
+    @classmethod
+    def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
+        return cls.plan(matches.query(), **kwargs).execute()
+
     @classmethod
     @abc.abstractmethod
-    def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches: ...
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
+        """
+        Add the filter's steps to the query without running it.
+        """
 
 
 class NoopFilterer(Filterer):
@@ -15,40 +22,50 @@ class NoopFilterer(Filterer):
     def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
         return matches
 
+    @classmethod
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
+        return query
+
 
 class LastN(Filterer):
     @classmethod
-    def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
         n = 15
-        return matches.last(n)
+        return query.last(n)
 
 
 class OptionalFromDateFilterer(Filterer):
     @classmethod
-    def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
         if from_date_string := kwargs.get("include-matches-from"):
             from_date = datetime.date.fromisoformat(from_date_string)
-            matches = matches.from_date(from_date)
-        return matches
+            query = query.from_date(from_date)
+        return query
 
 
 class LastSessionOrDate(Filterer):
     """
     Filter matches for a specific date or all the matches from the last day of play.
+
+    The last day of play is the day of the last match the query matches so far, so any steps planned before this
+    filter are taken into account.
     """
 
     @classmethod
-    def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
         if date_string := kwargs.get("date"):
             date = datetime.date.fromisoformat(date_string)
         else:
-            # This is going to be a problem if there are no matches, but I don't care right now
-            date = matches.match_results[-1].played_on
+            # Only the last match needs finding, which stops scanning as soon as it's found
+            last_match = query.last(1).execute()
+            if not last_match:
+                return query
+            date = last_match.match_results[0].played_on
 
-        return matches.on_date(date)
+        return query.on_date(date)
 
 
 class HeadToHead(Filterer):
     @classmethod
-    def filter(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
-        return matches.involves(kwargs["player-one"]).involves(kwargs["player-two"])
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
+        return query.involves(kwargs["player-one"]).involves(kwargs["player-two"])
@@ -1,5 +1,4 @@
 import abc
-import collections
 import itertools
 from decimal import Decimal
 
@@ -8,12 +7,23 @@ import tabulate
 
 from squash_bot.core.data import dataclasses as core_dataclasses
 from squash_bot.match_tracker import queries
-from squash_bot.match_tracker.badges import priority
 from squash_bot.match_tracker.badges import queries as badge_queries
-from squash_bot.match_tracker.data import dataclasses
+from squash_bot.match_tracker.data import (
+    dataclasses,
+    form,
+    leaderboards,
+    pairs,
+    rank_history,
+    ratings,
+    tally,
+)
 
 from . import filterers
 
+UP_ARROW_EMOJI = "🔼"
+PAUSE_EMOJI = " ⏸️ "
+DOWN_ARROW_EMOJI = "🔽"
+
 
 class Formatter(abc.ABC):
     @classmethod
@@ -83,77 +93,88 @@ class LeagueTableRow:
     wins: int
     losses: int
     win_percentage: int
+    rating: int | None = None
 
     def as_display_row(self) -> list[str]:
-        return [self.player.name, str(self.wins), str(self.losses), f"{self.win_percentage}%"]
+        display_row = [
+            self.player.name,
+            str(self.wins),
+            str(self.losses),
+            f"{self.win_percentage}%",
+        ]
+        if self.rating is not None:
+            display_row.append(str(self.rating))
+        return display_row
 
     @classmethod
-    def display_headers(cls) -> list[str]:
-        return ["Player", "Wins", "Losses", "Win %"]
+    def display_headers(cls, with_rating: bool = False) -> list[str]:
+        return ["Player", "Wins", "Losses", "Win %"] + (["Rating"] if with_rating else [])
 
 
 class LeagueTable(Formatter):
     @classmethod
     def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
-        player_results: dict[core_dataclasses.User, dict] = collections.defaultdict(dict)
-        for match in matches.match_results:
-            player_results[match.winner]["wins"] = player_results[match.winner].get("wins", 0) + 1
-            player_results[match.loser]["losses"] = (
-                player_results[match.loser].get("losses", 0) + 1
-            )
+        return cls.format_tally(tally.build_tally_data_by_player(matches))
 
-        player_rows = []
-        for player, results in player_results.items():
-            wins = results.get("wins", 0)
-            losses = results.get("losses", 0)
-            total_games = wins + losses
-            win_percentage = int((wins / total_games) * 100)
-
-            player_rows.append(
-                LeagueTableRow(
-                    player=player, wins=wins, losses=losses, win_percentage=win_percentage
-                )
+    @classmethod
+    def format_tally(
+        cls,
+        tally_by_player: dict[core_dataclasses.User, tally.MatchesTallyData],
+        rating_table: ratings.RatingTable | None = None,
+    ) -> str:
+        """
+        Format the tally as a league table, ordered by win percentage, or by rating if a rating table is given.
+        """
+        player_rows = [
+            LeagueTableRow(
+                player=player,
+                wins=tally.wins,
+                losses=tally.losses,
+                win_percentage=tally.win_rate,
+                rating=rating_table.rating_of(player).display_rating if rating_table else None,
             )
+            for player, tally in tally_by_player.items()
+        ]
 
-        # Sort by descending win percentage
-        player_rows = sorted(player_rows, key=lambda row: row.win_percentage, reverse=True)
+        # Sort by descending rating or win percentage
+        player_rows = sorted(
+            player_rows,
+            key=lambda row: row.rating if row.rating is not None else row.win_percentage,
+            reverse=True,
+        )
 
         player_rows_display = [row.as_display_row() for row in player_rows]
         inner_message = tabulate.tabulate(
-            player_rows_display, LeagueTableRow.display_headers(), tablefmt="rounded_grid"
+            player_rows_display,
+            LeagueTableRow.display_headers(with_rating=rating_table is not None),
+            tablefmt="rounded_grid",
         )
 
         return f"```{inner_message}```"
 
 
 class HeadToHead(Formatter):
-    RECENT_MATCHES = 5
-    UP_ARROW_EMOJI = "🔼"
-    PAUSE_EMOJI = " ⏸️ "
-    DOWN_ARROW_EMOJI = "🔽"
+    RECENT_MATCHES = form.RECENT_MATCHES
 
     @classmethod
     def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
         player_one = kwargs["player-one"]
         player_two = kwargs["player-two"]
 
-        all_time_tally_data = queries.build_tally_data_by_player(matches)
-        player_one_all_time = all_time_tally_data[player_one]
-        player_two_all_time = all_time_tally_data[player_two]
+        guild = kwargs.get("guild")
+        player_one_all_time, player_two_all_time = cls._all_time_tallies(
+            matches, player_one, player_two, guild
+        )
 
         all_time_table_data = cls._all_time_table_data(player_one_all_time, player_two_all_time)
         table_data = all_time_table_data
 
         # If there are enough recent matches, display recent data
-        recent_matches = matches.last(cls.RECENT_MATCHES)
-        available_recent_matches = len(recent_matches)
-        if available_recent_matches >= cls.RECENT_MATCHES:
-            recent_tally_data = queries.build_tally_data_by_player(recent_matches)
-            player_one_recent = recent_tally_data[player_one]
-            player_two_recent = recent_tally_data[player_two]
+        if recent_tallies := cls._recent_tallies(matches, player_one, player_two, guild):
+            player_one_recent, player_two_recent = recent_tallies
 
             spacer = [["", "", ""]]
-            recent_matches_header = [[f"Last {available_recent_matches} matches", "", ""]]
+            recent_matches_header = [[f"Last {cls.RECENT_MATCHES} matches", "", ""]]
             recent_table_data = cls._recent_table_data(
                 player_one_recent, player_two_recent, player_one_all_time, player_two_all_time
             )
@@ -174,11 +195,57 @@ class HeadToHead(Formatter):
         )
         return f"```{table_string}```"
 
+    @classmethod
+    def _all_time_tallies(
+        cls,
+        matches: dataclasses.Matches,
+        player_one: core_dataclasses.User,
+        player_two: core_dataclasses.User,
+        guild: core_dataclasses.Guild | None,
+    ) -> tuple[tally.MatchesTallyData, tally.MatchesTallyData]:
+        if guild:
+            # The all-time stats are kept in the guild's pair matrix, so the matches don't need tallying
+            pair_matrix = queries.get_pair_matrix(guild)
+            player_one_all_time = pair_matrix.head_to_head(player_one, player_two)
+            player_two_all_time = pair_matrix.head_to_head(player_two, player_one)
+            if player_one_all_time and player_two_all_time:
+                return player_one_all_time, player_two_all_time
+
+        all_time_tally_data = tally.build_tally_data_by_player(matches)
+        return all_time_tally_data[player_one], all_time_tally_data[player_two]
+
+    @classmethod
+    def _recent_tallies(
+        cls,
+        matches: dataclasses.Matches,
+        player_one: core_dataclasses.User,
+        player_two: core_dataclasses.User,
+        guild: core_dataclasses.Guild | None,
+    ) -> tuple[tally.MatchesTallyData, tally.MatchesTallyData] | None:
+        """
+        Tally the players' recent matches against each other, or return `None` if they haven't played enough.
+        """
+        if guild:
+            # The recent matches are kept in the guild's form table, so they don't need tallying either
+            form_table = queries.get_form_table(guild)
+            player_one_form = form_table.form_by_pair.get((player_one, player_two))
+            player_two_form = form_table.form_by_pair.get((player_two, player_one))
+            if player_one_form and player_two_form:
+                if player_one_form.number_matches < cls.RECENT_MATCHES:
+                    return None
+                return player_one_form.as_tally(), player_two_form.as_tally()
+
+        recent_matches = matches.last(cls.RECENT_MATCHES)
+        if len(recent_matches) < cls.RECENT_MATCHES:
+            return None
+        recent_tally_data = tally.build_tally_data_by_player(recent_matches)
+        return recent_tally_data[player_one], recent_tally_data[player_two]
+
     @classmethod
     def _all_time_table_data(
         cls,
-        player_one_tally_data: queries.MatchesTallyData,
-        player_two_tally_data: queries.MatchesTallyData,
+        player_one_tally_data: tally.MatchesTallyData,
+        player_two_tally_data: tally.MatchesTallyData,
     ) -> list[list[str]]:
         player_one_win_rate_serving_str = cls._nullable_percentage_string(
             player_one_tally_data.win_rate_serving
@@ -238,13 +305,13 @@ class HeadToHead(Formatter):
     @classmethod
     def _recent_table_data(
         cls,
-        player_one_recent: queries.MatchesTallyData,
-        player_two_recent: queries.MatchesTallyData,
-        player_one_all_time: queries.MatchesTallyData,
-        player_two_all_time: queries.MatchesTallyData,
+        player_one_recent: tally.MatchesTallyData,
+        player_two_recent: tally.MatchesTallyData,
+        player_one_all_time: tally.MatchesTallyData,
+        player_two_all_time: tally.MatchesTallyData,
     ) -> list[list[str]]:
-        player_one_recent_win_rate_str = f"{cls._emoji(player_one_recent.win_rate, player_one_all_time.win_rate)} {player_one_recent.win_rate}%"
-        player_two_recent_win_rate_str = f"{player_two_recent.win_rate}% {cls._emoji(player_two_recent.win_rate, player_two_all_time.win_rate)}"
+        player_one_recent_win_rate_str = f"{_comparison_emoji(player_one_recent.win_rate, player_one_all_time.win_rate)} {player_one_recent.win_rate}%"
+        player_two_recent_win_rate_str = f"{player_two_recent.win_rate}% {_comparison_emoji(player_two_recent.win_rate, player_two_all_time.win_rate)}"
 
         player_one_win_rate_serving_str = cls._nullable_percentage_string(
             player_one_recent.win_rate_serving
@@ -253,11 +320,11 @@ class HeadToHead(Formatter):
             player_two_recent.win_rate_serving
         )
 
-        player_one_recent_win_rate_serving_str = f"{cls._emoji(player_one_recent.win_rate_serving, player_one_all_time.win_rate_serving)} {player_one_win_rate_serving_str}"
-        player_two_recent_win_rate_serving_str = f"{player_two_win_rate_serving_str} {cls._emoji(player_two_recent.win_rate_serving, player_two_all_time.win_rate_serving)}"
+        player_one_recent_win_rate_serving_str = f"{_comparison_emoji(player_one_recent.win_rate_serving, player_one_all_time.win_rate_serving)} {player_one_win_rate_serving_str}"
+        player_two_recent_win_rate_serving_str = f"{player_two_win_rate_serving_str} {_comparison_emoji(player_two_recent.win_rate_serving, player_two_all_time.win_rate_serving)}"
 
-        player_one_recent_avg_pt_diff_str = f"{cls._emoji(player_one_recent.average_point_difference, player_one_all_time.average_point_difference)} {player_one_recent.average_point_difference_str}"
-        player_two_recent_avg_pt_diff_str = f"{player_two_recent.average_point_difference_str} {cls._emoji(player_two_recent.average_point_difference, player_two_all_time.average_point_difference)}"
+        player_one_recent_avg_pt_diff_str = f"{_comparison_emoji(player_one_recent.average_point_difference, player_one_all_time.average_point_difference)} {player_one_recent.average_point_difference_str}"
+        player_two_recent_avg_pt_diff_str = f"{player_two_recent.average_point_difference_str} {_comparison_emoji(player_two_recent.average_point_difference, player_two_all_time.average_point_difference)}"
 
         return [
             [
@@ -277,17 +344,6 @@ class HeadToHead(Formatter):
             ],
         ]
 
-    @classmethod
-    def _emoji(cls, value_one: Decimal | int | None, value_two: Decimal | int | None) -> str:
-        if value_one is None or value_two is None:
-            return ""
-        elif value_one > value_two:
-            return cls.UP_ARROW_EMOJI
-        elif value_one == value_two:
-            return cls.PAUSE_EMOJI
-        else:
-            return cls.DOWN_ARROW_EMOJI
-
     @classmethod
     def _days_ago(cls, days: int | None) -> str:
         if days is None:
@@ -303,6 +359,161 @@ class HeadToHead(Formatter):
         return f"{value}%" if value is not None else "-"
 
 
+class Form(Formatter):
+    WIN = "W"
+    LOSS = "L"
+
+    @classmethod
+    def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
+        return cls.format_form_table(form.FormTable.build(matches, log_version=""))
+
+    @classmethod
+    def format_form_table(cls, form_table: form.FormTable) -> str:
+        rows = []
+        for player, recent_form in form_table.form_by_player.items():
+            recent_tally = recent_form.as_tally()
+            win_rate_serving = recent_tally.win_rate_serving
+            rows.append(
+                (
+                    recent_tally.win_rate,
+                    [
+                        player.name,
+                        " ".join(cls.WIN if won else cls.LOSS for won, *_ in recent_form.results),
+                        f"{recent_tally.win_rate}%",
+                        f"{win_rate_serving}%" if win_rate_serving is not None else "-",
+                        recent_tally.average_point_difference_str,
+                    ],
+                )
+            )
+
+        # Sort by descending win percentage over the recent matches
+        rows = sorted(rows, key=lambda row: row[0], reverse=True)
+        inner_message = tabulate.tabulate(
+            [display_row for _, display_row in rows],
+            ["Player", "Form", "Win %", "Win % (serving)", "Avg. point diff."],
+            tablefmt="rounded_grid",
+        )
+        return f"```{inner_message}```"
+
+
+class Leaderboard(Formatter):
+    TOP = 10
+
+    @classmethod
+    def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
+        stat_name = kwargs["stat"]
+        matches_leaderboards = leaderboards.Leaderboards.build(
+            tally.build_tally_data_by_player(matches), log_version=""
+        )
+        return cls.format_entries(stat_name, matches_leaderboards.top(stat_name, cls.TOP))
+
+    @classmethod
+    def format_entries(
+        cls, stat_name: str, entries: list[tuple[core_dataclasses.User, str]]
+    ) -> str:
+        stat = leaderboards.STATS_BY_NAME[stat_name]
+        inner_message = tabulate.tabulate(
+            [
+                [str(position), player.name, value]
+                for position, (player, value) in enumerate(entries, start=1)
+            ],
+            ["#", "Player", stat.label],
+            tablefmt="rounded_grid",
+            # Show each stat as it's declared, rather than letting tabulate reformat numbers
+            disable_numparse=True,
+        )
+        return f"```{inner_message}```"
+
+
+class Ratings(Formatter):
+    @classmethod
+    def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
+        return cls.format_rating_table(ratings.RatingTable.build(matches, log_version=""))
+
+    @classmethod
+    def format_rating_table(cls, rating_table: ratings.RatingTable) -> str:
+        inner_message = tabulate.tabulate(
+            [
+                [player.name, str(player_rating.display_rating), str(player_rating.number_matches)]
+                for player, player_rating in rating_table.ranked()
+            ],
+            ["Player", "Rating", "Matches"],
+            tablefmt="rounded_grid",
+        )
+        return f"```{inner_message}```"
+
+
+class RankHistory(Formatter):
+    SESSIONS = 10
+
+    @classmethod
+    def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
+        return cls.format_rank_history(
+            rank_history.RankHistory.build(matches, log_version=""), kwargs["player"]
+        )
+
+    @classmethod
+    def format_rank_history(
+        cls, history: rank_history.RankHistory, player: core_dataclasses.User
+    ) -> str:
+        ranks = history.ranks_of(player)
+        rows = []
+        # Include the session before the ones shown, so the first one shown has a change in position
+        previous_position = None
+        for session_date, position in ranks[-(cls.SESSIONS + 1) :]:
+            rows.append(
+                [
+                    session_date.strftime("%a %-d %b %Y"),
+                    str(position),
+                    _comparison_emoji(previous_position, position),
+                ]
+            )
+            previous_position = position
+
+        inner_message = tabulate.tabulate(
+            rows[-cls.SESSIONS :], ["Session", "Position", ""], tablefmt="rounded_grid"
+        )
+        return f"{player.name}'s league position after each session:\n```{inner_message}```"
+
+
+class Rivalries(Formatter):
+    TOP_RIVALRIES = 5
+
+    @classmethod
+    def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
+        return cls.format_pair_matrix(pairs.PairMatrix.build(matches, log_version=""))
+
+    @classmethod
+    def format_pair_matrix(cls, pair_matrix: pairs.PairMatrix) -> str:
+        nemesis_rows = []
+        for player, nemesis in pair_matrix.nemeses().items():
+            pair_tally = pair_matrix.tally_by_pair[(player, nemesis)]
+            nemesis_rows.append(
+                [player.name, nemesis.name, f"{pair_tally.wins}-{pair_tally.losses}"]
+            )
+        nemeses_table = tabulate.tabulate(
+            sorted(nemesis_rows), ["Player", "Nemesis", "Record"], tablefmt="rounded_grid"
+        )
+
+        rivalry_rows = []
+        for player, opponent in pair_matrix.rivalries()[: cls.TOP_RIVALRIES]:
+            pair_tally = pair_matrix.tally_by_pair[(player, opponent)]
+            last_played_at = pair_matrix.last_played_at(player, opponent)
+            rivalry_rows.append(
+                [
+                    f"{player.name} v {opponent.name}",
+                    str(pair_tally.number_matches),
+                    f"{pair_tally.wins}-{pair_tally.losses}",
+                    last_played_at.strftime("%-d %b %Y") if last_played_at else "-",
+                ]
+            )
+        rivalries_table = tabulate.tabulate(
+            rivalry_rows, ["Rivalry", "Matches", "Record", "Last played"], tablefmt="rounded_grid"
+        )
+
+        return f"```{nemeses_table}```\n```{rivalries_table}```"
+
+
 class SessionSummary(Formatter):
     @classmethod
     def format_matches(cls, matches: dataclasses.Matches, **kwargs) -> str:
@@ -311,7 +522,7 @@ class SessionSummary(Formatter):
         session_date = session_matches.match_results[0].played_on
         session_date_pretty = session_date.strftime("%A, %-d %B %Y")
 
-        tally_data = queries.build_tally_data_by_player(session_matches)
+        tally_data = tally.build_tally_data_by_player(session_matches)
         player_rows = []
         for player, data in tally_data.items():
             player_rows.append(
@@ -331,27 +542,35 @@ class SessionSummary(Formatter):
         )
 
         # Collect badges
-        badges = []
-        badges += badge_queries.collect_badges(matches, badge_queries.default_all_time_badges)
-        badges += badge_queries.collect_badges(
-            session_matches, badge_queries.default_session_badges
-        )
-        badges = badge_queries.filter_badges_by_session(
-            badges, session_matches.match_results[-1].played_on
-        )
+        if guild := kwargs.get("guild"):
+            badges = badge_queries.get_badge_index(guild, matches).for_session(session_date)
+        else:
+            badges = badge_queries.collect_badges_for_session(
+                matches,
+                session_date,
+                all_time_badges=badge_queries.default_all_time_badges,
+                session_badges=badge_queries.default_session_badges,
+            )
+            badges = badge_queries.filter_badges_by_session(badges, session_date)
 
-        # Sort by priority and only show the top 5
-        badges_in_priority_order = sorted(
-            badges, key=lambda badge: priority.get_priority(badge), reverse=True
+        # Only show the top 5 badges by priority
+        badges_text = "\n".join(
+            badge.display for badge in badge_queries.rank_badges(badges, limit=5)
         )
-        badges_to_show = badge_queries.deduplicate_badges(badges_in_priority_order)
-        sorted_badges_to_show = sorted(
-            badges_to_show, key=lambda badge: priority.get_priority(badge), reverse=True
-        )[:5]
-        badges_text = "\n".join(badge.display for badge in sorted_badges_to_show)
 
         return f"Session: {session_date_pretty}```{table_str}```\n{badges_text}"
 
 
 def _match_string(match: dataclasses.MatchResult) -> str:
     return f"{match.served.name}\t{match.server_score} - {match.receiver_score}\t{match.receiver.name}"
+
+
+def _comparison_emoji(value_one: Decimal | int | None, value_two: Decimal | int | None) -> str:
+    if value_one is None or value_two is None:
+        return ""
+    elif value_one > value_two:
+        return UP_ARROW_EMOJI
+    elif value_one == value_two:
+        return PAUSE_EMOJI
+    else:
+        return DOWN_ARROW_EMOJI
@@ -4,9 +4,16 @@ from squash_bot.match_tracker.data import dataclasses
 
 
 class Orderer(abc.ABC):
+    @classmethod
+    def order(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
+        return cls.plan(matches.query(), **kwargs).execute()
+
     @classmethod
     @abc.abstractmethod
-    def order(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches: ...
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
+        """
+        Add the ordering to the query without running it.
+        """
 
 
 class NoopOrderer(Orderer):
@@ -14,21 +21,25 @@ class NoopOrderer(Orderer):
     def order(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
         return matches
 
+    @classmethod
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
+        return query
+
 
 class PlayedAt(Orderer):
     @classmethod
-    def order(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
-        return matches.sort_by("played_at")
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
+        return query.sort_by("played_at")
 
 
 class OptionalByMatchesField(Orderer):
     @classmethod
-    def order(cls, matches: dataclasses.Matches, **kwargs) -> dataclasses.Matches:
+    def plan(cls, query: dataclasses.MatchesQuery, **kwargs) -> dataclasses.MatchesQuery:
         field = kwargs.get("field")
         if not field:
-            return matches
+            return query
 
         try:
-            return matches.sort_by(field)
+            return query.sort_by(field)
         except dataclasses.FieldDoesNotExist:
-            return matches
+            return query
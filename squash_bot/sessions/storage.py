@@ -7,21 +7,11 @@ from squash_bot.sessions import dataclasses
 
 
 def all_sessions_data_as_list(guild: core_dataclasses.Guild) -> list:
-    file_contents = storage_base.read_file(
-        file_path=settings_base.settings.SESSIONS_PATH,
-        file_name=_sessions_file_name(guild),
-        create_if_missing=True,
-    )
-    return json.loads(file_contents or "[]")
+    return _parse_sessions_file(_read_sessions_file(guild).contents)
 
 
 def all_sessions(guild: core_dataclasses.Guild) -> dataclasses.Sessions:
-    return dataclasses.Sessions(
-        [
-            dataclasses.Session.from_dict(session)
-            for session in all_sessions_data_as_list(guild=guild)
-        ]
-    )
+    return _sessions_from_list(all_sessions_data_as_list(guild=guild))
 
 
 def convert_sessions_to_dicts(sessions: dataclasses.Sessions) -> list[dict]:
@@ -31,11 +21,38 @@ def convert_sessions_to_dicts(sessions: dataclasses.Sessions) -> list[dict]:
 def store_session(session: dataclasses.Session, guild: core_dataclasses.Guild) -> None:
     """
     Get the current sessions, add the new sessions, and store the updated list
+
+    The write is conditional on the sessions file not having changed since it was read, and is retried if it has.
     """
-    storage_base.store_file(
+
+    def _store() -> None:
+        sessions_file = _read_sessions_file(guild)
+        sessions = _sessions_from_list(_parse_sessions_file(sessions_file.contents))
+        storage_base.store_file(
+            file_path=settings_base.settings.SESSIONS_PATH,
+            file_name=_sessions_file_name(guild),
+            contents=json.dumps(convert_sessions_to_dicts(sessions.add(session))),
+            if_version=sessions_file.version,
+        )
+
+    storage_base.retry_on_conflict(_store)
+
+
+def _read_sessions_file(guild: core_dataclasses.Guild) -> storage_base.VersionedFile:
+    return storage_base.read_file_with_version(
         file_path=settings_base.settings.SESSIONS_PATH,
         file_name=_sessions_file_name(guild),
-        contents=json.dumps(convert_sessions_to_dicts(all_sessions(guild).add(session))),
+        create_if_missing=True,
+    )
+
+
+def _parse_sessions_file(file_contents: str) -> list:
+    return json.loads(file_contents or "[]")
+
+
+def _sessions_from_list(sessions_data: list) -> dataclasses.Sessions:
+    return dataclasses.Sessions(
+        [dataclasses.Session.from_dict(session) for session in sessions_data]
     )
 
 
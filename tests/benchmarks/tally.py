@@ -0,0 +1,83 @@
+"""
+Compare tallying a `MatchTable` a row at a time with tallying it by column, to find where the columnar path
+(`tally.COLUMNAR_TALLY_MIN_MATCHES`) starts to pay off.
+
+Then compare the two ways the all-time tally can be rebuilt from a log: decoding it into `Matches` and tallying a
+row at a time, or decoding it into a `MatchTable` and tallying that, as `storage.get_all_time_tally` does.
+
+Run with `python -m tests.benchmarks.tally`.
+"""
+
+import datetime
+import random
+import timeit
+
+from squash_bot.match_tracker.data import dataclasses, encoding, match_table, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+MATCH_COUNTS = (10, 25, 50, 100, 200, 500, 1_000, 10_000, 50_000)
+NUMBER_PLAYERS = 12
+
+
+def _build_table(number_matches: int) -> match_table.MatchTable:
+    players = [core_factories.UserFactory() for _ in range(NUMBER_PLAYERS)]
+    match_results = []
+    for position in range(number_matches):
+        winner, loser = random.sample(players, 2)
+        match_results.append(
+            match_tracker_factories.MatchResultFactory(
+                winner=winner,
+                loser=loser,
+                served=random.choice([winner, loser]),
+                logged_by=winner,
+                loser_score=random.randint(0, 9),
+                played_at=datetime.datetime(2020, 1, 1) + datetime.timedelta(hours=position),
+            )
+        )
+    return match_table.MatchTable.from_matches(dataclasses.Matches(match_results=match_results))
+
+
+def _time_per_call(function, table: match_table.MatchTable) -> float:
+    number = max(1, 20_000 // len(table))
+    return min(timeit.repeat(lambda: function(table), number=number, repeat=5)) / number
+
+
+def _time_per_log(function, contents: str, number_matches: int) -> float:
+    number = max(1, 20_000 // number_matches)
+    return min(timeit.repeat(lambda: function(contents), number=number, repeat=5)) / number
+
+
+def _tally_log_as_matches(contents: str) -> tally.T_tally_by_player:
+    return tally.build_tally_data_by_player(encoding.decode_log(contents).fold())
+
+
+def _tally_log_as_table(contents: str) -> tally.T_tally_by_player:
+    return tally.build_tally_data_by_player(encoding.decode_match_table(contents))
+
+
+def main() -> None:
+    print(f"{'matches':>8} {'by row':>10} {'by column':>10} {'speed-up':>9}")  # noqa: T201
+    for number_matches in MATCH_COUNTS:
+        table = _build_table(number_matches)
+        by_row = _time_per_call(tally._build_tally_data_by_player_from_table, table)
+        by_column = _time_per_call(tally._build_tally_data_by_player_by_column, table)
+        print(  # noqa: T201
+            f"{number_matches:>8} {by_row * 1e6:>8.0f}µs {by_column * 1e6:>8.0f}µs "
+            f"{by_row / by_column:>8.2f}x"
+        )
+
+    print(f"\n{'matches':>8} {'Matches':>10} {'MatchTable':>10} {'speed-up':>9}")  # noqa: T201
+    for number_matches in MATCH_COUNTS:
+        contents, _ = encoding.encode_log(_build_table(number_matches).to_matches())
+        as_matches = _time_per_log(_tally_log_as_matches, contents, number_matches)
+        as_table = _time_per_log(_tally_log_as_table, contents, number_matches)
+        print(  # noqa: T201
+            f"{number_matches:>8} {as_matches * 1e6:>8.0f}µs {as_table * 1e6:>8.0f}µs "
+            f"{as_matches / as_table:>8.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
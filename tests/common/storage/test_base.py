@@ -1,3 +1,9 @@
+import io
+from unittest import mock
+
+import pytest
+from botocore import stub
+
 from common.storage import base
 
 
@@ -11,3 +17,249 @@ class TestLocalStorage:
 
         # Read the file back
         assert (tmp_path / test_file_name).read_text() == test_contents
+
+    def test_local_storage_append(self, tmp_path):
+        test_file_name = "test_file"
+
+        # Appending to a missing file creates it
+        base.LocalStorage().append_file(tmp_path, test_file_name, "first\n")
+        base.LocalStorage().append_file(tmp_path, test_file_name, "second\n")
+
+        assert (tmp_path / test_file_name).read_text() == "first\nsecond\n"
+
+    def test_read_returns_stored_version(self, tmp_path):
+        storage = base.LocalStorage()
+        version = storage.store_file(tmp_path, "test_file", "test contents")
+
+        assert storage.read_file_with_version(tmp_path, "test_file") == base.VersionedFile(
+            contents="test contents", version=version
+        )
+
+    def test_conditional_store_with_current_version(self, tmp_path):
+        storage = base.LocalStorage()
+        version = storage.store_file(tmp_path, "test_file", "first")
+
+        new_version = storage.store_file(tmp_path, "test_file", "second", if_version=version)
+
+        assert new_version != version
+        assert (tmp_path / "test_file").read_text() == "second"
+
+    def test_conditional_store_with_stale_version(self, tmp_path):
+        storage = base.LocalStorage()
+        stale_version = storage.store_file(tmp_path, "test_file", "first")
+        storage.store_file(tmp_path, "test_file", "second")
+
+        with pytest.raises(base.VersionConflict):
+            storage.store_file(tmp_path, "test_file", "third", if_version=stale_version)
+
+        assert (tmp_path / "test_file").read_text() == "second"
+
+    def test_create_file_leaves_existing_file(self, tmp_path):
+        storage = base.LocalStorage()
+        version = storage.create_file(tmp_path, "test_file", "first")
+
+        with pytest.raises(base.VersionConflict):
+            storage.create_file(tmp_path, "test_file", "second")
+
+        assert storage.read_file_with_version(tmp_path, "test_file") == base.VersionedFile(
+            contents="first", version=version
+        )
+
+    def test_read_file_range(self, tmp_path):
+        storage = base.LocalStorage()
+        storage.store_file(tmp_path, "test_file", "first\nsécond\nthird\n")
+
+        # Offsets are in bytes, so the accented character counts twice
+        assert storage.read_file_range(tmp_path, "test_file", 6, 8) == "sécond\n"
+
+
+class TestS3Storage:
+    @pytest.fixture(autouse=True)
+    def _clear_read_cache(self):
+        base.s3_read_cache.clear()
+        yield
+        base.s3_read_cache.clear()
+
+    def test_revalidates_cached_file(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_response(
+                "get_object",
+                {"Body": io.BytesIO(b"test contents"), "ETag": '"v1"'},
+                {"Bucket": "bucket", "Key": "key"},
+            )
+            stubber.add_client_error(
+                "get_object",
+                service_error_code="304",
+                http_status_code=304,
+                expected_params={"Bucket": "bucket", "Key": "key", "IfNoneMatch": '"v1"'},
+            )
+
+            first_read = storage.read_file_with_version("bucket", "key")
+            second_read = storage.read_file_with_version("bucket", "key")
+
+        assert first_read == second_read == base.VersionedFile("test contents", '"v1"')
+        assert (base.s3_read_cache.hits, base.s3_read_cache.misses) == (1, 1)
+
+    def test_refetches_modified_file(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_response(
+                "get_object",
+                {"Body": io.BytesIO(b"old contents"), "ETag": '"v1"'},
+                {"Bucket": "bucket", "Key": "key"},
+            )
+            stubber.add_response(
+                "get_object",
+                {"Body": io.BytesIO(b"new contents"), "ETag": '"v2"'},
+                {"Bucket": "bucket", "Key": "key", "IfNoneMatch": '"v1"'},
+            )
+
+            storage.read_file_with_version("bucket", "key")
+            second_read = storage.read_file_with_version("bucket", "key")
+
+        assert second_read == base.VersionedFile("new contents", '"v2"')
+        assert base.s3_read_cache.get(("bucket", "key")) == second_read
+
+    def test_store_updates_cached_file(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_response(
+                "put_object",
+                {"ETag": '"v1"'},
+                {"Bucket": "bucket", "Key": "key", "Body": mock.ANY},
+            )
+
+            storage.store_file("bucket", "key", "test contents")
+
+        assert base.s3_read_cache.get(("bucket", "key")) == base.VersionedFile(
+            "test contents", '"v1"'
+        )
+
+    def test_conditional_store_with_stale_version(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_client_error(
+                "put_object",
+                service_error_code="PreconditionFailed",
+                http_status_code=412,
+                expected_params={
+                    "Bucket": "bucket",
+                    "Key": "key",
+                    "Body": mock.ANY,
+                    "IfMatch": '"v1"',
+                },
+            )
+
+            with pytest.raises(base.VersionConflict):
+                storage.store_file("bucket", "key", "test contents", if_version='"v1"')
+
+    def test_create_existing_file(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_client_error(
+                "put_object",
+                service_error_code="PreconditionFailed",
+                http_status_code=412,
+                expected_params={
+                    "Bucket": "bucket",
+                    "Key": "key",
+                    "Body": mock.ANY,
+                    "IfNoneMatch": "*",
+                },
+            )
+
+            with pytest.raises(base.VersionConflict):
+                storage.create_file("bucket", "key", "test contents")
+
+    def test_read_file_range(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_response(
+                "get_object",
+                {"Body": io.BytesIO(b"contents")},
+                {"Bucket": "bucket", "Key": "key", "Range": "bytes=5-12"},
+            )
+
+            assert storage.read_file_range("bucket", "key", 5, 8) == "contents"
+
+    def test_file_version(self):
+        storage = base.S3Storage()
+        with stub.Stubber(base.client) as stubber:
+            stubber.add_response(
+                "head_object", {"ETag": '"v1"'}, {"Bucket": "bucket", "Key": "key"}
+            )
+
+            assert storage.file_version("bucket", "key") == '"v1"'
+
+
+class TestReadCache:
+    def test_evicts_least_recently_used(self):
+        cache = base.ReadCache(max_bytes=10)
+        cache.put(("path", "a"), base.VersionedFile("aaaa", "1"), size_bytes=4)
+        cache.put(("path", "b"), base.VersionedFile("bbbb", "1"), size_bytes=4)
+
+        # Reading `a` makes `b` the least recently used entry
+        cache.get(("path", "a"))
+        cache.put(("path", "c"), base.VersionedFile("cccc", "1"), size_bytes=4)
+
+        assert cache.get(("path", "b")) is None
+        assert cache.get(("path", "a")) is not None
+        assert cache.get(("path", "c")) is not None
+        assert cache.size_bytes == 8
+
+    def test_does_not_cache_files_over_budget(self):
+        cache = base.ReadCache(max_bytes=2)
+        cache.put(("path", "a"), base.VersionedFile("aaaa", "1"), size_bytes=4)
+
+        assert len(cache) == 0
+
+
+class TestReadFileWithVersion:
+    def test_creates_missing_file(self, tmp_path):
+        with mock.patch.object(base, "get_storage_backend", return_value=base.LocalStorage()):
+            versioned_file = base.read_file_with_version(
+                tmp_path, "test_file", create_if_missing=True
+            )
+
+        assert versioned_file.contents == ""
+        assert (tmp_path / "test_file").read_text() == ""
+
+    def test_rereads_file_created_concurrently(self, tmp_path):
+        storage = base.LocalStorage()
+        create_file = storage.create_file
+
+        def create_file_concurrently(file_path, file_name, contents):
+            # Another writer creates the file and stores some data between our read and create
+            create_file(file_path, file_name, "stored")
+            return create_file(file_path, file_name, contents)
+
+        with (
+            mock.patch.object(base, "get_storage_backend", return_value=storage),
+            mock.patch.object(storage, "create_file", side_effect=create_file_concurrently),
+        ):
+            versioned_file = base.read_file_with_version(
+                tmp_path, "test_file", create_if_missing=True
+            )
+
+        assert versioned_file.contents == "stored"
+        assert (tmp_path / "test_file").read_text() == "stored"
+
+
+class TestRetryOnConflict:
+    def test_retries_until_success(self):
+        operation = mock.Mock(side_effect=[base.VersionConflict, base.VersionConflict, "done"])
+
+        with mock.patch.object(base.time, "sleep"):
+            assert base.retry_on_conflict(operation) == "done"
+
+        assert operation.call_count == 3
+
+    def test_gives_up_after_max_attempts(self):
+        operation = mock.Mock(side_effect=base.VersionConflict)
+
+        with mock.patch.object(base.time, "sleep"):
+            with pytest.raises(base.VersionConflict):
+                base.retry_on_conflict(operation, max_attempts=3)
+
+        assert operation.call_count == 3
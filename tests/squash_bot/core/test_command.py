@@ -139,6 +139,27 @@ class TestParseOptions:
             "required-option": "default-value"
         }
 
+    def test_throws_error_for_value_below_minimum(self):
+        class TestCommand(_command.Command):
+            name = "test-command"
+            description = "Test command"
+            options = (
+                _command.CommandOption(
+                    name="top",
+                    description="How many to show",
+                    type=core_constants.CommandOptionType.INTEGER,
+                    required=True,
+                    min_value=1,
+                ),
+            )
+
+        command = TestCommand()
+        assert command.parse_options({"data": {"options": [{"name": "top", "value": 1}]}}) == {
+            "top": 1
+        }
+        with pytest.raises(_command.CommandVerificationError, match="top must be at least 1"):
+            command.parse_options({"data": {"options": [{"name": "top", "value": -3}]}})
+
 
 class TestParseGuild:
     def test_guild(self):
@@ -0,0 +1,58 @@
+import pytest
+
+from squash_bot.match_tracker.badges import badge, badge_definitions
+from squash_bot.match_tracker.data import dataclasses
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+class TestPlanFeatures:
+    def test_features_are_planned_once_after_their_requirements(self):
+        feature_types = badge.plan_features(
+            [
+                badge_definitions.MostImprovedPlayerCollector,
+                badge_definitions.MVPCollector,
+                badge_definitions.WinStreakCollector,
+            ]
+        )
+
+        assert feature_types == [
+            badge.PlayerStates,
+            badge.RecordHistory,
+            badge.PointDifferences,
+        ]
+
+    def test_requirements_are_planned_when_not_declared(self):
+        class RecordHistoryCollector(badge.BadgeCollector):
+            features = (badge.RecordHistory,)
+
+        feature_types = badge.plan_features([RecordHistoryCollector])
+
+        assert feature_types == [badge.PlayerStates, badge.RecordHistory]
+
+    def test_no_features_for_collectors_that_need_none(self):
+        assert badge.plan_features([badge_definitions.CrushCollector]) == []
+
+
+class TestFeatures:
+    def test_to_dict_round_trip(self):
+        matches = match_tracker_factories.build_match_history_between(
+            core_factories.UserFactory(), core_factories.UserFactory()
+        )
+        feature_types = [badge.PlayerStates, badge.PointDifferences]
+        features = badge.Features.plan(feature_types)
+        for match in matches.match_results:
+            features.observe(match)
+
+        assert badge.Features.from_dict(feature_types, features.to_dict(), matches) == features
+
+    def test_from_dict_of_different_features(self):
+        features = badge.Features.plan([badge.PlayerStates, badge.PointDifferences])
+
+        with pytest.raises(ValueError):
+            badge.Features.from_dict(
+                [badge.PlayerStates, badge.RecordHistory],
+                features.to_dict(),
+                dataclasses.Matches([]),
+            )
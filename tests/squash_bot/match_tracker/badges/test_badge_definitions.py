@@ -1,3 +1,5 @@
+import random
+from collections import defaultdict
 from decimal import Decimal
 
 from squash_bot.match_tracker.badges import badge_definitions, queries
@@ -264,3 +266,58 @@ class TestMostImprovedPlayer:
         )
 
         assert len(returned_badges) == 0
+
+    def test_matches_win_rate_history(self):
+        players = [core_factories.UserFactory() for _ in range(4)]
+        match_results = []
+        for _ in range(200):
+            winner, loser = random.sample(players, 2)
+            match_results.append(
+                match_tracker_factories.MatchResultFactory(winner=winner, loser=loser)
+            )
+        matches = dataclasses.Matches(match_results)
+
+        # Work out the most improved player from each player's full history of rounded win rates
+        wins: dict = defaultdict(int)
+        num_matches: dict = defaultdict(int)
+        win_rates: dict = defaultdict(list)
+        for match in matches.match_results:
+            wins[match.winner] += 1
+            for player in (match.winner, match.loser):
+                num_matches[player] += 1
+                win_rates[player].append(
+                    (Decimal(wins[player]) / Decimal(num_matches[player])).quantize(
+                        Decimal("0.01")
+                    )
+                )
+        n = badge_definitions.MostImprovedPlayerCollector.n
+        win_rate_changes = {
+            player: player_win_rates[-1] - player_win_rates[-(n + 1)]
+            for player, player_win_rates in win_rates.items()
+        }
+        best_win_rate_increase = max(win_rate_changes.values())
+
+        returned_badges = queries.collect_badges(
+            matches=matches, badges=[badge_definitions.MostImprovedPlayer]
+        )
+
+        if best_win_rate_increase <= 0:
+            assert returned_badges == []
+            return
+        most_improved_player = next(
+            player
+            for player, win_rate_change in win_rate_changes.items()
+            if win_rate_change == best_win_rate_increase
+        )
+        assert returned_badges == [
+            badge_definitions.MostImprovedPlayer(
+                player=most_improved_player,
+                win_rate_increase=best_win_rate_increase,
+                over_n_games=n,
+                badge_earned_in=matches.match_results[-1],
+            )
+        ]
+
+    def test_win_rate_is_rounded_exactly(self):
+        # 1/40 is 0.025 exactly, but its nearest float is just above it
+        assert badge_definitions._win_rate(1, 40) == Decimal("0.02")
@@ -1,4 +1,11 @@
-from squash_bot.match_tracker.badges import badge_definitions, queries
+import datetime
+from unittest import mock
+
+import attrs
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.badges import badge_definitions, priority, queries
+from squash_bot.match_tracker.data import dataclasses, encoding, storage
 
 from tests.factories import core as core_factories
 from tests.factories import match_tracker as match_tracker_factories
@@ -42,3 +49,307 @@ class TestDeduplicateBadges:
                 player=ricky, streak_length=5, badge_earned_in=match_one, is_ongoing=False
             ),
         ]
+
+
+class TestRankBadges:
+    def test_keeps_highest_priority_duplicate(self):
+        ricky = core_factories.UserFactory(username="ricky")
+        steve = core_factories.UserFactory(username="steve")
+        match = match_tracker_factories.MatchResultFactory(winner=ricky, loser=steve)
+
+        short_streak = badge_definitions.WinStreak(
+            player=ricky, streak_length=3, badge_earned_in=match, is_ongoing=False
+        )
+        long_streak = badge_definitions.WinStreak(
+            player=ricky, streak_length=6, badge_earned_in=match, is_ongoing=False
+        )
+        crush = badge_definitions.Crush(player=ricky, opponent=steve, badge_earned_in=match)
+
+        ranked_badges = queries.rank_badges([short_streak, crush, long_streak], limit=5)
+
+        assert ranked_badges == [crush, long_streak]
+        assert ranked_badges[1].streak_length == 6
+
+    def test_matches_sorting_every_badge(self):
+        players = [core_factories.UserFactory(id=str(i)) for i in range(20)]
+        match = match_tracker_factories.MatchResultFactory(winner=players[0], loser=players[1])
+        badges = [
+            badge_definitions.WinStreak(
+                player=players[i % 20],
+                streak_length=3 + (i * 7) % 11,
+                badge_earned_in=match,
+                is_ongoing=False,
+            )
+            for i in range(200)
+        ] + [
+            badge_definitions.FirstWinAgainst(
+                player=players[i], opponent=players[19 - i], badge_earned_in=match
+            )
+            for i in range(3)
+        ]
+
+        in_priority_order = sorted(badges, key=priority.get_priority, reverse=True)
+        deduplicated = queries.deduplicate_badges(in_priority_order)
+        expected_badges = sorted(deduplicated, key=priority.get_priority, reverse=True)[:5]
+
+        ranked_badges = queries.rank_badges(badges, limit=5)
+
+        assert [priority.get_priority(badge) for badge in ranked_badges] == [
+            priority.get_priority(badge) for badge in expected_badges
+        ]
+        # Badges with the same priority can come out in either order, but never twice
+        assert len(set(ranked_badges)) == len(ranked_badges)
+
+
+class TestCollectBadgesForSession:
+    def test_matches_collecting_each_scope_separately(self):
+        ricky = core_factories.UserFactory(username="ricky")
+        steve = core_factories.UserFactory(username="steve")
+        karl = core_factories.UserFactory(username="karl")
+        first_day = datetime.datetime(2024, 1, 1, 18, 0)
+        session_day = datetime.datetime(2024, 1, 8, 18, 0)
+
+        # Karl wins three in a row before the session, then Steve breaks the streak and starts one of his own
+        matches = dataclasses.Matches(
+            [
+                match_tracker_factories.MatchResultFactory(
+                    winner=winner, loser=loser, loser_score=loser_score, played_at=played_at
+                )
+                for winner, loser, loser_score, played_at in [
+                    (karl, steve, 5, first_day),
+                    (karl, ricky, 7, first_day),
+                    (karl, steve, 9, first_day),
+                    (steve, karl, 0, session_day),
+                    (steve, ricky, 3, session_day),
+                    (steve, karl, 8, session_day),
+                ]
+            ]
+        )
+        session_matches = matches.on_date(session_day.date())
+
+        badges = queries.collect_badges_for_session(
+            matches,
+            session_day.date(),
+            all_time_badges=queries.default_all_time_badges,
+            session_badges=queries.default_session_badges,
+        )
+
+        expected_badges = queries.collect_badges(
+            matches, queries.default_all_time_badges
+        ) + queries.collect_badges(session_matches, queries.default_session_badges)
+        assert len(badges) == len(expected_badges)
+        assert set(badges) == set(expected_badges)
+        assert (
+            badge_definitions.StreakBreaker(
+                player=steve,
+                opponent=karl,
+                streak_length=3,
+                badge_earned_in=session_matches.match_results[0],
+            )
+            in badges
+        )
+        assert (
+            badge_definitions.CleanSweep(player=steve, badge_earned_in=matches.match_results[-1])
+            in badges
+        )
+
+
+class TestGetBadgeIndex:
+    def _session_badges(self, guild: core_dataclasses.Guild, session_date: datetime.date) -> list:
+        return queries.get_badge_index(guild, storage.get_all_match_results(guild)).for_session(
+            session_date
+        )
+
+    def _session_badges_without_index(
+        self, guild: core_dataclasses.Guild, session_date: datetime.date
+    ) -> list:
+        badges = queries.collect_badges_for_session(
+            storage.get_all_match_results(guild),
+            session_date,
+            all_time_badges=queries.default_all_time_badges,
+            session_badges=queries.default_session_badges,
+        )
+        return queries.filter_badges_by_session(badges, session_date)
+
+    def _store_matches(
+        self,
+        guild: core_dataclasses.Guild,
+        played_on: datetime.date,
+        n: int,
+        update: bool = True,
+    ):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        results = [(karl, steve), (karl, ricky), (karl, steve), (steve, karl), (ricky, steve)]
+        for position in range(n):
+            winner, loser = results[position % len(results)]
+            match_result = match_tracker_factories.MatchResultFactory(
+                winner=winner,
+                loser=loser,
+                loser_score=position % 10,
+                played_at=datetime.datetime.combine(played_on, datetime.time(18, position)),
+            )
+            appended = storage.store_match_result(match_result, guild)
+            if update:
+                queries.update_badge_index(
+                    guild, match_result, appended.previous_version, appended.version
+                )
+
+    def test_resumes_from_checkpoint(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        first_day, session_day = datetime.date(2024, 1, 1), datetime.date(2024, 1, 8)
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            self._store_matches(guild, first_day, 12)
+            first_day_badges = self._session_badges(guild, first_day)
+            checkpoint_log, _ = storage.get_badge_checkpoints(guild)
+            assert checkpoint_log.latest(12).position == 12
+
+            # Recorded without updating the badges, so they're replayed when they're read
+            self._store_matches(guild, session_day, 8, update=False)
+            with mock.patch.object(
+                queries._BadgePass,
+                "observe",
+                autospec=True,
+                side_effect=queries._BadgePass.observe,
+            ) as observe:
+                badges = self._session_badges(guild, session_day)
+
+            expected_badges = self._session_badges_without_index(guild, session_day)
+            expected_first_day_badges = self._session_badges_without_index(guild, first_day)
+            # Reading the badges doesn't store anything
+            assert storage.get_badge_checkpoints(guild)[0] == checkpoint_log
+
+        # Only the new matches are replayed for the all-time badges, along with the session's matches
+        assert observe.call_count == 8 + 8
+        assert sorted(map(str, badges)) == sorted(map(str, expected_badges))
+        assert sorted(map(str, first_day_badges)) == sorted(map(str, expected_first_day_badges))
+
+    def test_update_only_observes_new_match(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        first_day, session_day = datetime.date(2024, 1, 1), datetime.date(2024, 1, 8)
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            self._store_matches(guild, first_day, 6)
+            self._store_matches(guild, session_day, 5)
+            # As if the match was recorded by a container that hasn't read the log
+            storage._results_cache.clear()
+            with (
+                mock.patch.object(
+                    queries._BadgePass,
+                    "observe",
+                    autospec=True,
+                    side_effect=queries._BadgePass.observe,
+                ) as observe,
+                mock.patch.object(
+                    encoding, "decode_log", side_effect=encoding.decode_log
+                ) as decode_log,
+            ):
+                self._store_matches(guild, session_day, 1)
+
+            checkpoint_log, _ = storage.get_badge_checkpoints(guild)
+            with mock.patch.object(queries._BadgePass, "observe") as read_observe:
+                badges = self._session_badges(guild, session_day)
+            expected_badges = self._session_badges_without_index(guild, session_day)
+
+        # The new match is observed by the all-time badges and its session's badges, without decoding the log
+        assert observe.call_count == 2
+        decode_log.assert_not_called()
+        assert checkpoint_log.latest(12).position == 12
+        read_observe.assert_not_called()
+        assert sorted(map(str, badges)) == sorted(map(str, expected_badges))
+
+    def test_session_badges_conflict_leaves_checkpoint_behind(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        session_day = datetime.date(2024, 1, 8)
+        append_file = storage.base.append_file
+
+        def conflict_on_session_badges(file_path, file_name, contents, if_version=None):
+            if file_name == storage._session_badges_file_name(guild):
+                raise storage.base.VersionConflict(file_name)
+            return append_file(file_path, file_name, contents, if_version=if_version)
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            self._store_matches(guild, session_day, 5)
+            with (
+                mock.patch.object(
+                    storage.base, "append_file", side_effect=conflict_on_session_badges
+                ),
+                mock.patch.object(storage.base.time, "sleep"),
+            ):
+                self._store_matches(guild, session_day, 1)
+
+            checkpoint_log, _ = storage.get_badge_checkpoints(guild)
+            badges = self._session_badges(guild, session_day)
+            expected_badges = self._session_badges_without_index(guild, session_day)
+
+        # The checkpoint stays at the last match whose session badges were stored
+        assert checkpoint_log.latest(6).position == 5
+        assert sorted(map(str, badges)) == sorted(map(str, expected_badges))
+
+    def test_update_of_earlier_session_rebuilds(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        first_day, session_day = datetime.date(2024, 1, 1), datetime.date(2024, 1, 8)
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            self._store_matches(guild, session_day, 6)
+            self._store_matches(guild, first_day, 3)
+            with mock.patch.object(queries._BadgePass, "observe") as observe:
+                badges = self._session_badges(guild, first_day)
+            expected_badges = self._session_badges_without_index(guild, first_day)
+
+        observe.assert_not_called()
+        assert sorted(map(str, badges)) == sorted(map(str, expected_badges))
+
+    def test_edit_invalidates_checkpoint(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        session_day = datetime.date(2024, 1, 8)
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            self._store_matches(guild, session_day, 10)
+
+            # Turn Karl's third win into a loss, which ends his win streak early
+            edited_match = storage.get_all_match_results(guild).match_results[2]
+            storage.replace_match_result(
+                attrs.evolve(edited_match, winner=edited_match.loser, loser=edited_match.winner),
+                guild,
+            )
+            checkpoint_log, _ = storage.get_badge_checkpoints(guild)
+            session_log = storage.get_badge_sessions(guild)
+            badges = self._session_badges(guild, session_day)
+            expected_badges = self._session_badges_without_index(guild, session_day)
+
+            # The next match recorded brings the badges back up to date
+            self._store_matches(guild, session_day, 1)
+            with mock.patch.object(queries._BadgePass, "observe") as observe:
+                updated_badges = self._session_badges(guild, session_day)
+            expected_updated_badges = self._session_badges_without_index(guild, session_day)
+
+        assert checkpoint_log.latest(10) is None
+        assert session_log.get(session_day) is None
+        assert sorted(map(str, badges)) == sorted(map(str, expected_badges))
+        observe.assert_not_called()
+        assert sorted(map(str, updated_badges)) == sorted(map(str, expected_updated_badges))
+
+    def test_looks_up_badges_by_match_and_player(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        session_day = datetime.date(2024, 1, 8)
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            self._store_matches(guild, session_day, 10, update=False)
+            queries.rebuild_badge_index(guild)
+            matches = storage.get_all_match_results(guild)
+            # The index is read back from the checkpoint and session log rather than collected again
+            with mock.patch.object(queries._BadgePass, "observe") as observe:
+                badge_index = queries.get_badge_index(guild, matches)
+
+        observe.assert_not_called()
+        karl = core_factories.UserFactory(id="3", username="karl")
+        # Karl's first win against Steve, and the crush in the first match
+        assert sorted(
+            str(badge) for badge in badge_index.for_match(matches.match_results[0].result_id)
+        ) == [
+            "Crush: 💥 Karl crushed Steve 11-0 (2024-01-08)",
+            "FirstWinAgainst: 🎉 Karl won against Steve for the first time (2024-01-08)",
+        ]
+        assert all(badge.player == karl for badge in badge_index.for_player(karl))
+        assert {type(badge) for badge in badge_index.for_player(karl)} >= {
+            badge_definitions.FirstWinAgainst,
+            badge_definitions.WinStreak,
+        }
@@ -0,0 +1,90 @@
+import datetime
+
+from squash_bot.match_tracker.data import checkpoints
+
+
+def _checkpoint(position: int) -> checkpoints.Checkpoint:
+    return checkpoints.Checkpoint(position=position, state={"position": position})
+
+
+def _session(day: int, position: int) -> checkpoints.SessionCheckpoint:
+    return checkpoints.SessionCheckpoint(
+        session_date=datetime.date(2024, 1, day), position=position, state={"day": day}
+    )
+
+
+class TestCheckpointLog:
+    def test_latest(self):
+        checkpoint_log = checkpoints.CheckpointLog(
+            checkpoints=(_checkpoint(10), _checkpoint(100), _checkpoint(200))
+        )
+
+        assert checkpoint_log.latest(250) == _checkpoint(200)
+        assert checkpoint_log.latest(150) == _checkpoint(100)
+        assert checkpoint_log.latest(5) is None
+
+    def test_added_keeps_one_checkpoint_per_spacing(self):
+        spacing = checkpoints.CHECKPOINT_SPACING
+        checkpoint_log = checkpoints.CheckpointLog()
+        for position in (1, spacing - 1, spacing + 1, spacing + 2):
+            checkpoint_log = checkpoint_log.added(_checkpoint(position))
+
+        assert checkpoint_log.checkpoints == (_checkpoint(spacing - 1), _checkpoint(spacing + 2))
+
+    def test_added_keeps_at_most_max_checkpoints(self):
+        checkpoint_log = checkpoints.CheckpointLog()
+        for bucket in range(checkpoints.MAX_CHECKPOINTS + 3):
+            checkpoint_log = checkpoint_log.added(
+                _checkpoint(bucket * checkpoints.CHECKPOINT_SPACING)
+            )
+
+        assert len(checkpoint_log.checkpoints) == checkpoints.MAX_CHECKPOINTS
+        assert checkpoint_log.checkpoints[-1] == _checkpoint(
+            (checkpoints.MAX_CHECKPOINTS + 2) * checkpoints.CHECKPOINT_SPACING
+        )
+
+    def test_invalidated_from(self):
+        checkpoint_log = checkpoints.CheckpointLog(
+            checkpoints=(_checkpoint(10), _checkpoint(100), _checkpoint(200))
+        )
+
+        # The checkpoint at 100 covers matches 0 to 99, so an edit to match 100 leaves it be
+        assert checkpoint_log.invalidated_from(100).checkpoints == (
+            _checkpoint(10),
+            _checkpoint(100),
+        )
+        assert checkpoint_log.invalidated_from(99).checkpoints == (_checkpoint(10),)
+
+    def test_json_round_trip(self):
+        checkpoint_log = checkpoints.CheckpointLog(checkpoints=(_checkpoint(10), _checkpoint(100)))
+
+        assert checkpoints.CheckpointLog.from_json(checkpoint_log.to_json()) == checkpoint_log
+
+
+class TestSessionLog:
+    def test_later_snapshots_supersede_earlier_ones(self):
+        contents = "".join(
+            checkpoints.session_line(session)
+            for session in (_session(1, 2), _session(2, 4), _session(1, 5))
+        )
+
+        session_log = checkpoints.SessionLog.from_lines(contents)
+
+        assert session_log.sessions == {
+            datetime.date(2024, 1, 1): _session(1, 5),
+            datetime.date(2024, 1, 2): _session(2, 4),
+        }
+
+    def test_invalidation_drops_snapshots_that_cover_the_edit(self):
+        contents = (
+            checkpoints.session_line(_session(1, 2))
+            + checkpoints.session_line(_session(2, 4))
+            + checkpoints.invalidation_line(3)
+            + checkpoints.session_line(_session(3, 6))
+        )
+
+        session_log = checkpoints.SessionLog.from_lines(contents)
+
+        assert session_log.get(datetime.date(2024, 1, 1)) == _session(1, 2)
+        assert session_log.get(datetime.date(2024, 1, 2)) is None
+        assert session_log.get(datetime.date(2024, 1, 3)) == _session(3, 6)
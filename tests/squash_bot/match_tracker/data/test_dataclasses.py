@@ -1,8 +1,10 @@
 import datetime
 import uuid
 
+import pytest
+
 from squash_bot.core.data import dataclasses as core_dataclasses
-from squash_bot.match_tracker.data import dataclasses
+from squash_bot.match_tracker.data import dataclasses, vector
 
 from tests.factories import core as core_factories
 from tests.factories import match_tracker as match_tracker_factories
@@ -123,6 +125,83 @@ class TestMatches:
 
         assert matches_on_date == dataclasses.Matches([match_one])
 
+    def test_from_date(self):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 12, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 3, 12, 0)
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three])
+
+        assert matches.from_date(datetime.date(2021, 1, 2)) == dataclasses.Matches(
+            [match_two, match_three]
+        )
+        assert matches.from_date(datetime.date(2021, 1, 4)) == dataclasses.Matches([])
+
+    def test_between(self):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 9, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 18, 0)
+        )
+        match_four = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 5, 12, 0)
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three, match_four])
+
+        assert matches.between(
+            datetime.date(2021, 1, 2), datetime.date(2021, 1, 4)
+        ) == dataclasses.Matches([match_two, match_three])
+        assert matches.between(end=datetime.date(2021, 1, 2)) == dataclasses.Matches(
+            [match_one, match_two, match_three]
+        )
+
+    def test_date_queries_on_out_of_order_matches(self):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 3, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 12, 0)
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three])
+
+        assert matches.from_date(datetime.date(2021, 1, 2)) == dataclasses.Matches(
+            [match_one, match_three]
+        )
+        assert matches.on_date(datetime.date(2021, 1, 1)) == dataclasses.Matches([match_two])
+
+    def test_date_queries_after_add(self):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 12, 0)
+        )
+        matches = dataclasses.Matches([match_one])
+        # Query first so the day index is built, and then carried over by `add`
+        assert matches.on_date(datetime.date(2021, 1, 2)) == dataclasses.Matches([match_one])
+
+        match_two = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 15, 0)
+        )
+        matches = matches.add(match_two).add(match_three)
+
+        assert matches.on_date(datetime.date(2021, 1, 2)) == dataclasses.Matches(
+            [match_one, match_three]
+        )
+        assert matches.from_date(datetime.date(2021, 1, 1)) == matches
+
     def test_involves(self):
         player_one = core_factories.UserFactory()
         player_two = core_factories.UserFactory()
@@ -144,6 +223,52 @@ class TestMatches:
         involves_player_three = matches.involves(player_three)
         assert len(involves_player_three) == 1
 
+    def test_head_to_head(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+
+        match_one = match_tracker_factories.MatchResultFactory(winner=player_one, loser=player_two)
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=player_three, loser=player_one
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            winner=player_two, loser=player_one
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three])
+
+        assert matches.head_to_head(player_one, player_two) == dataclasses.Matches(
+            [match_one, match_three]
+        )
+        assert matches.head_to_head(player_two, player_three) == dataclasses.Matches([])
+        assert matches.head_to_head(player_one, player_one) == matches
+
+    def test_player_queries_after_add_and_replace(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+
+        match_one = match_tracker_factories.MatchResultFactory(winner=player_one, loser=player_two)
+        matches = dataclasses.Matches([match_one])
+        # Query first so the player index is built, and then carried over by `add` and `replace`
+        assert matches.involves(player_one) == matches
+
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=player_three, loser=player_one
+        )
+        matches = matches.add(match_two)
+        assert matches.involves(player_one) == dataclasses.Matches([match_one, match_two])
+        assert matches.head_to_head(player_one, player_three) == dataclasses.Matches([match_two])
+
+        replacement = match_tracker_factories.MatchResultFactory(
+            winner=player_three, loser=player_two, result_id=match_one.result_id
+        )
+        matches = matches.replace(replacement)
+        assert matches.involves(player_one) == dataclasses.Matches([match_two])
+        assert matches.involves(player_three) == dataclasses.Matches([replacement, match_two])
+        assert matches.head_to_head(player_one, player_two) == dataclasses.Matches([])
+        assert matches.head_to_head(player_two, player_three) == dataclasses.Matches([replacement])
+
     def test_last(self):
         player_one = core_factories.UserFactory()
         player_two = core_factories.UserFactory()
@@ -173,3 +298,142 @@ class TestMatches:
         replaced_matches = matches.replace(match_three)
 
         assert replaced_matches == dataclasses.Matches([match_three, match_two])
+
+    def test_match_by_id(self):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        matches = dataclasses.Matches([match_one])
+        assert matches.match_by_id(str(match_one.result_id)) == match_one
+
+        # The ID index is carried over by `add` and `replace`
+        matches = matches.add(match_two)
+        new_match_two = match_tracker_factories.MatchResultFactory(result_id=match_two.result_id)
+        matches = matches.replace(new_match_two)
+
+        assert matches.match_by_id(str(match_two.result_id)) == new_match_two
+        with pytest.raises(dataclasses.MatchNotFound):
+            matches.match_by_id(str(uuid.uuid4()))
+
+    def test_add_and_replace_leave_original_unchanged(self):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        matches = dataclasses.Matches([match_one])
+        # Build the ID index, which `add` then shares with the new matches
+        matches.match_by_id(str(match_one.result_id))
+
+        added = matches.add(match_two)
+        replaced = added.replace(
+            match_tracker_factories.MatchResultFactory(result_id=match_one.result_id)
+        )
+
+        assert matches == dataclasses.Matches([match_one])
+        assert added == dataclasses.Matches([match_one, match_two])
+        assert replaced.match_results[1] == match_two
+        assert replaced.match_results[0] != match_one
+        with pytest.raises(dataclasses.MatchNotFound):
+            matches.match_by_id(str(match_two.result_id))
+
+
+class TestMatchesQuery:
+    def test_chained_filters_match_eager_filters(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+
+        match_one = match_tracker_factories.MatchResultFactory(
+            winner=player_one, loser=player_two, played_at=datetime.datetime(2021, 1, 2, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=player_two, loser=player_three, played_at=datetime.datetime(2021, 1, 2, 11, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            winner=player_two, loser=player_one, played_at=datetime.datetime(2021, 1, 2, 10, 0)
+        )
+        match_four = match_tracker_factories.MatchResultFactory(
+            winner=player_one, loser=player_two, played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three, match_four])
+
+        query = (
+            matches.query()
+            .involves(player_one)
+            .involves(player_two)
+            .from_date(datetime.date(2021, 1, 2))
+            .sort_by("played_at")
+        )
+
+        assert query.execute() == dataclasses.Matches([match_three, match_one])
+        assert query.execute() == (
+            matches.involves(player_one)
+            .involves(player_two)
+            .from_date(datetime.date(2021, 1, 2))
+            .sort_by("played_at")
+        )
+
+    def test_last_after_filter(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+
+        match_one = match_tracker_factories.MatchResultFactory(winner=player_one, loser=player_two)
+        match_two = match_tracker_factories.MatchResultFactory(winner=player_two, loser=player_one)
+        match_three = match_tracker_factories.MatchResultFactory(
+            winner=player_three, loser=player_two
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three])
+
+        assert matches.query().involves(player_one).last(n=1).execute() == dataclasses.Matches(
+            [match_two]
+        )
+        assert matches.query().involves(player_one).last(n=5).execute() == dataclasses.Matches(
+            [match_one, match_two]
+        )
+
+    def test_steps_run_in_order(self):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 3, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 2, 12, 0)
+        )
+        matches = dataclasses.Matches([match_one, match_two, match_three])
+
+        assert matches.query().last(n=2).sort_by("played_at").execute() == dataclasses.Matches(
+            [match_two, match_three]
+        )
+        assert matches.query().sort_by("played_at").last(n=2).execute() == dataclasses.Matches(
+            [match_three, match_one]
+        )
+
+    def test_sort_by_unknown_field(self):
+        matches = dataclasses.Matches([match_tracker_factories.MatchResultFactory()])
+
+        with pytest.raises(dataclasses.FieldDoesNotExist):
+            matches.query().sort_by("not_a_field")
+
+    def test_empty_query_returns_source(self):
+        matches = dataclasses.Matches([match_tracker_factories.MatchResultFactory()])
+        # Build an index, which should be kept
+        matches.position_of(str(matches.match_results[0].result_id))
+
+        result = matches.query().execute()
+
+        assert result is matches
+        assert result._id_index is not None
+
+    def test_results_are_built_on_a_vector(self):
+        matches = dataclasses.Matches(
+            [match_tracker_factories.MatchResultFactory() for _ in range(5)]
+        )
+
+        last_matches = matches.query().last(n=2).execute()
+        filtered_matches = matches.query().where(lambda match_result: True).execute()
+
+        assert isinstance(last_matches.match_results, vector.Vector)
+        assert last_matches == dataclasses.Matches(matches.match_results[-2:])
+        assert isinstance(filtered_matches.match_results, vector.Vector)
+        assert filtered_matches == matches
+        assert matches.query().last(n=0).execute() == dataclasses.Matches([])
@@ -0,0 +1,127 @@
+import datetime
+import json
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, encoding
+
+from tests.factories import match_tracker as match_tracker_factories
+
+
+class TestDecodeLog:
+    def test_decodes_legacy_array(self):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+
+        decoded_log = encoding.decode_log(json.dumps([match_one.to_dict(), match_two.to_dict()]))
+
+        assert decoded_log.schema_version == 1
+        assert decoded_log.fold() == dataclasses.Matches([match_one, match_two])
+
+    def test_decodes_v1_records_appended_to_legacy_array(self):
+        match_one = match_tracker_factories.MatchResultFactory(loser_score=5)
+        new_match_one = match_tracker_factories.MatchResultFactory(
+            loser_score=1, result_id=match_one.result_id
+        )
+        contents = (
+            json.dumps([match_one.to_dict()])
+            + json.dumps({"op": "replace", "match_result": new_match_one.to_dict()})
+            + "\n"
+        )
+
+        assert encoding.decode_log(contents).fold() == dataclasses.Matches([new_match_one])
+
+    def test_round_trips_v2_log(self):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2021, 1, 1, 12, 0, 0, 123456), winner_served=True
+        )
+        match_two = match_tracker_factories.MatchResultFactory(loser_served=True)
+        matches = dataclasses.Matches([match_one, match_two])
+
+        contents, _ = encoding.encode_log(matches)
+        decoded_log = encoding.decode_log(contents)
+
+        assert decoded_log.schema_version == 2
+        decoded_matches = decoded_log.fold()
+        assert decoded_matches == matches
+        assert decoded_matches.match_results[0].played_at == match_one.played_at
+        assert decoded_matches.match_results[1].served == match_two.loser
+
+    def test_v2_log_keeps_names_users_were_recorded_with(self):
+        paul = core_dataclasses.User(id="1", username="paul", global_name="Paul")
+        renamed_paul = core_dataclasses.User(id="1", username="paul", global_name="Paul!")
+        match_one = match_tracker_factories.MatchResultFactory(winner=paul)
+        match_two = match_tracker_factories.MatchResultFactory(winner=renamed_paul)
+
+        contents, _ = encoding.encode_log(dataclasses.Matches([match_one, match_two]))
+        decoded_matches = encoding.decode_log(contents).fold()
+
+        assert decoded_matches.match_results[0].winner.name == "Paul"
+        assert decoded_matches.match_results[1].winner.name == "Paul!"
+
+    def test_v2_log_writes_each_user_once(self):
+        matches = match_tracker_factories.build_match_history_between(
+            core_dataclasses.User(id="1", username="paul", global_name="Paul"),
+            core_dataclasses.User(id="2", username="john", global_name="John"),
+        )
+
+        contents, user_table = encoding.encode_log(matches)
+
+        user_lines = [line for line in contents.splitlines() if line.startswith('{"u":')]
+        assert len(user_lines) == len(user_table.users)
+        assert encoding.decode_user_table(contents).users == user_table.users
+
+
+class TestFoldRecords:
+    def test_replace_keeps_position(self):
+        match_one = match_tracker_factories.MatchResultFactory(loser_score=5)
+        match_two = match_tracker_factories.MatchResultFactory()
+        new_match_one = match_tracker_factories.MatchResultFactory(
+            loser_score=1, result_id=match_one.result_id
+        )
+
+        records = [("add", match_one), ("add", match_two), ("replace", new_match_one)]
+
+        assert encoding.fold_records(records) == dataclasses.Matches([new_match_one, match_two])
+
+    def test_ignores_replace_for_unknown_result(self):
+        match_one = match_tracker_factories.MatchResultFactory()
+        unknown_match = match_tracker_factories.MatchResultFactory()
+
+        records = [("add", match_one), ("replace", unknown_match)]
+
+        assert encoding.fold_records(records) == dataclasses.Matches([match_one])
+
+
+class TestRecordIndex:
+    def test_folds_batches_appended_out_of_order(self):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        new_match_one = match_tracker_factories.MatchResultFactory(result_id=match_one.result_id)
+        unknown_match = match_tracker_factories.MatchResultFactory()
+
+        contents, user_table = encoding.encode_log(dataclasses.Matches([match_one]))
+        batches = [encoding.index_log(contents, log_version="1")]
+        for version, (operation, match_result) in enumerate(
+            [("add", match_two), ("replace", new_match_one), ("replace", unknown_match)], start=2
+        ):
+            first_user = len(user_table.users)
+            record = encoding.encode_record(operation, match_result, user_table)
+            batches.append(
+                encoding.index_batch(
+                    record,
+                    start=len(contents.encode("utf-8")),
+                    log_version=str(version),
+                    first_user=first_user,
+                )
+            )
+            contents += record
+
+        index_contents = "".join(batch.to_line() for batch in reversed(batches))
+        record_index = encoding.RecordIndex.fold(encoding.read_index_batches(index_contents))
+
+        assert record_index.log_version == "4"
+        assert record_index.users == user_table.users
+        assert set(record_index.offsets) == {match_one.result_id.hex, match_two.result_id.hex}
+        start, length = record_index.offsets[match_one.result_id.hex]
+        record = contents.encode("utf-8")[start : start + length].decode("utf-8")
+        assert encoding.decode_record(record, record_index.users) == new_match_one
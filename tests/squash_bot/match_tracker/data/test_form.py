@@ -0,0 +1,93 @@
+import random
+
+import attrs
+
+from squash_bot.match_tracker.data import dataclasses, form, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+def _build_random_matches(n: int) -> dataclasses.Matches:
+    players = [core_factories.UserFactory(id=str(i)) for i in range(4)]
+    match_results = []
+    for _ in range(n):
+        winner, loser = random.sample(players, 2)
+        match_results.append(
+            match_tracker_factories.MatchResultFactory(
+                winner=winner,
+                loser=loser,
+                loser_score=random.randint(0, 9),
+                served=random.choice([winner, loser]),
+            )
+        )
+    return dataclasses.Matches(match_results)
+
+
+def _without_ordered_fields(player_tally: tally.MatchesTallyData) -> tally.MatchesTallyData:
+    # Recent form doesn't keep streaks or the date of the last win
+    return attrs.evolve(
+        player_tally,
+        highest_win_streak=0,
+        highest_loss_streak=0,
+        current_win_streak=0,
+        current_loss_streak=0,
+        last_win_datetime=None,
+    )
+
+
+class TestRecentForm:
+    def test_running_sums_match_tally_of_last_matches(self):
+        matches = _build_random_matches(60)
+        form_table = form.FormTable.build(matches, "v1")
+
+        for player, recent_form in form_table.form_by_player.items():
+            recent_matches = matches.query().involves(player).last(form.RECENT_MATCHES).execute()
+            expected = tally.build_tally_data_by_player(recent_matches)[player]
+            assert recent_form.as_tally() == _without_ordered_fields(expected)
+            assert [won for won, *_ in recent_form.results] == [
+                match.winner == player for match in recent_matches.match_results
+            ]
+
+    def test_pair_form(self):
+        matches = _build_random_matches(60)
+        form_table = form.FormTable.build(matches, "v1")
+
+        for (player, opponent), recent_form in form_table.form_by_pair.items():
+            recent_matches = (
+                matches.query().involves(player).involves(opponent).last(form.RECENT_MATCHES)
+            ).execute()
+            expected = tally.build_tally_data_by_player(recent_matches)[player]
+            assert recent_form.as_tally() == _without_ordered_fields(expected)
+
+
+class TestFormTable:
+    def test_added_matches_build(self):
+        matches = _build_random_matches(30)
+        form_table = form.FormTable.build(matches, "v1")
+        new_match = _build_random_matches(1).match_results[0]
+
+        updated_table = form_table.added(new_match, "v2")
+
+        assert updated_table == form.FormTable.build(matches.add(new_match), "v2")
+        # The original table is left as it was
+        assert form_table == form.FormTable.build(matches, "v1")
+
+    def test_replaced_matches_build(self):
+        matches = _build_random_matches(30)
+        form_table = form.FormTable.build(matches, "v1")
+
+        old_match = matches.match_results[-3]
+        new_matches = matches.replace(
+            attrs.evolve(old_match, winner=old_match.loser, loser=old_match.winner)
+        )
+        updated_table = form_table.replaced(old_match, new_matches, "v2")
+
+        expected_table = form.FormTable.build(new_matches, "v2")
+        assert updated_table.form_by_player == expected_table.form_by_player
+        assert updated_table.form_by_pair == expected_table.form_by_pair
+
+    def test_to_json_round_trip(self):
+        form_table = form.FormTable.build(_build_random_matches(30), "v1")
+
+        assert form.FormTable.from_json(form_table.to_json()) == form_table
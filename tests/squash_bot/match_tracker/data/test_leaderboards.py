@@ -0,0 +1,84 @@
+import random
+
+from squash_bot.match_tracker.data import dataclasses, leaderboards, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+def _build_random_matches(n: int) -> dataclasses.Matches:
+    players = [core_factories.UserFactory(id=str(i)) for i in range(5)]
+    match_results = []
+    for _ in range(n):
+        winner, loser = random.sample(players, 2)
+        match_results.append(
+            match_tracker_factories.MatchResultFactory(
+                winner=winner, loser=loser, loser_score=random.randint(0, 9)
+            )
+        )
+    return dataclasses.Matches(match_results)
+
+
+class TestLeaderboards:
+    def test_build_ranks_players_by_each_stat(self):
+        tally_by_player = tally.build_tally_data_by_player(_build_random_matches(40))
+
+        player_leaderboards = leaderboards.Leaderboards.build(tally_by_player, "v1")
+
+        for stat in leaderboards.STATS:
+            values = [
+                stat.value(tally_by_player[player])
+                for player, _ in player_leaderboards.top(stat.name, len(tally_by_player))
+            ]
+            assert values == sorted(values, reverse=not stat.ascending)
+
+    def test_players_without_a_stat_are_left_off(self):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        tally_by_player = tally.build_tally_data_by_player(
+            dataclasses.Matches(
+                [
+                    match_tracker_factories.MatchResultFactory(
+                        winner=ricky, loser=steve, served=ricky
+                    )
+                ]
+            )
+        )
+
+        player_leaderboards = leaderboards.Leaderboards.build(tally_by_player, "v1")
+
+        assert player_leaderboards.top("win-rate-serving", 10) == [(ricky, "100%")]
+        assert player_leaderboards.top("last-win", 10) == [
+            (ricky, tally_by_player[ricky].last_win_datetime.strftime("%-d %b %Y"))
+        ]
+
+    def test_ties_keep_the_order_players_first_played(self):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        tally_by_player = tally.build_tally_data_by_player(
+            dataclasses.Matches(
+                [
+                    match_tracker_factories.MatchResultFactory(winner=ricky, loser=steve),
+                    match_tracker_factories.MatchResultFactory(winner=karl, loser=steve),
+                ]
+            )
+        )
+
+        player_leaderboards = leaderboards.Leaderboards.build(tally_by_player, "v1")
+
+        assert player_leaderboards.top("matches", 2) == [(steve, "2"), (ricky, "1")]
+        assert player_leaderboards.top("win-rate", 3) == [
+            (ricky, "100%"),
+            (karl, "100%"),
+            (steve, "0%"),
+        ]
+
+    def test_to_json_round_trip(self):
+        player_leaderboards = leaderboards.Leaderboards.build(
+            tally.build_tally_data_by_player(_build_random_matches(40)), "v1"
+        )
+
+        assert leaderboards.Leaderboards.from_json(player_leaderboards.to_json()) == (
+            player_leaderboards
+        )
@@ -0,0 +1,95 @@
+import datetime
+
+from squash_bot.match_tracker import formatters
+from squash_bot.match_tracker.data import dataclasses, encoding, match_table, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+def _build_matches() -> dataclasses.Matches:
+    ricky = core_factories.UserFactory(username="ricky")
+    steve = core_factories.UserFactory(username="steve")
+    karl = core_factories.UserFactory(username="karl")
+    return dataclasses.Matches(
+        [
+            match_tracker_factories.MatchResultFactory(
+                winner=ricky, loser=steve, played_at=datetime.datetime(2021, 1, 1, 12, 0)
+            ),
+            match_tracker_factories.MatchResultFactory(
+                winner=steve, loser=karl, played_at=datetime.datetime(2021, 1, 1, 13, 0)
+            ),
+            match_tracker_factories.MatchResultFactory(
+                winner=karl,
+                loser=ricky,
+                loser_score=9,
+                played_at=datetime.datetime(2021, 1, 2, 12, 0),
+            ),
+            match_tracker_factories.MatchResultFactory(
+                winner=ricky, loser=karl, played_at=datetime.datetime(2021, 1, 3, 12, 0)
+            ),
+        ]
+    )
+
+
+class TestMatchTable:
+    def test_round_trips_matches(self):
+        matches = _build_matches()
+
+        table = match_table.MatchTable.from_matches(matches)
+
+        assert len(table) == 4
+        assert table.to_matches() == matches
+
+    def test_queries_match_matches_queries(self):
+        matches = _build_matches()
+        table = match_table.MatchTable.from_matches(matches)
+        karl = matches.match_results[1].loser
+
+        assert table.from_date(datetime.date(2021, 1, 2)).to_matches() == matches.from_date(
+            datetime.date(2021, 1, 2)
+        )
+        assert table.on_date(datetime.date(2021, 1, 1)).to_matches() == matches.on_date(
+            datetime.date(2021, 1, 1)
+        )
+        assert table.involves(karl).to_matches() == matches.involves(karl)
+        assert table.last(2).to_matches() == matches.last(2)
+        assert table.sort_by("loser_score").to_matches() == matches.sort_by("loser_score")
+
+    def test_match_by_id(self):
+        matches = _build_matches()
+        table = match_table.MatchTable.from_matches(matches)
+        match = matches.match_results[2]
+
+        assert table.match_by_id(str(match.result_id)) == match
+
+    def test_tally_matches_matches_tally(self):
+        matches = _build_matches()
+        table = match_table.MatchTable.from_matches(matches)
+
+        assert tally.build_tally_data_by_player(table) == tally.build_tally_data_by_player(matches)
+
+    def test_formatters_run_on_table(self):
+        matches = _build_matches()
+        table = match_table.MatchTable.from_matches(matches)
+
+        assert formatters.LeagueTable.format_matches(
+            table
+        ) == formatters.LeagueTable.format_matches(matches)
+
+
+class TestDecodeMatchTable:
+    def test_decodes_v2_log(self):
+        matches = _build_matches()
+        new_match = match_tracker_factories.MatchResultFactory(
+            winner=matches.match_results[0].loser,
+            loser=matches.match_results[0].winner,
+            played_at=matches.match_results[0].played_at,
+            result_id=matches.match_results[0].result_id,
+        )
+        contents, user_table = encoding.encode_log(matches)
+        contents += encoding.encode_record("replace", new_match, user_table)
+
+        table = encoding.decode_match_table(contents)
+
+        assert table.to_matches() == matches.replace(new_match)
@@ -0,0 +1,77 @@
+import attrs
+
+from squash_bot.match_tracker.data import dataclasses, pairs, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+def _build_matches() -> dataclasses.Matches:
+    ricky = core_factories.UserFactory(id="1", username="ricky")
+    steve = core_factories.UserFactory(id="2", username="steve")
+    karl = core_factories.UserFactory(id="3", username="karl")
+    matches = match_tracker_factories.build_match_history_between(ricky, steve)
+    matches += match_tracker_factories.build_match_history_between(steve, karl, 2)
+    return matches.add(match_tracker_factories.MatchResultFactory(winner=karl, loser=ricky))
+
+
+class TestPairMatrix:
+    def test_build_matches_head_to_head_tally(self):
+        matches = _build_matches()
+        pair_matrix = pairs.PairMatrix.build(matches, "v1")
+
+        for player, opponent in pair_matrix.tally_by_pair:
+            head_to_head_matches = matches.query().involves(player).involves(opponent).execute()
+            expected = tally.build_tally_data_by_player(head_to_head_matches)[player]
+            assert pair_matrix.head_to_head(player, opponent) == expected
+
+    def test_added_matches_build(self):
+        matches = _build_matches()
+        pair_matrix = pairs.PairMatrix.build(matches, "v1")
+        karl, steve = matches.match_results[-1].winner, matches.match_results[0].loser
+
+        new_match = match_tracker_factories.MatchResultFactory(winner=steve, loser=karl)
+        updated_matrix = pair_matrix.added(new_match, "v2")
+
+        assert updated_matrix == pairs.PairMatrix.build(matches.add(new_match), "v2")
+        # The original matrix is left as it was
+        assert pair_matrix == pairs.PairMatrix.build(matches, "v1")
+
+    def test_replaced_with_different_players(self):
+        matches = _build_matches()
+        pair_matrix = pairs.PairMatrix.build(matches, "v1")
+        karl, ricky = matches.match_results[-1].winner, matches.match_results[-1].loser
+        # Either player can win the first match, so Steve is whichever of them isn't Ricky
+        first_match = matches.match_results[0]
+        (steve,) = {first_match.winner, first_match.loser} - {ricky}
+
+        old_match = matches.match_results[-1]
+        new_matches = matches.replace(attrs.evolve(old_match, winner=steve, loser=karl))
+        updated_matrix = pair_matrix.replaced(old_match, new_matches, "v2")
+
+        expected_matrix = pairs.PairMatrix.build(new_matches, "v2")
+        assert updated_matrix.tally_by_pair == expected_matrix.tally_by_pair
+        assert updated_matrix.head_to_head(karl, ricky) is None
+
+    def test_nemeses(self):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        matches = dataclasses.Matches(
+            [
+                match_tracker_factories.MatchResultFactory(winner=steve, loser=ricky),
+                match_tracker_factories.MatchResultFactory(winner=karl, loser=ricky),
+                match_tracker_factories.MatchResultFactory(winner=ricky, loser=steve),
+                # Karl has beaten Ricky as many times as Steve has, but Ricky has never beaten Karl
+                match_tracker_factories.MatchResultFactory(winner=steve, loser=karl),
+            ]
+        )
+
+        pair_matrix = pairs.PairMatrix.build(matches, "v1")
+
+        assert pair_matrix.nemeses() == {ricky: karl, steve: ricky, karl: steve}
+
+    def test_to_json_round_trip(self):
+        pair_matrix = pairs.PairMatrix.build(_build_matches(), "v1")
+
+        assert pairs.PairMatrix.from_json(pair_matrix.to_json()) == pair_matrix
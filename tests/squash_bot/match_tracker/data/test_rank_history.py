@@ -0,0 +1,174 @@
+import datetime
+import random
+
+import attrs
+
+from squash_bot.match_tracker.data import dataclasses, rank_history, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+def _build_random_matches(n: int, days: int = 5) -> dataclasses.Matches:
+    players = [core_factories.UserFactory(id=str(i)) for i in range(5)]
+    match_results = []
+    for index in range(n):
+        winner, loser = random.sample(players, 2)
+        match_results.append(
+            match_tracker_factories.MatchResultFactory(
+                winner=winner,
+                loser=loser,
+                played_at=datetime.datetime(2024, 1, 1 + index * days // n, 18, 0),
+            )
+        )
+    return dataclasses.Matches(match_results)
+
+
+def _positions_after(matches: dataclasses.Matches) -> dict:
+    # Rank the players from scratch, as the league table would after these matches
+    tally_by_player = tally.build_tally_data_by_player(matches)
+    return {
+        player: 1
+        + sum(
+            other_tally.win_rate > player_tally.win_rate
+            for other_tally in tally_by_player.values()
+        )
+        for player, player_tally in tally_by_player.items()
+    }
+
+
+class TestRankHistory:
+    def test_build_records_positions_after_each_session(self):
+        matches = _build_random_matches(40)
+
+        history = rank_history.RankHistory.build(matches, "v1")
+
+        expected_ranks: dict = {}
+        for session_date in sorted({match.played_on for match in matches.match_results}):
+            matches_so_far = dataclasses.Matches(
+                [match for match in matches.match_results if match.played_on <= session_date]
+            )
+            for player, position in _positions_after(matches_so_far).items():
+                expected_ranks.setdefault(player, []).append((session_date, position))
+        assert {
+            player: list(history.ranks_of(player)) for player in history.ranks_by_player
+        } == expected_ranks
+
+    def test_session_ranks_round_trip(self):
+        standings = rank_history.RankStandings.build(_build_random_matches(40), "v1")
+
+        assert standings.update
+        for session in standings.update.sessions:
+            assert rank_history.SessionRanks.from_dict(session.to_dict()) == session
+
+
+def _history_after(*updates: rank_history.HistoryUpdate) -> rank_history.RankHistory | None:
+    return rank_history.RankHistory.from_lines("".join(update.to_line() for update in updates))
+
+
+class TestRankStandings:
+    def test_build_records_every_session(self):
+        matches = _build_random_matches(40)
+
+        standings = rank_history.RankStandings.build(matches, "v1")
+
+        assert standings.update
+        assert _history_after(standings.update) == rank_history.RankHistory.build(matches, "v1")
+
+    def test_added_matches_build(self):
+        matches = _build_random_matches(40)
+        standings = rank_history.RankStandings.build(matches, "v1")
+        last_match = matches.match_results[-1]
+
+        for played_at in (last_match.played_at, last_match.played_at + datetime.timedelta(days=1)):
+            new_match = attrs.evolve(
+                _build_random_matches(1).match_results[0], played_at=played_at
+            )
+
+            updated_standings = standings.added(new_match, "v2")
+
+            assert updated_standings == rank_history.RankStandings.build(
+                matches.add(new_match), "v2"
+            )
+            # Only the new match's session is recorded
+            assert updated_standings.update
+            assert [session.session_date for session in updated_standings.update.sessions] == [
+                new_match.played_on
+            ]
+            assert _history_after(
+                standings.update, updated_standings.update
+            ) == rank_history.RankHistory.build(matches.add(new_match), "v2")
+        # The original standings are left as they were
+        assert standings == rank_history.RankStandings.build(matches, "v1")
+
+    def test_replaced_matches_build(self):
+        matches = _build_random_matches(40, days=10)
+        standings = rank_history.RankStandings.build(matches, "v1")
+        old_match = matches.match_results[20]
+
+        for new_match in (
+            attrs.evolve(old_match, winner=old_match.loser, loser=old_match.winner),
+            attrs.evolve(old_match, played_at=old_match.played_at - datetime.timedelta(days=1)),
+            attrs.evolve(old_match, played_at=old_match.played_at + datetime.timedelta(days=1)),
+        ):
+            new_matches = matches.replace(new_match)
+
+            updated_standings = standings.replaced(old_match, new_matches, "v2")
+
+            assert updated_standings == rank_history.RankStandings.build(new_matches, "v2")
+            assert _history_after(
+                standings.update, updated_standings.update
+            ) == rank_history.RankHistory.build(new_matches, "v2")
+
+    def test_replaced_only_records_sessions_from_the_replaced_match(self):
+        matches = _build_random_matches(40, days=10)
+        standings = rank_history.RankStandings.build(matches, "v1")
+        old_match = matches.match_results[20]
+
+        updated_standings = standings.replaced(
+            old_match,
+            matches.replace(
+                attrs.evolve(old_match, winner=old_match.loser, loser=old_match.winner)
+            ),
+            "v2",
+        )
+
+        assert updated_standings.update
+        assert updated_standings.update.kept_sessions == len(
+            {
+                match.played_on
+                for match in matches.match_results
+                if match.played_on < old_match.played_on
+            }
+        )
+        assert updated_standings.update.sessions[0].session_date == old_match.played_on
+
+    def test_to_json_round_trip(self):
+        standings = rank_history.RankStandings.build(_build_random_matches(40), "v1")
+
+        assert rank_history.RankStandings.from_json(standings.to_json()) == standings
+
+
+class TestFromLines:
+    def test_updates_appended_out_of_order(self):
+        matches = _build_random_matches(40)
+        standings = rank_history.RankStandings.build(matches, "v1")
+        first_match, second_match = _build_random_matches(2).match_results
+        first_standings = standings.added(first_match, "v2")
+        second_standings = first_standings.added(second_match, "v3")
+
+        assert _history_after(
+            standings.update, second_standings.update, first_standings.update
+        ) == rank_history.RankHistory.build(matches.add(first_match).add(second_match), "v3")
+
+    def test_starts_from_latest_rebuild(self):
+        matches = _build_random_matches(40)
+        first_standings = rank_history.RankStandings.build(_build_random_matches(10), "v1")
+        standings = rank_history.RankStandings.build(matches, "v2")
+
+        assert _history_after(
+            first_standings.update, standings.update
+        ) == rank_history.RankHistory.build(matches, "v2")
+
+    def test_nothing_rebuilt(self):
+        assert rank_history.RankHistory.from_lines("") is None
@@ -0,0 +1,108 @@
+import random
+from unittest import mock
+
+import attrs
+import pytest
+
+from squash_bot.match_tracker.data import checkpoints, dataclasses, ratings
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+def _build_random_matches(n: int) -> dataclasses.Matches:
+    players = [core_factories.UserFactory(id=str(i)) for i in range(4)]
+    match_results = []
+    for _ in range(n):
+        winner, loser = random.sample(players, 2)
+        match_results.append(
+            match_tracker_factories.MatchResultFactory(winner=winner, loser=loser)
+        )
+    return dataclasses.Matches(match_results)
+
+
+class TestRateMatch:
+    def test_winner_gains_what_loser_loses(self):
+        winner_rating, loser_rating = ratings.rate_match(
+            ratings.PlayerRating(rating=1600, number_matches=3), ratings.PlayerRating()
+        )
+
+        assert winner_rating.rating > 1600
+        assert winner_rating.rating - 1600 == pytest.approx(
+            ratings.INITIAL_RATING - loser_rating.rating
+        )
+        assert (winner_rating.number_matches, loser_rating.number_matches) == (4, 1)
+
+    def test_underdog_gains_more(self):
+        favourite_win, _ = ratings.rate_match(
+            ratings.PlayerRating(rating=1600), ratings.PlayerRating(rating=1400)
+        )
+        underdog_win, _ = ratings.rate_match(
+            ratings.PlayerRating(rating=1400), ratings.PlayerRating(rating=1600)
+        )
+
+        assert underdog_win.rating - 1400 > favourite_win.rating - 1600
+
+
+class TestRatingTable:
+    def test_build_checkpoints_periodically(self):
+        spacing = ratings.CHECKPOINT_SPACING
+        matches = _build_random_matches(spacing * 2 + 10)
+
+        rating_table = ratings.RatingTable.build(matches, "v1")
+
+        assert rating_table.position == len(matches)
+        assert [checkpoint.position for checkpoint in rating_table.checkpoint_log.checkpoints] == [
+            spacing,
+            spacing * 2,
+        ]
+        assert sum(
+            player_rating.rating for player_rating in rating_table.rating_by_player.values()
+        ) == pytest.approx(ratings.INITIAL_RATING * len(rating_table.rating_by_player))
+
+    def test_added_matches_build(self):
+        matches = _build_random_matches(ratings.CHECKPOINT_SPACING - 1)
+        rating_table = ratings.RatingTable.build(matches, "v1")
+        new_match = _build_random_matches(1).match_results[0]
+
+        updated_table = rating_table.added(new_match, "v2")
+
+        assert updated_table == ratings.RatingTable.build(matches.add(new_match), "v2")
+        assert len(updated_table.checkpoint_log.checkpoints) == 1
+
+    @pytest.mark.parametrize("edited_position", [5, 100, 130])
+    def test_replaced_matches_build(self, edited_position):
+        matches = _build_random_matches(ratings.CHECKPOINT_SPACING * 2 + 10)
+        rating_table = ratings.RatingTable.build(matches, "v1")
+
+        old_match = matches.match_results[edited_position]
+        new_matches = matches.replace(
+            attrs.evolve(old_match, winner=old_match.loser, loser=old_match.winner)
+        )
+        updated_table = rating_table.replaced(old_match, new_matches, "v2")
+
+        expected_table = ratings.RatingTable.build(new_matches, "v2")
+        assert updated_table.rating_by_player == pytest.approx(expected_table.rating_by_player)
+        assert [
+            checkpoint.position for checkpoint in updated_table.checkpoint_log.checkpoints
+        ] == [checkpoint.position for checkpoint in expected_table.checkpoint_log.checkpoints]
+
+    def test_replaced_replays_from_latest_checkpoint(self):
+        spacing = ratings.CHECKPOINT_SPACING
+        matches = _build_random_matches(spacing * 2 + 10)
+        rating_table = ratings.RatingTable.build(matches, "v1")
+
+        old_match = matches.match_results[spacing + 5]
+        new_matches = matches.replace(attrs.evolve(old_match, loser_score=0))
+        with mock.patch.object(ratings, "rate_match", wraps=ratings.rate_match) as rate_match:
+            rating_table.replaced(old_match, new_matches, "v2")
+
+        assert rate_match.call_count == len(matches) - spacing
+
+    def test_to_json_round_trip(self):
+        rating_table = ratings.RatingTable.build(
+            _build_random_matches(ratings.CHECKPOINT_SPACING + 10), "v1"
+        )
+
+        assert ratings.RatingTable.from_json(rating_table.to_json()) == rating_table
+        assert rating_table.checkpoint_log != checkpoints.CheckpointLog()
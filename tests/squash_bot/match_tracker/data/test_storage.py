@@ -1,10 +1,22 @@
 import datetime
 import json
+import uuid
+from unittest import mock
+
+import pytest
 
 from common.settings import base as settings_base
 from common.storage import base as storage_base
 from squash_bot.core.data import dataclasses as core_dataclasses
-from squash_bot.match_tracker.data import dataclasses, storage
+from squash_bot.match_tracker.data import (
+    dataclasses,
+    encoding,
+    leaderboards,
+    rank_history,
+    ratings,
+    storage,
+    tally,
+)
 
 from tests.factories import core as core_factories
 from tests.factories import match_tracker as match_tracker_factories
@@ -100,3 +112,502 @@ class TestReplaceMatchResult:
         assert storage.get_all_match_results(guild) == dataclasses.Matches(
             [match_one, match_two, new_match_three]
         )
+
+
+class TestStoreMatchResult:
+    def test_appends_to_legacy_results_file(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+
+        # Store a file in the legacy format, a single JSON array of match results
+        guild = core_dataclasses.Guild(guild_id="1")
+        storage_base.LocalStorage().store_file(
+            file_path=tmp_path,
+            file_name=storage._results_file_name(guild),
+            contents=json.dumps([match_one.to_dict()]),
+        )
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_two, guild)
+
+            assert storage.get_all_match_results(guild) == dataclasses.Matches(
+                [match_one, match_two]
+            )
+
+    def test_upgrades_legacy_results_file(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+
+        guild = core_dataclasses.Guild(guild_id="1")
+        storage_base.LocalStorage().store_file(
+            file_path=tmp_path,
+            file_name=storage._results_file_name(guild),
+            contents=json.dumps([match_one.to_dict()]),
+        )
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_two, guild)
+
+        contents = (tmp_path / storage._results_file_name(guild)).read_text()
+        assert encoding.schema_version(contents) == encoding.SCHEMA_VERSION
+        assert encoding.decode_log(contents).fold() == dataclasses.Matches([match_one, match_two])
+
+    def test_only_appends_new_result(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+        results_file = tmp_path / storage._results_file_name(guild)
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            contents_after_first_match = results_file.read_text()
+
+            storage.store_match_result(match_two, guild)
+
+        assert results_file.read_text().startswith(contents_after_first_match)
+        assert encoding.decode_log(results_file.read_text()).fold() == dataclasses.Matches(
+            [match_one, match_two]
+        )
+
+
+class TestMatchesCache:
+    def test_reuses_decoded_matches_when_file_unchanged(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_tracker_factories.MatchResultFactory(), guild)
+
+            first_read = storage.get_all_match_results(guild)
+            with mock.patch.object(dataclasses.Matches, "from_match_results") as from_results:
+                second_read = storage.get_all_match_results(guild)
+
+        from_results.assert_not_called()
+        assert second_read is first_read
+
+    def test_updates_cached_matches_with_own_writes(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        new_match_one = match_tracker_factories.MatchResultFactory(result_id=match_one.result_id)
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.get_all_match_results(guild)
+
+            storage.store_match_result(match_two, guild)
+            storage.replace_match_result(new_match_one, guild)
+            with mock.patch.object(dataclasses.Matches, "from_match_results") as from_results:
+                matches = storage.get_all_match_results(guild)
+
+        from_results.assert_not_called()
+        assert matches == dataclasses.Matches([new_match_one, match_two])
+
+    def test_drops_cached_matches_after_external_write(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.get_all_match_results(guild)
+
+            # Another container writes to the file
+            results_file = tmp_path / storage._results_file_name(guild)
+            user_table = encoding.decode_user_table(results_file.read_text())
+            storage_base.LocalStorage().append_file(
+                file_path=tmp_path,
+                file_name=storage._results_file_name(guild),
+                contents=encoding.encode_record("add", match_two, user_table),
+            )
+
+            assert storage.get_all_match_results(guild) == dataclasses.Matches(
+                [match_one, match_two]
+            )
+
+
+class TestGetMatchResult:
+    def test_reads_single_record_through_index(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        new_match_one = match_tracker_factories.MatchResultFactory(result_id=match_one.result_id)
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+            storage.replace_match_result(new_match_one, guild)
+            # As if from a cold container
+            storage._results_cache.clear()
+
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                assert storage.get_match_result(guild, str(match_one.result_id)) == new_match_one
+                assert storage.get_match_result(guild, str(match_two.result_id)) == match_two
+
+        decode_log.assert_not_called()
+
+    def test_falls_back_to_log_when_index_is_stale(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage._results_cache.clear()
+
+            # Another writer appends to the log without updating the index
+            results_file = tmp_path / storage._results_file_name(guild)
+            user_table = encoding.decode_user_table(results_file.read_text())
+            storage_base.LocalStorage().append_file(
+                file_path=tmp_path,
+                file_name=storage._results_file_name(guild),
+                contents=encoding.encode_record("add", match_two, user_table),
+            )
+
+            assert storage.get_match_result(guild, str(match_two.result_id)) == match_two
+
+    def test_index_is_only_appended_to(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            # The first match starts a new log, which is written in full
+            storage.store_match_result(match_tracker_factories.MatchResultFactory(), guild)
+            for _ in range(2):
+                with mock.patch.object(
+                    storage.base, "store_file", side_effect=storage.base.store_file
+                ) as store_file:
+                    storage.store_match_result(match_tracker_factories.MatchResultFactory(), guild)
+
+                # Only the aggregates are stored in full, in a single write
+                assert [call.kwargs["file_name"] for call in store_file.call_args_list] == [
+                    storage._aggregates_file_name(guild)
+                ]
+
+            index_lines = (tmp_path / storage._record_index_file_name(guild)).read_text()
+
+        assert len(index_lines.splitlines()) == 3
+
+    def test_index_conflict_does_not_write_record_again(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+        append_file = storage.base.append_file
+
+        def append_file_conflicting_on_index(file_path, file_name, contents, if_version=None):
+            if file_name == storage._record_index_file_name(guild):
+                raise storage_base.VersionConflict
+            return append_file(file_path, file_name, contents, if_version=if_version)
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            with (
+                mock.patch.object(
+                    storage.base, "append_file", side_effect=append_file_conflicting_on_index
+                ),
+                mock.patch.object(storage_base.time, "sleep"),
+            ):
+                storage.store_match_result(match_two, guild)
+            storage._results_cache.clear()
+
+            assert list(storage.get_all_match_results(guild).match_results) == [
+                match_one,
+                match_two,
+            ]
+            assert storage.get_match_result(guild, str(match_two.result_id)) == match_two
+
+    def test_indexes_records_a_writer_did_not(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        match_three = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+
+            # Another writer appends to the log without updating the index
+            results_file = tmp_path / storage._results_file_name(guild)
+            user_table = encoding.decode_user_table(results_file.read_text())
+            storage_base.LocalStorage().append_file(
+                file_path=tmp_path,
+                file_name=storage._results_file_name(guild),
+                contents=encoding.encode_record("add", match_two, user_table),
+            )
+
+            storage.store_match_result(match_three, guild)
+            storage._results_cache.clear()
+
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                assert storage.get_match_result(guild, str(match_two.result_id)) == match_two
+                assert storage.get_match_result(guild, str(match_three.result_id)) == match_three
+
+        decode_log.assert_not_called()
+
+    def test_unknown_match(self, tmp_path):
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_tracker_factories.MatchResultFactory(), guild)
+            storage._results_cache.clear()
+
+            with pytest.raises(dataclasses.MatchNotFound):
+                storage.get_match_result(guild, str(uuid.uuid4()))
+
+
+class TestGetAllTimeTally:
+    def test_reads_materialized_tally(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory(winner=match_one.loser)
+        new_match_one = match_tracker_factories.MatchResultFactory(
+            winner=match_one.loser, loser=match_one.winner, result_id=match_one.result_id
+        )
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+            storage.replace_match_result(new_match_one, guild)
+            storage._results_cache.clear()
+
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                tally_by_player = storage.get_all_time_tally(guild)
+
+        decode_log.assert_not_called()
+        assert tally_by_player == tally.build_tally_data_by_player(
+            dataclasses.Matches([new_match_one, match_two])
+        )
+
+    def test_rebuilds_tally_when_out_of_date(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+
+            # Another writer appends to the log without updating the tally
+            results_file = tmp_path / storage._results_file_name(guild)
+            user_table = encoding.decode_user_table(results_file.read_text())
+            storage_base.LocalStorage().append_file(
+                file_path=tmp_path,
+                file_name=storage._results_file_name(guild),
+                contents=encoding.encode_record("add", match_two, user_table),
+            )
+
+            assert storage.get_all_time_tally(guild) == tally.build_tally_data_by_player(
+                dataclasses.Matches([match_one, match_two])
+            )
+
+    def test_rebuilds_tally_from_match_table(self, tmp_path):
+        match_results = [match_tracker_factories.MatchResultFactory() for _ in range(3)]
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            for match_result in match_results:
+                storage.store_match_result(match_result, guild)
+            # As if the tally was lost, on a container that hasn't read the log
+            (tmp_path / storage._aggregates_file_name(guild)).unlink()
+            storage._results_cache.clear()
+
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                tally_by_player = storage.get_all_time_tally(guild)
+
+        decode_log.assert_not_called()
+        assert tally_by_player == tally.build_tally_data_by_player(
+            dataclasses.Matches(match_results)
+        )
+
+    def test_rebuilds_large_tally_by_column(self, tmp_path):
+        players = [core_factories.UserFactory() for _ in range(4)]
+        matches = dataclasses.Matches(
+            [
+                match_tracker_factories.MatchResultFactory(
+                    winner=players[position % 4],
+                    loser=players[(position + 1 + position // 4 % 3) % 4],
+                    loser_score=position % 10,
+                )
+                for position in range(tally.COLUMNAR_TALLY_MIN_MATCHES)
+            ]
+        )
+        guild = core_dataclasses.Guild(guild_id="1")
+        contents, _ = encoding.encode_log(matches)
+        storage_base.LocalStorage().store_file(
+            file_path=tmp_path, file_name=storage._results_file_name(guild), contents=contents
+        )
+
+        with (
+            mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path),
+            mock.patch.object(
+                tally,
+                "_build_tally_data_by_player_by_column",
+                side_effect=tally._build_tally_data_by_player_by_column,
+            ) as build_by_column,
+        ):
+            tally_by_player = storage.get_all_time_tally(guild)
+
+        build_by_column.assert_called_once()
+        assert tally_by_player == tally.build_tally_data_by_player(matches)
+
+
+class TestRatingTable:
+    def test_reads_stored_ratings(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory(winner=match_one.loser)
+        new_match_one = match_tracker_factories.MatchResultFactory(
+            winner=match_one.loser, loser=match_one.winner, result_id=match_one.result_id
+        )
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+            storage.replace_match_result(new_match_one, guild)
+            storage._results_cache.clear()
+
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                rating_table = storage.get_rating_table(guild)
+
+        decode_log.assert_not_called()
+        assert rating_table.rating_by_player == (
+            ratings.RatingTable.build(
+                dataclasses.Matches([new_match_one, match_two]), log_version=""
+            ).rating_by_player
+        )
+
+    def test_rebuild_rating_table(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+            stored_aggregates = storage._read_aggregates(guild)
+            del stored_aggregates[storage._RATINGS]
+            storage._store_aggregates(guild, stored_aggregates)
+
+            rating_table = storage.rebuild_rating_table(guild)
+            assert storage.get_rating_table(guild) == rating_table
+
+        assert rating_table.rating_by_player == (
+            ratings.RatingTable.build(
+                dataclasses.Matches([match_one, match_two]), log_version=""
+            ).rating_by_player
+        )
+
+
+class TestGetRankHistory:
+    def test_reads_appended_sessions(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2024, 1, 1, 18, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=match_one.loser, played_at=datetime.datetime(2024, 1, 2, 18, 0)
+        )
+        new_match_one = match_tracker_factories.MatchResultFactory(
+            winner=match_one.loser,
+            loser=match_one.winner,
+            result_id=match_one.result_id,
+            played_at=match_one.played_at,
+        )
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+            storage.replace_match_result(new_match_one, guild)
+            storage._results_cache.clear()
+
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                history = storage.get_rank_history(guild)
+
+        decode_log.assert_not_called()
+        assert history.ranks_by_player == (
+            rank_history.RankHistory.build(
+                dataclasses.Matches([new_match_one, match_two]), log_version=""
+            ).ranks_by_player
+        )
+        # Each write appended a line, rather than the history being stored again
+        history_lines = (tmp_path / storage._rank_history_file_name(guild)).read_text()
+        assert len(history_lines.splitlines()) == 3
+
+    def test_rank_history_conflict_does_not_write_record_again(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2024, 1, 1, 18, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2024, 1, 2, 18, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            played_at=datetime.datetime(2024, 1, 3, 18, 0)
+        )
+        guild = core_dataclasses.Guild(guild_id="1")
+        append_file = storage.base.append_file
+
+        def append_file_conflicting_on_history(file_path, file_name, contents, if_version=None):
+            if file_name == storage._rank_history_file_name(guild):
+                raise storage_base.VersionConflict
+            return append_file(file_path, file_name, contents, if_version=if_version)
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            with (
+                mock.patch.object(
+                    storage.base, "append_file", side_effect=append_file_conflicting_on_history
+                ),
+                mock.patch.object(storage_base.time, "sleep"),
+            ):
+                storage.store_match_result(match_two, guild)
+            # The standings that the lost sessions follow on from weren't stored, so they're recorded again
+            assert storage._RANK_STANDINGS not in storage._read_aggregates(guild)
+            storage.store_match_result(match_three, guild)
+            storage._results_cache.clear()
+
+            matches = storage.get_all_match_results(guild)
+            with mock.patch.object(encoding, "decode_log") as decode_log:
+                history = storage.get_rank_history(guild)
+
+        decode_log.assert_not_called()
+        assert list(matches.match_results) == [match_one, match_two, match_three]
+        assert history.ranks_by_player == (
+            rank_history.RankHistory.build(matches, log_version="").ranks_by_player
+        )
+
+
+class TestGetLeaderboards:
+    def test_reads_stored_leaderboards(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        match_two = match_tracker_factories.MatchResultFactory(winner=match_one.loser)
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+            storage._results_cache.clear()
+
+            with mock.patch.object(leaderboards.Leaderboards, "build") as build:
+                stored_leaderboards = storage.get_leaderboards(guild)
+
+        build.assert_not_called()
+        assert stored_leaderboards.entries_by_stat == (
+            leaderboards.Leaderboards.build(
+                tally.build_tally_data_by_player(dataclasses.Matches([match_one, match_two])),
+                log_version="",
+            ).entries_by_stat
+        )
+
+    def test_rebuilds_leaderboards_missing_a_stat(self, tmp_path):
+        match_one = match_tracker_factories.MatchResultFactory()
+        guild = core_dataclasses.Guild(guild_id="1")
+        new_stat = leaderboards.Stat(
+            name="total-score", label="Total score", value=lambda tally: tally.total_score
+        )
+
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+
+            # The stat is added after the leaderboards were stored
+            with (
+                mock.patch.object(leaderboards, "STATS", (*leaderboards.STATS, new_stat)),
+                mock.patch.dict(leaderboards.STATS_BY_NAME, {new_stat.name: new_stat}),
+            ):
+                stored_leaderboards = storage.get_leaderboards(guild)
+
+        assert stored_leaderboards.top("total-score", 1) == [(match_one.winner, "11")]
@@ -0,0 +1,328 @@
+import datetime
+import random
+
+import attrs
+import pytest
+import time_machine
+
+from squash_bot.core.data import dataclasses as core_dataclasses
+from squash_bot.match_tracker.data import dataclasses, match_table, tally
+
+from tests.factories import core as core_factories
+from tests.factories import match_tracker as match_tracker_factories
+
+
+class TestMaterializedTally:
+    def test_added_matches_full_tally(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+        matches = match_tracker_factories.build_match_history_between(player_one, player_two)
+        materialized_tally = tally.MaterializedTally(
+            log_version="v1", tally_by_player=tally.build_tally_data_by_player(matches)
+        )
+
+        new_match = match_tracker_factories.MatchResultFactory(
+            winner=player_three, loser=player_one
+        )
+        updated_tally = materialized_tally.added(new_match, "v2")
+
+        assert updated_tally == tally.MaterializedTally(
+            log_version="v2",
+            tally_by_player=tally.build_tally_data_by_player(matches.add(new_match)),
+        )
+        # The original tally is left as it was
+        assert materialized_tally.tally_by_player == tally.build_tally_data_by_player(matches)
+
+    def test_replaced_with_same_players(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        matches = match_tracker_factories.build_match_history_between(player_one, player_two)
+        materialized_tally = tally.MaterializedTally(
+            log_version="v1", tally_by_player=tally.build_tally_data_by_player(matches)
+        )
+
+        old_match = matches.match_results[3]
+        new_matches = matches.replace(
+            match_tracker_factories.MatchResultFactory(
+                winner=old_match.loser,
+                loser=old_match.winner,
+                played_at=old_match.played_at,
+                result_id=old_match.result_id,
+            )
+        )
+        updated_tally = materialized_tally.replaced(old_match, new_matches, "v2")
+
+        assert updated_tally.tally_by_player == tally.build_tally_data_by_player(new_matches)
+
+    def test_replaced_first_match_keeps_players_in_order(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+        matches = match_tracker_factories.build_match_history_between(player_one, player_two).add(
+            match_tracker_factories.MatchResultFactory(winner=player_three, loser=player_one)
+        )
+        materialized_tally = tally.MaterializedTally.build(matches, "v1")
+
+        for old_match in (matches.match_results[0], matches.match_results[-1]):
+            new_matches = matches.replace(
+                attrs.evolve(old_match, winner=old_match.loser, loser=old_match.winner)
+            )
+            updated_tally = materialized_tally.replaced(old_match, new_matches, "v2")
+
+            assert list(updated_tally.tally_by_player.items()) == list(
+                tally.build_tally_data_by_player(new_matches).items()
+            )
+
+    def test_replaced_with_different_players(self):
+        player_one = core_factories.UserFactory()
+        player_two = core_factories.UserFactory()
+        player_three = core_factories.UserFactory()
+        matches = match_tracker_factories.build_match_history_between(player_one, player_two)
+        materialized_tally = tally.MaterializedTally(
+            log_version="v1", tally_by_player=tally.build_tally_data_by_player(matches)
+        )
+
+        old_match = matches.match_results[0]
+        new_matches = matches.replace(
+            match_tracker_factories.MatchResultFactory(
+                winner=player_three, loser=player_two, result_id=old_match.result_id
+            )
+        )
+        updated_tally = materialized_tally.replaced(old_match, new_matches, "v2")
+
+        assert list(updated_tally.tally_by_player.items()) == list(
+            tally.build_tally_data_by_player(new_matches).items()
+        )
+
+    def test_json_round_trip(self):
+        matches = dataclasses.Matches(
+            [match_tracker_factories.MatchResultFactory() for _ in range(3)]
+        )
+        materialized_tally = tally.MaterializedTally(
+            log_version="v1", tally_by_player=tally.build_tally_data_by_player(matches)
+        )
+
+        assert tally.MaterializedTally.from_json(materialized_tally.to_json()) == (
+            materialized_tally
+        )
+
+
+def _without_streaks(
+    tally_by_player: tally.T_tally_by_player,
+) -> tally.T_tally_by_player:
+    return {
+        player: attrs.evolve(
+            player_tally,
+            highest_win_streak=0,
+            highest_loss_streak=0,
+            current_win_streak=0,
+            current_loss_streak=0,
+        )
+        for player, player_tally in tally_by_player.items()
+    }
+
+
+class TestTallyIndex:
+    def _build_matches(self, played_on_days: list[int]) -> dataclasses.Matches:
+        players = [core_factories.UserFactory() for _ in range(3)]
+        return dataclasses.Matches(
+            match_results=[
+                match_tracker_factories.MatchResultFactory(
+                    winner=players[position % 3],
+                    loser=players[(position + 1 + day) % 3 or 1],
+                    loser_score=position % 10,
+                    served=players[position % 3]
+                    if day % 2
+                    else players[(position + 1 + day) % 3 or 1],
+                    played_at=datetime.datetime(2024, 1, day, 18, 0),
+                )
+                for position, day in enumerate(played_on_days)
+            ]
+        )
+
+    def test_window_matches_replayed_tally(self):
+        matches = self._build_matches([1, 1, 2, 4, 4, 4, 7, 9, 9, 12])
+        tally_index = tally.TallyIndex.build(matches)
+
+        for start, end in [(None, None), (2, 9), (3, None), (None, 4), (5, 6), (13, None)]:
+            start_date = datetime.date(2024, 1, start) if start else None
+            end_date = datetime.date(2024, 1, end) if end else None
+            expected = _without_streaks(
+                tally.build_tally_data_by_player(matches.between(start_date, end_date))
+            )
+
+            window = tally_index.window(start_date, end_date)
+
+            assert window == expected
+            assert list(window) == list(expected)
+
+    def test_window_with_matches_out_of_order(self):
+        matches = self._build_matches([4, 1, 9, 2, 7])
+        tally_index = tally.TallyIndex.build(matches)
+
+        start_date, end_date = datetime.date(2024, 1, 2), datetime.date(2024, 1, 7)
+        window = tally_index.window(start_date, end_date)
+
+        assert not tally_index.in_order
+        assert window == tally.build_tally_data_by_player(matches.between(start_date, end_date))
+
+
+class TestColumnarTally:
+    def _build_matches(self, number_matches: int) -> dataclasses.Matches:
+        players = [core_factories.UserFactory() for _ in range(5)]
+        match_results = []
+        for position in range(number_matches):
+            winner, loser = random.sample(players, 2)
+            match_results.append(
+                match_tracker_factories.MatchResultFactory(
+                    winner=winner,
+                    loser=loser,
+                    served=random.choice([winner, loser]),
+                    loser_score=random.randint(0, 9),
+                    played_at=datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=position),
+                )
+            )
+        return dataclasses.Matches(match_results=match_results)
+
+    @pytest.mark.parametrize("number_matches", [1, 2, 50, tally.COLUMNAR_TALLY_MIN_MATCHES])
+    def test_matches_row_tally(self, number_matches):
+        matches = self._build_matches(number_matches)
+        table = match_table.MatchTable.from_matches(matches)
+
+        columnar_tally = tally._build_tally_data_by_player_by_column(table)
+
+        expected = tally.build_tally_data_by_player(matches)
+        assert columnar_tally == expected
+        assert list(columnar_tally) == list(expected)
+
+    def test_players_who_changed_name_share_a_tally(self):
+        matches = self._build_matches(20)
+        renamed_player = matches.match_results[10].winner
+        match_results = [
+            attrs.evolve(
+                match,
+                winner=core_dataclasses.User(
+                    id=renamed_player.id, username="renamed", global_name="Renamed"
+                ),
+            )
+            if position >= 10 and match.winner == renamed_player
+            else match
+            for position, match in enumerate(matches.match_results)
+        ]
+        renamed_matches = dataclasses.Matches(match_results=match_results)
+        table = match_table.MatchTable.from_matches(renamed_matches)
+
+        assert tally._build_tally_data_by_player_by_column(
+            table
+        ) == tally.build_tally_data_by_player(renamed_matches)
+
+
+class TestBuildTallyDataByPlayer:
+    def test_returns_correct_win_loss_data(self):
+        player_one = core_factories.UserFactory(username="player one")
+        player_two = core_factories.UserFactory(username="player two")
+        matches = match_tracker_factories.build_match_history_between(
+            player_one, player_two, games_played=10
+        )
+
+        tally_data = tally.build_tally_data_by_player(matches)
+        assert len(tally_data.keys()) == 2
+
+        player_one_tally = tally_data[player_one]
+        player_two_tally = tally_data[player_two]
+        assert player_one_tally.number_matches == 10
+        assert player_two_tally.number_matches == 10
+
+        assert player_one_tally.wins == player_two_tally.losses
+        assert player_one_tally.losses == player_two_tally.wins
+
+        assert (
+            player_one_tally.wins_received
+            + player_one_tally.losses_received
+            + player_one_tally.wins_served
+            + player_one_tally.losses_served
+            == 10
+        )
+        assert (
+            player_two_tally.wins_received
+            + player_two_tally.losses_received
+            + player_two_tally.wins_served
+            + player_two_tally.losses_served
+            == 10
+        )
+
+    def test_returns_correct_win_rate_data(self):
+        player_one = core_factories.UserFactory(username="player one")
+        player_two = core_factories.UserFactory(username="player two")
+
+        match_one = match_tracker_factories.MatchResultFactory(winner=player_one, loser=player_two)
+        match_two = match_tracker_factories.MatchResultFactory(winner=player_two, loser=player_one)
+        matches = dataclasses.Matches(match_results=[match_one, match_two])
+
+        tally_data = tally.build_tally_data_by_player(matches)
+        assert len(tally_data.keys()) == 2
+
+        player_one_tally = tally_data[player_one]
+        player_two_tally = tally_data[player_two]
+        assert player_one_tally.win_rate == 50
+        assert player_two_tally.win_rate == 50
+
+    def test_returns_correct_streak_data(self):
+        player_one = core_factories.UserFactory(username="player one")
+        player_two = core_factories.UserFactory(username="player two")
+
+        # Build a match history where player one wins three games in a row
+        match_one = match_tracker_factories.MatchResultFactory(winner=player_one, loser=player_two)
+        match_two = match_tracker_factories.MatchResultFactory(winner=player_one, loser=player_two)
+        match_three = match_tracker_factories.MatchResultFactory(
+            winner=player_one, loser=player_two
+        )
+        match_four = match_tracker_factories.MatchResultFactory(
+            winner=player_two, loser=player_one
+        )
+        matches = dataclasses.Matches(
+            match_results=[match_one, match_two, match_three, match_four]
+        )
+
+        tally_data = tally.build_tally_data_by_player(matches)
+        assert len(tally_data.keys()) == 2
+
+        player_one_tally = tally_data[player_one]
+        player_two_tally = tally_data[player_two]
+
+        assert player_one_tally.highest_win_streak == 3
+        assert player_one_tally.highest_loss_streak == 1
+
+        assert player_two_tally.highest_win_streak == 1
+        assert player_two_tally.highest_loss_streak == 3
+
+    def test_returns_correct_last_win_data(self):
+        player_one = core_factories.UserFactory(username="player one")
+        player_two = core_factories.UserFactory(username="player two")
+        player_three = core_factories.UserFactory(username="player three")
+
+        # Build a match history where player one wins three games in a row
+        match_one = match_tracker_factories.MatchResultFactory(
+            winner=player_one, loser=player_two, played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=player_two, loser=player_one, played_at=datetime.datetime(2021, 1, 3, 13, 0)
+        )
+        match_three = match_tracker_factories.MatchResultFactory(
+            winner=player_three, loser=player_one, played_at=datetime.datetime(2021, 1, 15, 13, 0)
+        )
+        matches = dataclasses.Matches(match_results=[match_one, match_two, match_three])
+
+        tally_data = tally.build_tally_data_by_player(matches)
+        assert len(tally_data.keys()) == 3
+
+        player_one_tally = tally_data[player_one]
+        player_two_tally = tally_data[player_two]
+
+        assert player_one_tally.last_win_datetime == datetime.datetime(2021, 1, 1, 12, 0)
+        assert player_two_tally.last_win_datetime == datetime.datetime(2021, 1, 3, 13, 0)
+
+        with time_machine.travel(datetime.datetime(2021, 2, 1, 14, 0)):
+            assert player_one_tally.last_win_days_ago == 31
+            assert player_two_tally.last_win_days_ago == 29
@@ -0,0 +1,65 @@
+import pytest
+
+from squash_bot.match_tracker.data import vector
+
+
+class TestVector:
+    # Lengths either side of the tail filling up and of the trie gaining a level
+    @pytest.mark.parametrize("length", [0, 1, 32, 33, 1024, 1056, 1057, 33_000])
+    def test_append_and_read(self, length):
+        items = list(range(length))
+
+        appended: vector.Vector[int] = vector.Vector()
+        for item in items:
+            appended = appended.append(item)
+
+        assert list(appended) == items
+        assert list(vector.Vector(items)) == items
+        assert [appended[i] for i in range(length)] == items
+
+    def test_append_leaves_original_unchanged(self):
+        original = vector.Vector(range(40))
+
+        appended = original.append(40)
+
+        assert list(original) == list(range(40))
+        assert list(appended) == list(range(41))
+
+    @pytest.mark.parametrize("index", [0, 31, 500, 1055, -1])
+    def test_set(self, index):
+        original = vector.Vector(range(1057))
+
+        updated = original.set(index, -1)
+
+        expected = list(range(1057))
+        expected[index] = -1
+        assert list(updated) == expected
+        assert list(original) == list(range(1057))
+
+    def test_slices_are_views(self):
+        original = vector.Vector(range(100))
+
+        sliced = original[10:50]
+
+        assert list(sliced) == list(range(10, 50))
+        assert list(reversed(sliced)) == list(range(49, 9, -1))
+        assert sliced[-1] == 49
+        assert list(sliced.set(0, -1))[:2] == [-1, 11]
+        assert list(original[-3:]) == [97, 98, 99]
+
+    def test_append_to_view(self):
+        original = vector.Vector(range(100))
+
+        assert list(original[10:50].append(-1)) == list(range(10, 50)) + [-1]
+        assert list(original[90:].append(-1)) == list(range(90, 100)) + [-1]
+        assert list(original) == list(range(100))
+
+    def test_index_out_of_range(self):
+        with pytest.raises(IndexError):
+            vector.Vector(range(10))[10]
+
+    def test_equality(self):
+        assert vector.Vector([1, 2, 3]) == [1, 2, 3]
+        assert [1, 2, 3] == vector.Vector([1, 2, 3])
+        assert vector.Vector(range(5))[1:3] == vector.Vector([1, 2])
+        assert vector.Vector([1, 2]) != [1, 2, 3]
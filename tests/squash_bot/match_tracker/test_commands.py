@@ -1,11 +1,13 @@
 import datetime
 from unittest import mock
 
+import pytest
 import time_machine
 
+from squash_bot.core import command as _command
 from squash_bot.core.data import dataclasses as core_dataclasses
 from squash_bot.match_tracker import commands, queries
-from squash_bot.match_tracker.data import dataclasses, storage
+from squash_bot.match_tracker.data import dataclasses, form, pairs, storage, tally
 
 from tests.factories import core as core_factories
 from tests.factories import match_tracker as match_tracker_factories
@@ -92,9 +94,9 @@ class TestRecordMatchCommand:
         assert "user1" in response["data"]["content"]
         assert "user2" in response["data"]["content"]
 
-    def test_stores_result(self):
+    def test_stores_result(self, tmp_path):
         command = commands.RecordMatchCommand()
-        with mock.patch.object(storage, "get_all_match_results_as_list", return_value=[]):
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
             command.handle(
                 {
                     "data": {
@@ -130,9 +132,9 @@ class TestRecordMatchCommand:
                 }
             ).as_dict()
 
-        all_match_results = storage.get_all_match_results(
-            guild=core_dataclasses.Guild(guild_id="1")
-        ).match_results
+            all_match_results = storage.get_all_match_results(
+                guild=core_dataclasses.Guild(guild_id="1")
+            ).match_results
 
         assert len(all_match_results) == 1
 
@@ -153,9 +155,9 @@ class TestRecordMatchCommand:
 
 
 class TestShowMatches:
-    def test_show_matches_with_no_matches(self):
+    def test_show_matches_with_no_matches(self, tmp_path):
         command = commands.ShowMatchesCommand()
-        with mock.patch.object(storage, "get_all_match_results_as_list", return_value=[]):
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
             response = command.handle(
                 {
                     "data": {
@@ -251,9 +253,9 @@ class TestShowMatches:
 
 
 class TestLeagueTable:
-    def test_league_table_with_no_matches(self):
+    def test_league_table_with_no_matches(self, tmp_path):
         command = commands.LeagueTableCommand()
-        with mock.patch.object(storage, "get_all_match_results_as_list", return_value=[]):
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
             response = command.handle(
                 {
                     "data": {
@@ -272,7 +274,7 @@ class TestLeagueTable:
 
         assert "No matches have been recorded" in response["data"]["content"]
 
-    def test_league_table_with_matches(self):
+    def test_league_table_with_matches(self, tmp_path):
         user_one = core_dataclasses.User(id="1", username="user1", global_name="global-user1")
         user_two = core_dataclasses.User(id="2", username="user2", global_name="global-user2")
 
@@ -283,10 +285,12 @@ class TestLeagueTable:
             winner=user_two, loser=user_one, winner_score=13, loser_score=11
         )
 
-        matches = dataclasses.Matches(match_results=[match_one, match_two])
-
         command = commands.LeagueTableCommand()
-        with mock.patch.object(queries, "get_matches", return_value=matches):
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            guild = core_dataclasses.Guild(guild_id="1")
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+
             response = command.handle(
                 {
                     "data": {
@@ -330,7 +334,9 @@ class TestLeagueTable:
         matches = dataclasses.Matches(match_results=[match_one, match_two])
 
         command = commands.LeagueTableCommand()
-        with mock.patch.object(queries, "get_matches", return_value=matches):
+        with mock.patch.object(
+            queries, "get_tally_index", return_value=tally.TallyIndex.build(matches)
+        ):
             response = command.handle(
                 {
                     "data": {
@@ -352,6 +358,90 @@ class TestLeagueTable:
         assert ["global-user2", "1", "0", "100%"] in table_data
         assert ["global-user1", "0", "1", "0%"] in table_data
 
+    def test_league_table_with_date_window(self):
+        user_one = core_dataclasses.User(id="1", username="user1", global_name="global-user1")
+        user_two = core_dataclasses.User(id="2", username="user2", global_name="global-user2")
+
+        match_one = match_tracker_factories.MatchResultFactory(
+            winner=user_one,
+            winner_score=11,
+            loser=user_two,
+            loser_score=5,
+            played_at=datetime.datetime(2021, 1, 1, 12, 0),
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=user_two,
+            loser=user_one,
+            winner_score=13,
+            loser_score=11,
+            played_at=datetime.datetime(2021, 2, 1, 12, 0),
+        )
+
+        matches = dataclasses.Matches(match_results=[match_one, match_two])
+
+        command = commands.LeagueTableCommand()
+        with mock.patch.object(
+            queries, "get_tally_index", return_value=tally.TallyIndex.build(matches)
+        ):
+            response = command.handle(
+                {
+                    "data": {
+                        "options": [
+                            {"name": "include-matches-from", "value": "2021-01-01"},
+                            {"name": "include-matches-to", "value": "2021-01-31"},
+                        ],
+                        "guild_id": "1",
+                    },
+                    "member": {
+                        "user": {
+                            "id": "1",
+                            "username": "different-name",
+                            "global_name": "different-global-name",
+                        }
+                    },
+                }
+            ).as_dict()
+
+        content = response["data"]["content"]
+        table_data = _extract_data_from_table_string(content)
+        assert ["global-user1", "1", "0", "100%"] in table_data
+        assert ["global-user2", "0", "1", "0%"] in table_data
+
+    def test_league_table_ordered_by_rating(self, tmp_path):
+        user_one = core_dataclasses.User(id="1", username="user1", global_name="global-user1")
+        user_two = core_dataclasses.User(id="2", username="user2", global_name="global-user2")
+
+        # Both players win one match, but beating a higher rated player is worth more
+        match_one = match_tracker_factories.MatchResultFactory(winner=user_one, loser=user_two)
+        match_two = match_tracker_factories.MatchResultFactory(winner=user_two, loser=user_one)
+
+        command = commands.LeagueTableCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            guild = core_dataclasses.Guild(guild_id="1")
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+
+            response = command.handle(
+                {
+                    "data": {
+                        "options": [{"name": "order-by", "value": "rating"}],
+                        "guild_id": "1",
+                    },
+                    "member": {
+                        "user": {
+                            "id": "1",
+                            "username": "different-name",
+                            "global_name": "different-global-name",
+                        }
+                    },
+                }
+            ).as_dict()
+
+        table_data = _extract_data_from_table_string(response["data"]["content"])
+        assert table_data[1] == ["Player", "Wins", "Losses", "Win %", "Rating"]
+        assert table_data[3] == ["global-user2", "1", "1", "50%", "1501"]
+        assert table_data[5] == ["global-user1", "1", "1", "50%", "1499"]
+
 
 class TestHeadToHead:
     def test_head_to_head_with_matches(self):
@@ -360,7 +450,13 @@ class TestHeadToHead:
         matches = match_tracker_factories.build_match_history_between(player_one, player_two)
 
         command = commands.HeadToHeadCommand()
-        with mock.patch.object(queries, "get_matches", return_value=matches):
+        pair_matrix = pairs.PairMatrix.build(matches, log_version="")
+        form_table = form.FormTable.build(matches, log_version="")
+        with (
+            mock.patch.object(queries, "get_matches", return_value=matches),
+            mock.patch.object(queries, "get_pair_matrix", return_value=pair_matrix),
+            mock.patch.object(queries, "get_form_table", return_value=form_table),
+        ):
             response = command.handle(
                 {
                     "data": {
@@ -432,7 +528,13 @@ class TestHeadToHead:
         matches += dataclasses.Matches([match_one, match_two, match_three])
 
         command = commands.HeadToHeadCommand()
-        with mock.patch.object(queries, "get_matches", return_value=matches):
+        pair_matrix = pairs.PairMatrix.build(matches, log_version="")
+        form_table = form.FormTable.build(matches, log_version="")
+        with (
+            mock.patch.object(queries, "get_matches", return_value=matches),
+            mock.patch.object(queries, "get_pair_matrix", return_value=pair_matrix),
+            mock.patch.object(queries, "get_form_table", return_value=form_table),
+        ):
             with time_machine.travel(datetime.datetime(2021, 1, 15, 11, 0)):
                 response = command.handle(
                     {
@@ -471,18 +573,288 @@ class TestHeadToHead:
         assert "8 days ago        Last win        Yesterday" in content
 
 
+class TestLeaderboard:
+    def test_leaderboard_from_stored_matches(self, tmp_path):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        command = commands.LeaderboardCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            for winner, loser, loser_score in [
+                (ricky, steve, 9),
+                (karl, steve, 1),
+                (steve, ricky, 7),
+            ]:
+                storage.store_match_result(
+                    match_tracker_factories.MatchResultFactory(
+                        winner=winner, loser=loser, winner_score=11, loser_score=loser_score
+                    ),
+                    guild,
+                )
+
+            response = command.handle(
+                {
+                    "data": {
+                        "options": [
+                            {"name": "stat", "value": "point-difference"},
+                            {"name": "top", "value": 2},
+                        ],
+                        "guild_id": "1",
+                    },
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        data = _extract_data_from_table_string(response["data"]["content"])
+        assert data[1] == ["#", "Player", "Avg. point diff."]
+        assert data[3] == ["1", "Karl", "+10.00"]
+        assert data[5] == ["2", "Ricky", "-1.00"]
+        assert len(data) == 7
+
+    def test_no_matches(self, tmp_path):
+        command = commands.LeaderboardCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            response = command.handle(
+                {
+                    "data": {"options": [{"name": "stat", "value": "win-rate"}], "guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        assert response["data"]["content"] == "No matches have been recorded."
+
+    def test_unknown_stat(self):
+        with pytest.raises(
+            _command.CommandVerificationError, match="There's no leaderboard for wins"
+        ):
+            commands.LeaderboardCommand().handle(
+                {
+                    "data": {"options": [{"name": "stat", "value": "wins"}], "guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            )
+
+    def test_top_must_be_positive(self):
+        with pytest.raises(_command.CommandVerificationError):
+            commands.LeaderboardCommand().handle(
+                {
+                    "data": {
+                        "options": [
+                            {"name": "stat", "value": "win-rate"},
+                            {"name": "top", "value": -1},
+                        ],
+                        "guild_id": "1",
+                    },
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            )
+
+
+class TestRatings:
+    def test_ratings_from_stored_matches(self, tmp_path):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        command = commands.RatingsCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(
+                match_tracker_factories.MatchResultFactory(winner=ricky, loser=steve), guild
+            )
+
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        data = _extract_data_from_table_string(response["data"]["content"])
+        assert data[3] == ["Ricky", "1516", "1"]
+        assert data[5] == ["Steve", "1484", "1"]
+
+    def test_no_matches(self, tmp_path):
+        command = commands.RatingsCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        assert response["data"]["content"] == "No matches have been recorded."
+
+
+class TestRankHistory:
+    def test_rank_history_from_stored_matches(self, tmp_path):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        command = commands.RankHistoryCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            for winner, loser, day in [
+                (steve, ricky, 1),
+                (ricky, karl, 1),
+                (ricky, steve, 2),
+                (ricky, karl, 3),
+            ]:
+                storage.store_match_result(
+                    match_tracker_factories.MatchResultFactory(
+                        winner=winner,
+                        loser=loser,
+                        played_at=datetime.datetime(2024, 1, day, 18, 0),
+                    ),
+                    guild,
+                )
+
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        content = response["data"]["content"]
+        assert content.startswith("Ricky's league position after each session:")
+        data = _extract_data_from_table_string(content)
+        assert data[4] == ["Mon 1 Jan 2024", "2"]
+        assert data[6] == ["Tue 2 Jan 2024", "1", "🔼"]
+        assert data[8] == ["Wed 3 Jan 2024", "1", "⏸️"]
+
+    def test_player_without_matches(self, tmp_path):
+        command = commands.RankHistoryCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        assert response["data"]["content"] == "Ricky hasn't played any matches."
+
+
+class TestRivalries:
+    def test_rivalries_from_stored_matches(self, tmp_path):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        command = commands.RivalriesCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            for winner, loser, day in [
+                (ricky, steve, 1),
+                (steve, ricky, 2),
+                (steve, ricky, 3),
+                (karl, ricky, 4),
+            ]:
+                storage.store_match_result(
+                    match_tracker_factories.MatchResultFactory(
+                        winner=winner,
+                        loser=loser,
+                        played_at=datetime.datetime(2024, 1, day, 18, 0),
+                    ),
+                    guild,
+                )
+
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        nemeses_table, rivalries_table = response["data"]["content"].split("\n```")
+        nemeses = _extract_data_from_table_string(nemeses_table)
+        assert ["Ricky", "Steve", "1-2"] in nemeses
+        assert ["Steve", "Ricky", "2-1"] in nemeses
+        assert not any(row and row[0] == "Karl" for row in nemeses)
+
+        rivalries = _extract_data_from_table_string(rivalries_table)
+        assert rivalries[3] == ["Ricky v Steve", "3", "1-2", "3 Jan 2024"]
+        assert rivalries[5] == ["Karl v Ricky", "1", "1-0", "4 Jan 2024"]
+
+    def test_no_matches(self, tmp_path):
+        command = commands.RivalriesCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        assert response["data"]["content"] == "No matches have been recorded."
+
+
+class TestForm:
+    def test_form_from_stored_matches(self, tmp_path):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        command = commands.FormCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            # Steve's early wins fall out of the last five matches
+            for day, (winner, loser) in enumerate(
+                [(steve, ricky)] * 2 + [(ricky, steve)] * 4 + [(steve, ricky)], start=1
+            ):
+                storage.store_match_result(
+                    match_tracker_factories.MatchResultFactory(
+                        winner=winner,
+                        loser=loser,
+                        winner_score=11,
+                        loser_score=5,
+                        played_at=datetime.datetime(2024, 1, day, 18, 0),
+                    ),
+                    guild,
+                )
+
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        data = _extract_data_from_table_string(response["data"]["content"])
+        assert data[3][:3] == ["Ricky", "W W W W L", "80%"]
+        assert data[5][:3] == ["Steve", "L L L L W", "20%"]
+        assert data[3][4] == "3.6"
+
+    def test_no_matches(self, tmp_path):
+        command = commands.FormCommand()
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            response = command.handle(
+                {
+                    "data": {"guild_id": "1"},
+                    "member": {"user": {"id": "1", "username": "ricky", "global_name": "Ricky"}},
+                }
+            ).as_dict()
+
+        assert response["data"]["content"] == "No matches have been recorded."
+
+
 class TestEditMatchScore:
-    def test_can_edit_score(self):
+    def test_can_edit_score(self, tmp_path):
         ricky = core_factories.UserFactory(username="ricky")
         steve = core_factories.UserFactory(username="steve")
 
         match_one = match_tracker_factories.MatchResultFactory(winner=ricky, loser=steve)
         match_two = match_tracker_factories.MatchResultFactory(winner=steve, loser=ricky)
 
-        matches = dataclasses.Matches([match_one, match_two])
-
+        guild = core_dataclasses.Guild(guild_id="1")
         command = commands.EditMatchScore()
-        with mock.patch.object(storage, "get_all_match_results", return_value=matches):
+        with mock.patch.object(storage.settings_base.settings, "MATCH_RESULTS_PATH", tmp_path):
+            storage.store_match_result(match_one, guild)
+            storage.store_match_result(match_two, guild)
+
             command.handle(
                 {
                     "data": {
@@ -503,9 +875,8 @@ class TestEditMatchScore:
                 }
             ).as_dict()
 
-        all_match_results = storage.get_all_match_results(
-            guild=core_dataclasses.Guild(guild_id="1")
-        )
+            all_match_results = storage.get_all_match_results(guild=guild)
+
         assert len(all_match_results.match_results) == 2
 
         new_match = match_tracker_factories.MatchResultFactory(
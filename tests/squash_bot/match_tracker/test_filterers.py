@@ -3,6 +3,7 @@ import datetime
 from squash_bot.match_tracker import filterers
 from squash_bot.match_tracker.data import dataclasses
 
+from tests.factories import core as core_factories
 from tests.factories import match_tracker as match_tracker_factories
 
 
@@ -40,3 +41,25 @@ class TestLastSessionOrDateFilterer:
         filtered_matches = filterers.LastSessionOrDate.filter(matches=matches)
 
         assert filtered_matches == dataclasses.Matches([match_two, match_three])
+
+    def test_last_session_of_planned_query(self):
+        ricky = core_factories.UserFactory(id="1", username="ricky")
+        steve = core_factories.UserFactory(id="2", username="steve")
+        karl = core_factories.UserFactory(id="3", username="karl")
+        match_one = match_tracker_factories.MatchResultFactory(
+            winner=ricky, loser=steve, played_at=datetime.datetime(2021, 1, 1, 12, 0)
+        )
+        match_two = match_tracker_factories.MatchResultFactory(
+            winner=steve, loser=karl, played_at=datetime.datetime(2021, 1, 2, 12, 0)
+        )
+        matches = dataclasses.Matches(match_results=[match_one, match_two])
+
+        # Ricky's last session is the day before the last session overall
+        query = filterers.LastSessionOrDate.plan(matches.query().involves(ricky))
+
+        assert query.execute() == dataclasses.Matches([match_one])
+
+    def test_filter_with_no_matches(self):
+        assert filterers.LastSessionOrDate.filter(matches=dataclasses.Matches([])) == (
+            dataclasses.Matches([])
+        )
@@ -74,3 +74,45 @@ class TestStoreSession:
             storage.store_session(new_session, guild)
 
             assert storage.all_sessions(guild).sessions == [prev_session, new_session]
+
+    def test_retries_when_sessions_change_during_store(self, tmp_path):
+        concurrent_session = dataclasses.Session(
+            start_datetime=datetime.datetime(2023, 10, 1, 12, 0),
+            booked_by=core_dataclasses.User(
+                id="1", username="player_1", global_name="global-player_1"
+            ),
+            session_id=uuid.uuid4(),
+        )
+        new_session = dataclasses.Session(
+            start_datetime=datetime.datetime(2023, 11, 1, 12, 0),
+            booked_by=core_dataclasses.User(
+                id="2", username="player_2", global_name="global-player_2"
+            ),
+            session_id=uuid.uuid4(),
+        )
+        guild = core_dataclasses.Guild(guild_id="1")
+
+        read_file_with_version = storage_base.read_file_with_version
+        concurrent_writes = []
+
+        def read_then_write_concurrently(*args, **kwargs):
+            versioned_file = read_file_with_version(*args, **kwargs)
+            # Simulate another container storing a session between our read and write
+            if not concurrent_writes:
+                concurrent_writes.append(concurrent_session)
+                storage_base.store_file(
+                    file_path=tmp_path,
+                    file_name=storage._sessions_file_name(guild),
+                    contents=json.dumps([concurrent_session.to_dict()]),
+                )
+            return versioned_file
+
+        with (
+            mock.patch.object(storage.settings_base.settings, "SESSIONS_PATH", tmp_path),
+            mock.patch.object(
+                storage.storage_base, "read_file_with_version", read_then_write_concurrently
+            ),
+        ):
+            storage.store_session(new_session, guild)
+
+            assert storage.all_sessions(guild).sessions == [concurrent_session, new_session]